@@ -1,25 +1,47 @@
+import csv
 import io
 
+from django.conf import settings
+from django.db.models import QuerySet
 from openpyxl import Workbook
 from openpyxl.styles import Font
 from openpyxl.cell import WriteOnlyCell
 
+from main.models import schema_cache
 from main.utils_data_package import GenericSchema
 
 COLUMN_HEADER_FONT = Font(bold=True)
 
 
+class Echo:
+    """
+    A file-like object that just returns what is written. Used to get the csv lines out of a csv writer.
+    """
+    def write(self, value):
+        return value
+
+
 class DefaultExporter:
     def __init__(self, dataset, records=None):
         self.ds = dataset
-        self.schema = GenericSchema(dataset.schema_data)
+        self.schema = schema_cache.get(dataset.pk, GenericSchema, dataset.schema_data)
         self.headers = self.schema.headers
         self.warnings = []
         self.errors = []
-        self.records = records if records else []
+        # don't test the truth of records: it would fetch the whole queryset.
+        self.records = records if records is not None else []
+
+    def records_it(self):
+        """
+        Iterate through the records. A queryset is read by chunks with a server-side cursor and is not cached,
+        so the memory doesn't grow with the number of records.
+        """
+        if isinstance(self.records, QuerySet):
+            return self.records.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        return iter(self.records)
 
     def row_it(self, cast=True):
-        for record in self.records:
+        for record in self.records_it():
             row = []
             for field in self.schema.fields:
                 value = record.data.get(field.name, '')
@@ -58,24 +80,26 @@ class DefaultExporter:
         return wb
 
     def to_csv(self, output):
-        import csv
-
         output = output or io.StringIO()
         writer = csv.writer(output, dialect='excel')
         for row in self.csv_it():
             writer.writerow(row)
 
+    def to_csv_stream(self):
+        """
+        Generator of csv lines, to be used with a streaming response.
+        """
+        writer = csv.writer(Echo(), dialect='excel')
+        for row in self.csv_it():
+            yield writer.writerow(row)
+
 
 class BionetExporter(DefaultExporter):
     """
     Same as default but spit two blank lines at the top when using csv
     """
-    def to_csv(self, output):
-        import csv
-
-        output = output or io.StringIO()
-        writer = csv.writer(output, dialect='excel')
-        writer.writerow(['Bionet Ignored Line'])
-        writer.writerow(['Bionet Ignored Line'])
-        for row in self.csv_it():
-            writer.writerow(row)
+    def csv_it(self):
+        yield ['Bionet Ignored Line']
+        yield ['Bionet Ignored Line']
+        for row in super(BionetExporter, self).csv_it():
+            yield row
@@ -2,10 +2,14 @@ import logging
 import json
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
 from django_filters import rest_framework as filters, constants
 from rest_framework.exceptions import APIException
 
 from main import models
+from main.utils_data_package import BiosysSchema, cast_date_any_format, cast_datetime_any_format
 
 logger = logging.getLogger(__name__)
 
@@ -146,6 +150,79 @@ class RecordFilterSet(filters.FilterSet):
     data__has_key = filters.CharFilter(field_name='data', lookup_expr='has_key', distinct=True)
     geometry__within = GeometryFilter(field_name='geometry', lookup_expr='within', distinct=True)
 
+    # Filters on the fields tagged as indexed in the dataset schemas (see models.RecordIndexedValue):
+    # data.<field name>__<lookup>=value, e.g data.Count__gte=5 or data.When__lt=2018-01-31. The lookup defaults to
+    # exact. The 'in' lookup takes a comma separated list.
+    INDEXED_FIELD_PREFIX = 'data.'
+    INDEXED_FIELD_LOOKUPS = ['exact', 'gt', 'gte', 'lt', 'lte', 'in']
+    # the types of a field in the schemas where it is tagged as indexed. Only the field descriptors are read, not the
+    # data packages.
+    INDEXED_FIELD_TYPES_SQL = """
+        SELECT DISTINCT coalesce(field->>'type', 'string')
+        FROM main_dataset d, jsonb_array_elements(d.data_package->'resources'->0->'schema'->'fields') field
+        WHERE d.data_package->'resources'->0->'schema'->'fields' @> %s::jsonb AND field->>'name' = %s
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super(RecordFilterSet, self).filter_queryset(queryset)
+        for param, value in self.data.items():
+            if param.startswith(self.INDEXED_FIELD_PREFIX) and value not in constants.EMPTY_VALUES:
+                queryset = self.filter_indexed_field(queryset, param[len(self.INDEXED_FIELD_PREFIX):], value,
+                                                     dataset=self.get_view_dataset())
+        return queryset
+
+    def get_view_dataset(self):
+        """
+        The dataset the records view is scoped to (view.dataset), if any.
+        """
+        parser_context = getattr(self.request, 'parser_context', None) or {}
+        return getattr(parser_context.get('view'), 'dataset', None)
+
+    @classmethod
+    def filter_indexed_field(cls, queryset, expression, value, dataset=None):
+        field_name, lookup = expression, 'exact'
+        name, separator, suffix = expression.rpartition('__')
+        if separator and suffix in cls.INDEXED_FIELD_LOOKUPS:
+            field_name, lookup = name, suffix
+        columns = cls.get_indexed_field_columns(field_name, dataset=dataset)
+        if not columns:
+            raise FilterException("The field '{}' is not an indexed field of a dataset schema.".format(field_name))
+        values = value.split(',') if lookup == 'in' else [value]
+        # the same field name can be indexed with different types in different datasets.
+        query = None
+        for column in columns:
+            try:
+                cast_values = [cast_indexed_value(column, v) for v in values]
+            except Exception:
+                continue
+            column_query = Q(**{
+                'indexed_values__{}__{}'.format(column, lookup): cast_values if lookup == 'in' else cast_values[0]
+            })
+            query = query | column_query if query else column_query
+        if query is None:
+            raise FilterException("Error while filtering {field}__{lookup} with value: '{value}'. "
+                                  "Invalid {types}.".format(field=field_name, lookup=lookup, value=value,
+                                                            types=' or '.join(columns)))
+        return queryset.filter(Q(indexed_values__field=field_name) & query)
+
+    @classmethod
+    def get_indexed_field_columns(cls, field_name, dataset=None):
+        """
+        The value columns of a field name in the dataset schema (cached) or, without dataset, in all the schemas where
+        it is tagged as indexed.
+        """
+        if dataset is not None:
+            types = [field.type for field in dataset.schema.indexed_fields if field.name == field_name]
+        else:
+            indexed_field = {
+                'name': field_name,
+                BiosysSchema.BIOSYS_KEY_NAME: {BiosysSchema.INDEXED_KEY_NAME: True}
+            }
+            with connection.cursor() as cursor:
+                cursor.execute(cls.INDEXED_FIELD_TYPES_SQL, [json.dumps([indexed_field]), field_name])
+                types = [row[0] for row in cursor.fetchall()]
+        return sorted(set(models.RecordIndexedValue.get_column(type_) for type_ in types))
+
     class Meta:
         model = models.Record
         fields = {
@@ -169,6 +246,21 @@ class RecordFilterSet(filters.FilterSet):
         }
 
 
+def cast_indexed_value(column, value):
+    """
+    Cast a filter value for a RecordIndexedValue column. The dates can be in any format (day first).
+    """
+    value = value.strip()
+    if column == models.RecordIndexedValue.NUMBER_COLUMN:
+        return float(value)
+    if column == models.RecordIndexedValue.DATE_COLUMN:
+        return cast_date_any_format(value)
+    if column == models.RecordIndexedValue.DATETIME_COLUMN:
+        value = cast_datetime_any_format(value)
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+    return value
+
+
 class MediaFilterSet(filters.FilterSet):
     class Meta:
         model = models.Media
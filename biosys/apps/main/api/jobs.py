@@ -0,0 +1,113 @@
+"""
+Background processing of the records upload jobs (see main.models.RecordUploadJob).
+
+The jobs are run by a pool of threads of the web server process, no broker is needed. The pool size is set with
+the UPLOAD_JOB_WORKERS setting, 0 to run the job in the request (mostly for testing).
+Note: the jobs are lost if the server process is restarted. They stay pending or running and should be submitted
+again.
+The rows are validated in the job thread: no validation worker processes are forked from the multi-threaded web
+server process (see RecordCreator workers). The uploaded file is deleted once the job is finished.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from main.api.uploaders import FileReader, RecordCreator, iter_upload_results
+from main.api.validators import get_record_validator_for_dataset
+from main.models import RecordUploadJob
+
+logger = logging.getLogger(__name__)
+
+# the job progress (rows_processed) is saved every PROGRESS_INTERVAL rows.
+PROGRESS_INTERVAL = 500
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_JOB_WORKERS,
+                                           thread_name_prefix='upload-job')
+        return _executor
+
+
+def submit_upload_job(job, species_facade_class):
+    """
+    Run the job in the pool once the current transaction (that created the job) is committed.
+    If UPLOAD_JOB_WORKERS is 0 the job is run straight away in the current thread.
+    """
+    if not settings.UPLOAD_JOB_WORKERS:
+        run_upload_job(job.pk, species_facade_class)
+        return
+
+    def _submit():
+        _get_executor().submit(_run_in_thread, job.pk, species_facade_class)
+
+    transaction.on_commit(_submit)
+
+
+def _run_in_thread(job_id, species_facade_class):
+    try:
+        run_upload_job(job_id, species_facade_class)
+    finally:
+        # the thread has its own database connection.
+        connection.close()
+
+
+def run_upload_job(job_id, species_facade_class):
+    job = RecordUploadJob.objects.select_related('dataset').get(pk=job_id)
+    job.status = RecordUploadJob.STATUS_RUNNING
+    job.started = timezone.now()
+    job.save(update_fields=['status', 'started'])
+    results = []
+    rows_with_error = 0
+    file_ = job.file
+    try:
+        dataset = job.dataset
+        if job.delete_previous:
+            dataset.record_queryset.delete()
+        file_.open('rb')
+        # the FileReader expects a django uploaded file.
+        file_.content_type = job.content_type
+        generator = FileReader(file_)
+        generator.file_name = job.file_name
+        validator = get_record_validator_for_dataset(dataset)
+        validator.schema_error_as_warning = not job.strict
+        creator = RecordCreator(dataset, generator,
+                                validator=validator, create_site=job.create_site, commit=True,
+                                species_facade_class=species_facade_class,
+                                batch_size=settings.RECORD_UPLOAD_BATCH_SIZE,
+                                workers=0)
+        for result in iter_upload_results(creator):
+            results.append(result)
+            if result['errors']:
+                rows_with_error += 1
+            if len(results) % PROGRESS_INTERVAL == 0:
+                RecordUploadJob.objects.filter(pk=job.pk).update(
+                    rows_processed=len(results),
+                    rows_with_error=rows_with_error
+                )
+        job.status = RecordUploadJob.STATUS_SUCCESS
+        job.results = results
+    except Exception as e:
+        logger.exception('Error while running the upload job {}'.format(job.pk))
+        job.status = RecordUploadJob.STATUS_ERROR
+        job.error = str(e)
+    finally:
+        try:
+            file_.close()
+            file_.delete(save=False)
+        except Exception:
+            logger.exception('Error while deleting the file of the upload job {}'.format(job.pk))
+    job.rows_processed = len(results)
+    job.rows_with_error = rows_with_error
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'results', 'error', 'rows_processed', 'rows_with_error', 'finished', 'file'])
+    return job
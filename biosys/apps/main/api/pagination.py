@@ -0,0 +1,171 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.expressions import RawSQL
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from main.models import Record
+
+
+class RecordKeyset(object):
+    """
+    The ordering key of a keyset pagination on the records.
+    Supported ordering (ascending or descending, the record id is always the tie-breaker):
+        - id
+        - last_modified
+        - a data (json) field. Missing values are ordered as json null.
+    """
+    MODEL_FIELDS = ['id', 'last_modified']
+
+    def __init__(self, ordering=None, json_fields=None):
+        """
+        :param ordering: the ordering query param, prefixed with '-' for descending order.
+        :param json_fields: the dataset data field names that can be used for ordering.
+        Will throw a ValidationError if the ordering is not supported.
+        """
+        ordering = ordering or 'id'
+        self.ordering = ordering
+        self.descending = ordering.startswith('-')
+        self.field = ordering[1:] if self.descending else ordering
+        self.is_json = self.field not in self.MODEL_FIELDS
+        if self.is_json and self.field not in (json_fields or []):
+            raise ValidationError(
+                "Ordering '{}' is not supported with cursor pagination. Use id, last_modified or one of "
+                "the dataset field.".format(ordering))
+        table = Record._meta.db_table
+        self.id_column = '"{}"."id"'.format(table)
+        if self.is_json:
+            self.key_sql = "COALESCE(\"{}\".\"data\" -> %s, 'null'::jsonb)".format(table)
+            self.key_params = [self.field]
+        elif self.field == 'last_modified':
+            self.key_sql = '"{}"."last_modified"'.format(table)
+            self.key_params = []
+        else:
+            self.key_sql = None
+            self.key_params = []
+
+    def order(self, queryset):
+        if self.key_sql is None:
+            return queryset.order_by('-id' if self.descending else 'id')
+        key = RawSQL(self.key_sql, self.key_params)
+        if self.descending:
+            return queryset.order_by(key.desc(), '-id')
+        return queryset.order_by(key.asc(), 'id')
+
+    def after(self, queryset, values):
+        """
+        Filter the records that come after the given key values, using a row comparison so that Postgres can use
+        an index on (key, id).
+        :param values: the values returned by self.values()
+        """
+        operator = '<' if self.descending else '>'
+        if self.key_sql is None:
+            record_id, = values
+            where = '{} {} %s'.format(self.id_column, operator)
+            params = [record_id]
+        else:
+            key_value, record_id = values
+            if self.is_json:
+                key_value = json.dumps(key_value)
+                cast = '::jsonb'
+            else:
+                if parse_datetime(key_value) is None:
+                    raise ValueError('Invalid datetime')
+                cast = '::timestamptz'
+            where = '({}, {}) {} (%s{}, %s)'.format(self.key_sql, self.id_column, operator, cast)
+            params = self.key_params + [key_value, record_id]
+        # extra 'where' params can't go through RawSQL.
+        return queryset.extra(where=[where], params=params)
+
+    def values(self, record):
+        if self.key_sql is None:
+            return [record.id]
+        if self.is_json:
+            return [record.data.get(self.field), record.id]
+        return [record.last_modified.isoformat(), record.id]
+
+
+class RecordPagination(LimitOffsetPagination):
+    """
+    The default limit/offset pagination with an opt-in keyset (cursor) mode for the records.
+    With the limit/offset pagination the deep pages turn into large OFFSET scans. In cursor mode the page is
+    requested after the last record of the previous page, so the cost doesn't depend on the depth of the page.
+    Usage: ?pagination=cursor&limit=1000[&ordering=last_modified]
+    The response contains a 'next' url (with a 'cursor' param) or None for the last page.
+    """
+    pagination_query_param = 'pagination'
+    pagination_cursor_mode = 'cursor'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.cursor_mode = False
+        self.keyset = None
+        self.next_values = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = request.query_params.get(self.pagination_query_param) == self.pagination_cursor_mode
+        if not self.cursor_mode:
+            return super(RecordPagination, self).paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        self.limit = self.get_limit(request) or settings.RECORD_CURSOR_PAGE_SIZE
+        dataset = getattr(view, 'dataset', None)
+        json_fields = dataset.schema.field_names if dataset is not None else []
+        ordering = request.query_params.get(self.ordering_query_param)
+        self.keyset = RecordKeyset(ordering, json_fields)
+
+        queryset = self.keyset.order(queryset)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            try:
+                queryset = self.keyset.after(queryset, cursor)
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        # fetch one more to know if there is a next page.
+        results = list(queryset[:self.limit + 1])
+        page = results[:self.limit]
+        self.next_values = self.keyset.values(page[-1]) if len(results) > self.limit else None
+        return page
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        # the cursor is only valid for the ordering it has been created with.
+        if not isinstance(cursor, dict) or cursor.get('o') != self.keyset.ordering or \
+                not isinstance(cursor.get('v'), list):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor['v']
+
+    def encode_cursor(self, values):
+        data = json.dumps({'o': self.keyset.ordering, 'v': values})
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super(RecordPagination, self).get_next_link()
+        if self.next_values is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_values))
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super(RecordPagination, self).get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
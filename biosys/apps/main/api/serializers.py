@@ -7,6 +7,7 @@ from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.core.mail import send_mail
+from django.db import models, transaction, IntegrityError
 from django.utils import timezone
 from django.conf import settings
 
@@ -16,9 +17,10 @@ from drf_extra_fields.fields import Base64ImageField
 
 from main.api.validators import get_record_validator_for_dataset
 from main.constants import MODEL_SRID
-from main.models import Program, Project, Site, Dataset, Record, Media, DatasetMedia, ProjectMedia, Form
+from main.models import Program, Project, Site, Dataset, Record, Media, DatasetMedia, ProjectMedia, Form, \
+    RecordRelationsResolver, RecordUploadJob, RecordIndexedValue, RecordChange
 from main.utils_auth import is_admin
-from main.utils_species import get_key_for_value
+from main.utils_species import get_species_index
 
 import logging
 
@@ -255,6 +257,85 @@ class SchemaValidator:
             self.dataset = ctx['dataset']
 
 
+class RecordListSerializer(serializers.ListSerializer):
+    """
+    Resolve the parent and children of all the records in a few queries before serializing them.
+    Bulk write: the records are built in memory (see RecordSerializer.build_instance) and written with one
+    bulk_create and one bulk_update per batch.
+    """
+    # bulk_update doesn't touch the auto_now fields: last_modified is set explicitly.
+    BULK_UPDATE_FIELDS = ['data', 'site', 'datetime', 'geometry', 'species_name', 'name_id', 'source_info',
+                          'validated', 'locked', 'client_id', 'last_modified']
+
+    def create(self, validated_data):
+        return self.update([None] * len(validated_data), validated_data)
+
+    def update(self, instances, validated_data):
+        """
+        Create or update the records in one transaction, RECORD_BULK_BATCH_SIZE records per insert/update statement.
+        :param instances: for every item of validated_data, the record to update or None to create a new record.
+        :return: the records in the validated_data order
+        """
+        records = [self.child.build_instance(attrs, instance) for instance, attrs in zip(instances, validated_data)]
+        to_create = [record for record in records if record.pk is None]
+        to_update = [record for record in records if record.pk is not None]
+        now = timezone.now()
+        for record in to_update:
+            record.last_modified = now
+        batch_size = settings.RECORD_BULK_BATCH_SIZE or None
+        try:
+            with transaction.atomic():
+                if to_create:
+                    Record.objects.bulk_create(to_create, batch_size=batch_size)
+                    # bulk_create/bulk_update don't call the record save.
+                    RecordIndexedValue.sync_records(to_create, replace=False)
+                if to_update:
+                    Record.objects.bulk_update(to_update, self.BULK_UPDATE_FIELDS, batch_size=batch_size)
+                    RecordIndexedValue.sync_records(to_update, replace=True)
+        except IntegrityError as e:
+            # e.g. a client_id written by a concurrent request: nothing is written.
+            if 'main_record_dataset_client_id_uniq' in str(e):
+                raise serializers.ValidationError({
+                    'client_id': 'A record with one of the client_ids already exists in the dataset.'
+                })
+            raise
+        return records
+
+    def upsert(self, validated_data):
+        """
+        Create the records or update the dataset records with the same client_id, one INSERT ... ON CONFLICT
+        statement per batch of RECORD_BULK_BATCH_SIZE records (see Record.upsert_by_client_id), in one transaction.
+        :return: a list of {id, client_id, last_modified, created} in the validated_data order. created is False for
+        an updated record.
+        """
+        records = [self.child.build_instance(attrs) for attrs in validated_data]
+        batch_size = settings.RECORD_BULK_BATCH_SIZE or len(records)
+        results = []
+        with transaction.atomic():
+            for start in range(0, len(records), batch_size):
+                batch = records[start:start + batch_size]
+                inserted = Record.upsert_by_client_id(batch)
+                RecordIndexedValue.sync_records(batch, replace=True)
+                results += [
+                    {
+                        'id': record.pk,
+                        'client_id': record.client_id,
+                        'last_modified': record.last_modified,
+                        'created': created
+                    }
+                    for record, created in zip(batch, inserted)
+                ]
+        return results
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        fields = self.child.fields
+        if 'parent' in fields or 'children' in fields:
+            iterable = list(iterable)
+            self.child.relations_resolver = RecordRelationsResolver().resolve(iterable)
+        return super(RecordListSerializer, self).to_representation(iterable)
+
+
 class RecordSerializer(serializers.ModelSerializer):
     parent = serializers.SerializerMethodField()
     children = serializers.SerializerMethodField()
@@ -267,9 +348,13 @@ class RecordSerializer(serializers.ModelSerializer):
         self.strict_schema_validation = ctx.get('strict', False)
         # species naming service
         self.species_naming_facade_class = ctx.get('species_naming_facade_class')
-        # the next object will hold a cached version of the 'species_name' -> name_id obtained
+        # the next object will hold a cached version of the 'species_name' <-> name_id index obtained
         # from the species_naming_facade above.
-        self.species_name_id_mapping_cached = None
+        self.species_index_cached = None
+        # set by the list serializer with the pre-computed parent and children of the records.
+        self.relations_resolver = None
+        # optional site lookup cache (see main.api.uploaders.SiteCache), for the bulk writes.
+        self.site_cache = ctx.get('site_cache')
 
         # dynamic fields
         request = ctx.get('request')
@@ -282,13 +367,18 @@ class RecordSerializer(serializers.ModelSerializer):
                     self.fields.pop(field)
 
     @staticmethod
-    def get_site(dataset, data, force_create=False):
+    def get_site(dataset, data, force_create=False, site_cache=None):
         schema = dataset.schema
         site_fk = schema.get_fk_for_model('Site')
         site = None
         if site_fk:
             model_field = site_fk.model_field
             site_value = data.get(site_fk.data_field)
+            if site_cache is not None and model_field == 'code':
+                site = site_cache.get(site_value)
+                if site is None and force_create:
+                    site = site_cache.create(site_value)
+                return site
             kwargs = {
                 "project": dataset.project,
                 model_field: site_value
@@ -299,8 +389,9 @@ class RecordSerializer(serializers.ModelSerializer):
         return site
 
     @staticmethod
-    def set_site(instance, validated_data, force_create=False, commit=True):
-        site = RecordSerializer.get_site(instance.dataset, validated_data['data'], force_create=force_create)
+    def set_site(instance, validated_data, force_create=False, commit=True, site_cache=None):
+        site = RecordSerializer.get_site(instance.dataset, validated_data['data'], force_create=force_create,
+                                         site_cache=site_cache)
         if site is not None and instance.site != site:
             instance.site = site
             if commit:
@@ -312,8 +403,9 @@ class RecordSerializer(serializers.ModelSerializer):
         return dataset.schema.cast_record_observation_date(data)
 
     @staticmethod
-    def get_geometry(dataset, data):
-        return dataset.schema.cast_geometry(data, default_srid=dataset.project.datum or MODEL_SRID)
+    def get_geometry(dataset, data, site_cache=None):
+        return dataset.schema.cast_geometry(data, default_srid=dataset.project.datum or MODEL_SRID,
+                                            site_cache=site_cache)
 
     @staticmethod
     def set_date(instance, validated_data, commit=True):
@@ -332,8 +424,8 @@ class RecordSerializer(serializers.ModelSerializer):
         return instance
 
     @staticmethod
-    def set_geometry(instance, validated_data, commit=True):
-        geom = RecordSerializer.get_geometry(instance.dataset, validated_data['data'])
+    def set_geometry(instance, validated_data, commit=True, site_cache=None):
+        geom = RecordSerializer.get_geometry(instance.dataset, validated_data['data'], site_cache=site_cache)
         if geom:
             instance.geometry = geom
             if commit:
@@ -342,7 +434,7 @@ class RecordSerializer(serializers.ModelSerializer):
 
     def set_date_and_geometry(self, instance, validated_data, commit=True):
         self.set_date(instance, validated_data, commit=commit)
-        self.set_geometry(instance, validated_data, commit=commit)
+        self.set_geometry(instance, validated_data, commit=commit, site_cache=self.site_cache)
         return instance
 
     def set_species_name_and_id(self, instance, validated_data, commit=True):
@@ -352,15 +444,15 @@ class RecordSerializer(serializers.ModelSerializer):
         # either a species name or a nameId
         species_name = schema.cast_species_name(schema_data)
         name_id = schema.cast_species_name_id(schema_data)
-        species_mapping = self.get_species_name_id_mapping()
-        if species_mapping:
+        species_index = self.get_species_index()
+        if species_index:
             # name id takes precedence
             if name_id and name_id != -1:
-                species_name = get_key_for_value(species_mapping, int(name_id), None)
+                species_name = species_index.get_species_name(int(name_id))
                 if not species_name:
                     raise Exception("Cannot find a species with nameId={}".format(name_id))
             elif species_name:
-                name_id = int(species_mapping.get(species_name, -1))
+                name_id = int(species_index.get_name_id(species_name, -1))
             else:
                 raise Exception('Missing Species Name or Species Name Id')
         else:
@@ -372,30 +464,48 @@ class RecordSerializer(serializers.ModelSerializer):
             instance.save()
         return instance
 
-    def get_species_name_id_mapping(self):
+    def get_species_index(self):
         if all([
-            self.species_name_id_mapping_cached is None,
+            self.species_index_cached is None,
             self.species_naming_facade_class is not None,
             callable(getattr(self.species_naming_facade_class, 'name_id_by_species_name'))
         ]):
-            self.species_name_id_mapping_cached = self.species_naming_facade_class().name_id_by_species_name()
-        return self.species_name_id_mapping_cached
+            self.species_index_cached = get_species_index(self.species_naming_facade_class())
+        return self.species_index_cached
 
-    def set_fields_from_data(self, instance, validated_data):
+    def set_fields_from_data(self, instance, validated_data, commit=True):
         try:
-            instance = self.set_site(instance, validated_data)
+            instance = self.set_site(instance, validated_data, commit=commit, site_cache=self.site_cache)
             if self.dataset and self.dataset.type in [Dataset.TYPE_OBSERVATION, Dataset.TYPE_SPECIES_OBSERVATION]:
-                instance = self.set_date_and_geometry(instance, validated_data)
+                instance = self.set_date_and_geometry(instance, validated_data, commit=commit)
                 if self.dataset.type == Dataset.TYPE_SPECIES_OBSERVATION:
-                    instance = self.set_species_name_and_id(instance, validated_data)
+                    instance = self.set_species_name_and_id(instance, validated_data, commit=commit)
             return instance
         except Exception as e:
             raise serializers.ValidationError(e)
 
+    def build_instance(self, validated_data, instance=None):
+        """
+        The record with the validated data and the fields extracted from the data (site, date, geometry, species),
+        not saved.
+        :param instance: the record to update or None for a new record
+        """
+        if instance is None:
+            instance = Record(**validated_data)
+        else:
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+        # if data are sent we need to update the extracted fields
+        if validated_data.get('data') is not None:
+            instance = self.set_fields_from_data(instance, validated_data, commit=False)
+        return instance
+
     def get_parent(self, record):
         """
         Return the FIRST parent record.id or None
         """
+        if self.relations_resolver is not None and record.pk in self.relations_resolver.parent_ids:
+            return self.relations_resolver.parent_ids[record.pk]
         parents = record.parents
         # currently client support only one parent
         return parents[0].id if parents else None
@@ -405,6 +515,8 @@ class RecordSerializer(serializers.ModelSerializer):
         :param record:
         :return: an array of children record ids, or None
         """
+        if self.relations_resolver is not None and record.pk in self.relations_resolver.children_ids:
+            return self.relations_resolver.children_ids[record.pk]
         children = record.children
         return [rec.id for rec in children] if children is not None else None
 
@@ -418,29 +530,55 @@ class RecordSerializer(serializers.ModelSerializer):
         schema_validator = SchemaValidator(strict=self.strict_schema_validation)
         schema_validator.dataset = self.dataset
         if self.dataset and self.dataset.type == Dataset.TYPE_SPECIES_OBSERVATION:
-            schema_validator.kwargs['species_name_id_mapping'] = self.get_species_name_id_mapping()
+            schema_validator.kwargs['species_name_id_mapping'] = self.get_species_index()
+        if self.site_cache is not None:
+            schema_validator.kwargs['site_cache'] = self.site_cache
         schema_validator(data)
         return data
 
     def create(self, validated_data):
         """
         Extract the Site from data if not specified
+        The extracted fields are set before the insert: one write per record.
         :param validated_data:
         :return:
         """
-        instance = super(RecordSerializer, self).create(validated_data)
-        return self.set_fields_from_data(instance, validated_data)
+        return self.save_instance(self.build_instance(validated_data))
 
     def update(self, instance, validated_data):
-        instance = super(RecordSerializer, self).update(instance, validated_data)
-        # if data are sent we need to update the extracted fields
-        if validated_data.get('data') is not None:
-            instance = self.set_fields_from_data(instance, validated_data)
+        return self.save_instance(self.build_instance(validated_data, instance))
+
+    @staticmethod
+    def save_instance(instance):
+        try:
+            with transaction.atomic():
+                instance.save()
+        except IntegrityError as e:
+            if 'main_record_dataset_client_id_uniq' in str(e):
+                raise serializers.ValidationError({
+                    'client_id': 'A record with the client_id {} already exists in the dataset.'.format(
+                        instance.client_id)
+                })
+            raise
         return instance
 
     class Meta:
         model = Record
         fields = '__all__'
+        list_serializer_class = RecordListSerializer
+
+
+class RecordSyncResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    client_id = serializers.CharField()
+    last_modified = serializers.DateTimeField()
+    created = serializers.BooleanField()
+
+
+class RecordChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecordChange
+        fields = ('seq', 'record_id', 'operation', 'created')
 
 
 class Base64ProjectMediaSerializer(serializers.ModelSerializer):
@@ -475,6 +613,14 @@ class DatasetMediaSerializer(serializers.ModelSerializer):
         fields = ('id', 'file', 'dataset', 'created', 'filesize')
 
 
+class RecordUploadJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecordUploadJob
+        fields = ('id', 'dataset', 'file_name', 'status', 'rows_processed', 'rows_with_error', 'error',
+                  'created', 'started', 'finished', 'results')
+        read_only_fields = fields
+
+
 class Base64MediaSerializer(serializers.ModelSerializer):
     # Only image supported for base 64
     # TODO: investigate extending drf_extra_fields.fields.Base64FileField for video support
@@ -1,45 +1,60 @@
 import codecs
 import datetime
-import io
+import multiprocessing
+import threading
+from collections import OrderedDict, deque
 from os import path
 
 import datapackage
 from django.conf import settings
+from django.db import connections, transaction
 from django.utils import timezone
 from django.utils.text import slugify
 from openpyxl import load_workbook
 
 from main.api.validators import get_record_validator_for_dataset
 from main.constants import MODEL_SRID
-from main.models import Site, Dataset
+from main.models import Site, Dataset, RecordIndexedValue
 from main.utils_data_package import GeometryParser, ObservationSchema, SpeciesObservationSchema, BiosysSchema, \
-    SpeciesNameParser
+    SpeciesNameParser, TypedRow
 from main.utils_misc import get_value
-from main.utils_species import HerbieFacade, get_key_for_value
+from main.utils_species import HerbieFacade, SpeciesIndex, get_species_index
 
 import csv
 
 
-def xlsx_to_csv(file_):
+class XlsxDictReader(object):
+    """
+    A csv.DictReader like reader of the first sheet of a xlsx file.
+    The rows are read lazily from the workbook (openpyxl read only mode) and the values are formatted as the csv
+    reader would return them: string, '' for an empty cell and DATE_FORMAT for a datetime.
+    """
 
-    def _format(cell_):
-        result = cell_.value
-        if isinstance(result, datetime.datetime):
-            result = result.strftime(settings.DATE_FORMAT)
-        return result
+    def __init__(self, file_):
+        self.workbook = load_workbook(filename=file_, read_only=True)
+        self.rows = iter(())
+        self.fieldnames = []
+        # use the first sheet
+        if len(self.workbook.worksheets) > 0:
+            self.rows = self.workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(self.rows, None)
+            self.fieldnames = [self.format_value(value) for value in header or []]
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    wb = load_workbook(filename=file_, read_only=True)
-    # use the first sheet
-    if len(wb.worksheets) > 0:
-        ws = wb.worksheets[0]
-        for row in ws.rows:
-            r = [_format(cell) for cell in row]
-            writer.writerow(r)
-    # rewind
-    output.seek(0)
-    return output
+    @staticmethod
+    def format_value(value):
+        if value is None:
+            return ''
+        if isinstance(value, datetime.datetime):
+            return value.strftime(settings.DATE_FORMAT)
+        return str(value)
+
+    def __iter__(self):
+        format_value = self.format_value
+        for values in self.rows:
+            yield dict(zip(self.fieldnames, [format_value(value) for value in values]))
+
+    def close(self):
+        self.workbook.close()
 
 
 # TODO: investigate the use frictionless tabulator.Stream as a xlsx/csv reader instead of this class
@@ -95,8 +110,7 @@ class FileReader(object):
             msg = "Wrong file type {}. Should be one of: {}".format(file_.content_type, self.SUPPORTED_TYPES)
             raise Exception(msg)
         if file_format == self.XLSX_FORMAT:
-            self.file = xlsx_to_csv(file_)
-            self.reader = csv.DictReader(self.file)
+            self.reader = XlsxDictReader(file_)
         else:
             self.reader = csv.DictReader(codecs.iterdecode(self.file, 'utf-8'))
 
@@ -113,6 +127,8 @@ class FileReader(object):
         self.close()
 
     def close(self):
+        if hasattr(self.reader, 'close'):
+            self.reader.close()
         self.file.close()
 
 
@@ -171,55 +187,201 @@ class SiteUploader(FileReader):
         ]
     }
 
-    def __init__(self, file_, project):
+    # the fields of an existing site updated by an upload.
+    UPDATE_FIELDS = ['name', 'description', 'attributes', 'geometry']
+
+    def __init__(self, file_, project, batch_size=None):
+        """
+        :param batch_size: if set the sites are created and updated by batches of batch_size rows (bulk insert and
+        bulk update, one transaction per batch). If None the sites are created or updated one by one.
+        """
         super(SiteUploader, self).__init__(file_)
         self.project = project
+        self.batch_size = batch_size
         self.geo_parser = GeometryParser(self.GEO_PARSER_SCHEMA)
+        self.non_attributes_keys = frozenset(k.lower() for sublist in self.COLUMN_MAP.values() for k in sublist)
+        # the project sites by code. Loaded at the first batch.
+        self.sites = None
 
     def __iter__(self):
-        for row in self.reader:
-            yield self._create_or_update_site(row)
+        if self.batch_size:
+            for result in self._iter_batches():
+                yield result
+        else:
+            for row in self.reader:
+                yield self._create_or_update_site(row)
 
-    def _create_or_update_site(self, row):
+    def _parse_row(self, row):
+        """
+        :return: (code, fields, error) where fields is a dict of the site fields to create or update.
+        """
         # we need the code at minimum
-        site, error = (None, None)
         code = get_value(self.COLUMN_MAP.get('code'), row)
         if not code:
-            error = "Site Code is missing"
-        else:
-            kwargs = {
-                'name': get_value(self.COLUMN_MAP.get('name'), row, ''),
-                'description': get_value(self.COLUMN_MAP.get('description'), row, ''),
-                'attributes': self._get_attributes(row)
-            }
-            # geometry
-            try:
-                kwargs['geometry'] = self.geo_parser.cast_geometry(row)
-            except:
-                # not an error (warning?)
-                pass
+            return code, None, "Site Code is missing"
+        fields = {
+            'name': get_value(self.COLUMN_MAP.get('name'), row, ''),
+            'description': get_value(self.COLUMN_MAP.get('description'), row, ''),
+            'attributes': self._get_attributes(row)
+        }
+        # geometry
+        try:
+            fields['geometry'] = self.geo_parser.cast_geometry(row)
+        except:
+            # not an error (warning?)
+            pass
+        return code, fields, None
+
+    def _create_or_update_site(self, row):
+        site = None
+        code, fields, error = self._parse_row(row)
+        if error is None:
             try:
-                site, _ = Site.objects.update_or_create(code=code, project=self.project, defaults=kwargs)
+                site, _ = Site.objects.update_or_create(code=code, project=self.project, defaults=fields)
             except Exception as e:
                 error = str(e)
         return site, error
 
+    def _iter_batches(self):
+        """
+        Same as the row by row iteration but the sites are created/updated by batch.
+        The (site, error) tuples are yielded in row order once their batch has been flushed.
+        """
+        if self.sites is None:
+            self.sites = dict((site.code, site) for site in Site.objects.filter(project=self.project))
+        batch = []
+        for row in self.reader:
+            batch.append(self._parse_row(row))
+            if len(batch) >= self.batch_size:
+                for result in self._flush(batch):
+                    yield result
+                batch = []
+        for result in self._flush(batch):
+            yield result
+
+    def _flush(self, batch):
+        """
+        Insert the new sites and update the existing ones of the batch in one transaction.
+        If it fails, fall back to a row by row create/update so the error is reported on the faulty row(s) only.
+        :param batch: a list of (code, fields, error). See _parse_row
+        :return: a list of (site, error)
+        """
+        results = []
+        to_create = OrderedDict()
+        to_update = OrderedDict()
+        for code, fields, error in batch:
+            if error is not None:
+                results.append((None, error))
+                continue
+            # the same code can appear more than once in the file: the last row wins.
+            site = to_create.get(code) or self.sites.get(code)
+            if site is None:
+                site = Site(project=self.project, code=code, **fields)
+                to_create[code] = site
+            else:
+                for name, value in fields.items():
+                    setattr(site, name, value)
+                if site.pk is not None:
+                    to_update[code] = site
+            results.append((site, None))
+        try:
+            with transaction.atomic():
+                if to_create:
+                    Site.objects.bulk_create(list(to_create.values()))
+                if to_update:
+                    Site.objects.bulk_update(list(to_update.values()), self.UPDATE_FIELDS)
+            self.sites.update(to_create)
+        except Exception:
+            results = []
+            for code, fields, error in batch:
+                site = None
+                if error is None:
+                    try:
+                        site, _ = Site.objects.update_or_create(code=code, project=self.project, defaults=fields)
+                        self.sites[code] = site
+                    except Exception as e:
+                        error = str(e)
+                        # the cached site could have been modified.
+                        self.sites.pop(code, None)
+                results.append((site, error))
+        return results
+
     def _get_attributes(self, row):
         """
         Everything not in the COLUMN_MAP is an attribute
         :return: a dict
         """
         attributes = {}
-        non_attributes_keys = [k.lower() for sublist in self.COLUMN_MAP.values() for k in sublist]
         for k, v in row.items():
-            if k.lower() not in non_attributes_keys:
+            if k.lower() not in self.non_attributes_keys:
                 attributes[k] = v
         return attributes
 
 
+class SiteCache(object):
+    """
+    A per-upload cache of the sites of a project, keyed by (project, code).
+    All the sites of the project are loaded in one query and the sites created through the cache are added to it,
+    to avoid one site lookup per uploaded row.
+    """
+
+    def __init__(self, project):
+        self.project = project
+        self.sites = dict(
+            ((project.pk, site.code), site) for site in Site.objects.filter(project=project)
+        )
+
+    def _key(self, code):
+        # site codes are stored as strings. The code could come as a number from a json payload.
+        return self.project.pk, str(code) if code is not None else code
+
+    def get(self, code, default=None):
+        return self.sites.get(self._key(code), default)
+
+    def create(self, code):
+        site = Site.objects.create(project=self.project, code=code)
+        self.sites[self._key(code)] = site
+        return site
+
+    def get_or_create(self, code):
+        site = self.get(code)
+        if site is None:
+            site = self.create(code)
+        return site
+
+
+# The record creator used by the validation worker processes. Set by the pool initializer.
+_worker_creator = None
+
+
+def _init_validation_worker(creator):
+    global _worker_creator
+    _worker_creator = creator
+    # The forked worker must not use the database connections of the parent process. Drop them without closing
+    # them (closing would terminate the parent's session).
+    for conn in connections.all():
+        conn.connection = None
+
+
+def _validate_rows(rows):
+    return _worker_creator._validate_chunk(rows)
+
+
 class RecordCreator:
+    # number of rows sent to a validation worker at once.
+    WORKER_CHUNK_SIZE = 500
+
     def __init__(self, dataset, data_generator,
-                 commit=True, create_site=False, validator=None, species_facade_class=HerbieFacade):
+                 commit=True, create_site=False, validator=None, species_facade_class=HerbieFacade,
+                 batch_size=None, workers=0):
+        """
+        :param batch_size: if set (and commit is True) the valid records are buffered and inserted with a
+        bulk_create every batch_size rows, one transaction per batch. If None the records are saved one by one.
+        :param workers: if > 1 the rows are validated and cast by chunks in a pool of worker processes. The records
+        are still created in row order by the current process. Ignored if create_site is True because a row can
+        depend on a site created by a previous row. The workers are forked: the pool is only used if the current
+        process runs no other thread (see _can_fork_workers).
+        """
         self.dataset = dataset
         self.generator = data_generator
         self.create_site = create_site
@@ -228,76 +390,245 @@ class RecordCreator:
         self.record_model = dataset.record_model
         self.validator = validator if validator else get_record_validator_for_dataset(dataset)
         # if species. First load species list from herbie. Should raise an exception if problem.
-        self.species_id_by_name = {}
+        self.species_index = SpeciesIndex()
         if dataset.type == Dataset.TYPE_SPECIES_OBSERVATION:
-            self.species_id_by_name = species_facade_class().name_id_by_species_name()
+            self.species_index = get_species_index(species_facade_class())
         # Schema foreign key for site.
         self.site_fk = self.schema.get_fk_for_model('Site')
         self.commit = commit
+        self.batch_size = batch_size
+        self.workers = workers if workers and not create_site else 0
         self.file_name = self.generator.file_name if hasattr(self.generator, 'file_name') else None
         # Trick: use GeometryParser to get the site code
         self.geo_parser = GeometryParser(self.schema)
+        # Site lookup cache shared with the validator (geometry from site code)
+        self.site_cache = SiteCache(dataset.project) if self.geo_parser.is_site_code else None
+        if hasattr(self.validator, 'site_cache'):
+            self.validator.site_cache = self.site_cache
 
     def __iter__(self):
-        counter = 0
+        if self.commit and self.batch_size:
+            for result in self._iter_batches():
+                yield result
+        else:
+            for counter, validated in self._iter_validated():
+                yield self._create_record(counter, validated)
+
+    def _iter_validated(self):
+        """
+        Generate the (counter, (row, validator_result, fields)) of the rows in row order.
+        See _validate_row.
+        """
+        if self.workers > 1 and self._can_fork_workers():
+            for result in self._iter_validated_parallel():
+                yield result
+        else:
+            # row by row if the sites are created: a row geometry can depend on a site created by a previous row.
+            chunk_size = 1 if self.create_site else self.WORKER_CHUNK_SIZE
+            counter = 0
+            for chunk in self._iter_chunks(chunk_size):
+                for validated in self._validate_chunk(chunk):
+                    counter += 1
+                    yield counter, validated
+
+    @staticmethod
+    def _can_fork_workers():
+        """
+        A forked child inherits the locks held by the other threads of the parent at the time of the fork (schema
+        cache, species facade, logging handlers) and can deadlock on them. In a multi-threaded process (threaded wsgi
+        server, upload jobs) the rows are validated in the current process.
+        """
+        return threading.active_count() == 1
+
+    def _iter_validated_parallel(self):
+        """
+        Validate the rows by chunks in a pool of forked worker processes.
+        The chunks are collected in submission order and at most 2 chunks per worker are pending, so the memory
+        stays bounded whatever the size of the file.
+        """
+        # fork: the workers inherit the creator (schema, validator, species and site lookups) without pickling.
+        context = multiprocessing.get_context('fork')
+        pool = context.Pool(self.workers, initializer=_init_validation_worker, initargs=(self,))
+        try:
+            pending = deque()
+            counter = 0
+            for chunk in self._iter_chunks(self.WORKER_CHUNK_SIZE):
+                pending.append((counter, pool.apply_async(_validate_rows, (chunk,))))
+                counter += len(chunk)
+                if len(pending) >= self.workers * 2:
+                    for result in self._collect_chunk(*pending.popleft()):
+                        yield result
+            while pending:
+                for result in self._collect_chunk(*pending.popleft()):
+                    yield result
+        finally:
+            pool.terminate()
+
+    def _iter_chunks(self, size):
+        chunk = []
         for data in self.generator:
-            counter += 1
-            yield self._create_record(data, counter)
+            chunk.append(data)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _collect_chunk(start, async_result):
+        for index, validated in enumerate(async_result.get()):
+            yield start + index + 1, validated
+
+    def _iter_batches(self):
+        """
+        Same as the row by row iteration but the records are inserted by batch.
+        The (record, validator_result) tuples are yielded in row order once their batch has been flushed.
+        """
+        batch = []
+        for counter, validated in self._iter_validated():
+            batch.append(self._build_record(counter, validated))
+            if len(batch) >= self.batch_size:
+                for result in self._flush(batch):
+                    yield result
+                batch = []
+        for result in self._flush(batch):
+            yield result
+
+    def _flush(self, batch):
+        """
+        Insert all the valid records of the batch in one transaction.
+        If the bulk insert fails, fall back to a row by row save so the error is reported on the faulty row(s) only.
+        :param batch: a list of (record, validator_result)
+        :return: the batch
+        """
+        to_save = [(record, result) for record, result in batch if record is not None and result.is_valid]
+        if to_save:
+            try:
+                with transaction.atomic():
+                    records = self.record_model.objects.bulk_create([record for record, _ in to_save])
+                    # bulk_create doesn't call the record save.
+                    RecordIndexedValue.sync_records(records, replace=False)
+            except Exception:
+                for record, validator_result in to_save:
+                    self._save_record(record, validator_result)
+        return batch
+
+    @staticmethod
+    def _save_record(record, validator_result):
+        try:
+            with transaction.atomic():
+                record.save()
+        except Exception as e:
+            validator_result.add_column_error('unknown', str(e))
 
-    def _create_record(self, row, counter):
+    def _create_record(self, counter, validated):
         """
-        :param row: a {column(string): value(string)} dictionary
+        :param validated: the result of _validate_row
         :return: record, RecordValidatorResult
         """
-        validator_result = self.validator.validate(row)
-        record = None
+        record, validator_result = self._build_record(counter, validated)
+        if self.commit and record is not None and validator_result.is_valid:
+            self._save_record(record, validator_result)
+        return record, validator_result
+
+    def _validate_chunk(self, rows):
+        """
+        Validate a chunk of rows. The rows are cast once (see TypedRow) and the geometries of the chunk are cast in
+        one batch (see GeometryParser.cast_geometries).
+        :return: the list of _validate_row results
+        """
+        typed_rows = [self.schema.cast_row(row) for row in rows]
+        if self.dataset.type == Dataset.TYPE_OBSERVATION or self.dataset.type == Dataset.TYPE_SPECIES_OBSERVATION:
+            geometries = self.schema.cast_geometries(
+                [typed.data for typed in typed_rows],
+                default_srid=self.dataset.project.datum or MODEL_SRID,
+                site_cache=self.site_cache
+            )
+            for typed, geometry in zip(typed_rows, geometries):
+                if isinstance(geometry, Exception):
+                    typed.set_record_value('geometry', error=geometry)
+                else:
+                    typed.set_record_value('geometry', geometry)
+        return [self._validate_row(typed) for typed in typed_rows]
+
+    def _validate_row(self, row):
+        """
+        Validate the row and cast the record specific fields. No database write, so it can run in a worker process.
+        :param row: a {column(string): value(string)} dictionary or its TypedRow. The validator and the record fields
+        use the same TypedRow so the values are cast only once.
+        :return: (row, RecordValidatorResult, fields). The row with the numbers cast and the fields a dict of the
+        record specific fields (datetime, geometry, species_name, name_id) or None if the row is not valid.
+        """
+        typed = row if isinstance(row, TypedRow) else self.schema.cast_row(row)
+        validator_result = self.validator.validate(typed)
+        fields = None
         # The row values comes as string but we want to save numeric field as json number not string to allow a
-        # correct ordering. The next call will cast the numeric field into python int or float.
-        row = self.schema.cast_numbers(row)
+        # correct ordering. The typed row has the numeric fields cast into python int or float.
+        row = typed.cast_data
+        if not validator_result.is_valid:
+            return row, validator_result, fields
         try:
-            if validator_result.is_valid:
-                site = self._get_or_create_site(row)
-                record = self.record_model(
-                    site=site,
-                    dataset=self.dataset,
-                    data=row,
-                    source_info={
-                        'file_name': self.file_name,
-                        'row': counter + 1  # add one to match excel/csv row id
-                    }
-                )
-                # specific fields
-                if self.dataset.type == Dataset.TYPE_OBSERVATION or self.dataset.type == Dataset.TYPE_SPECIES_OBSERVATION:
-                    observation_date = self.schema.cast_record_observation_date(row)
-                    if observation_date:
-                        # convert to datetime with timezone awareness
-                        if isinstance(observation_date, datetime.date):
-                            observation_date = datetime.datetime.combine(observation_date, datetime.time.min)
-                        tz = self.dataset.project.timezone or timezone.get_current_timezone()
-                        record.datetime = timezone.make_aware(observation_date, tz)
-
-                    # geometry
-                    geometry = self.schema.cast_geometry(row, default_srid=self.dataset.project.datum or MODEL_SRID)
-                    record.geometry = geometry
-                    if self.dataset.type == Dataset.TYPE_SPECIES_OBSERVATION:
-                        # species stuff. Lookup for species match in herbie.
-                        # either a species name or a nameId
-                        species_name = self.schema.cast_species_name(row)
-                        name_id = self.schema.cast_species_name_id(row)
-                        # name id takes precedence
-                        if name_id:
-                            species_name = get_key_for_value(self.species_id_by_name, int(name_id), None)
-                            if not species_name:
-                                column_name = self.schema.species_name_parser.name_id_field.name
-                                message = "Cannot find a species with nameId={}".format(name_id)
-                                validator_result.add_column_error(column_name, message)
-                                return record, validator_result
-                        elif species_name:
-                            name_id = int(self.species_id_by_name.get(species_name, -1))
-                        record.species_name = species_name
-                        record.name_id = name_id
-                if self.commit:
-                    record.save()
+            fields = {}
+            # specific fields
+            if self.dataset.type == Dataset.TYPE_OBSERVATION or self.dataset.type == Dataset.TYPE_SPECIES_OBSERVATION:
+                observation_date = typed.get_record_value('datetime', self.schema.cast_record_observation_date)
+                if observation_date:
+                    # convert to datetime with timezone awareness
+                    if isinstance(observation_date, datetime.date):
+                        observation_date = datetime.datetime.combine(observation_date, datetime.time.min)
+                    tz = self.dataset.project.timezone or timezone.get_current_timezone()
+                    fields['datetime'] = timezone.make_aware(observation_date, tz)
+
+                # geometry
+                fields['geometry'] = typed.get_record_value('geometry', lambda data: self.schema.cast_geometry(
+                    data, default_srid=self.dataset.project.datum or MODEL_SRID, site_cache=self.site_cache))
+                if self.dataset.type == Dataset.TYPE_SPECIES_OBSERVATION:
+                    # species stuff. Lookup for species match in herbie.
+                    # either a species name or a nameId
+                    species_name = typed.get_record_value('species_name', self.schema.cast_species_name)
+                    name_id = typed.get_record_value('name_id', self.schema.cast_species_name_id)
+                    # name id takes precedence
+                    if name_id:
+                        species_name = self.species_index.get_species_name(int(name_id))
+                        if not species_name:
+                            column_name = self.schema.species_name_parser.name_id_field.name
+                            message = "Cannot find a species with nameId={}".format(name_id)
+                            validator_result.add_column_error(column_name, message)
+                            return row, validator_result, None
+                    elif species_name:
+                        name_id = int(self.species_index.get_name_id(species_name, -1))
+                    fields['species_name'] = species_name
+                    fields['name_id'] = name_id
+        except Exception as e:
+            # catch all errors
+            message = str(e)
+            validator_result.add_column_error('unknown', message)
+            fields = None
+        return row, validator_result, fields
+
+    def _build_record(self, counter, validated):
+        """
+        Build the record instance (not saved) from a validated row.
+        :param counter: the row number (1 based, header excluded)
+        :param validated: the result of _validate_row
+        :return: record, RecordValidatorResult
+        """
+        row, validator_result, fields = validated
+        record = None
+        if fields is None:
+            return record, validator_result
+        try:
+            site = self._get_or_create_site(row)
+            record = self.record_model(
+                site=site,
+                dataset=self.dataset,
+                data=row,
+                source_info={
+                    'file_name': self.file_name,
+                    'row': counter + 1  # add one to match excel/csv row id
+                },
+                **fields
+            )
         except Exception as e:
             # catch all errors
             message = str(e)
@@ -308,16 +639,29 @@ class RecordCreator:
         site = None
         if self.geo_parser.is_valid() and self.geo_parser.is_site_code:
             site_code = self.geo_parser.get_site_code(row)
-            kwargs = {
-                "project": self.dataset.project,
-                "code": site_code
-            }
-            site = Site.objects.filter(**kwargs).first()
+            site = self.site_cache.get(site_code)
             if site is None and self.create_site:
-                site = Site.objects.create(**kwargs)
+                site = self.site_cache.create(site_code)
         return site
 
 
+def iter_upload_results(creator):
+    """
+    Generate the upload result of every row of a RecordCreator, in row order:
+    {'row': <excel row>, 'recordId': <id if no error>, 'errors': {}, 'warnings': {}}
+    """
+    row = 1  # starts at 1 to match excel row id
+    for record, validator_result in creator:
+        row += 1
+        result = {
+            'row': row
+        }
+        if not validator_result.has_errors:
+            result['recordId'] = record.id
+        result.update(validator_result.to_dict())
+        yield result
+
+
 class DataPackageBuilder:
 
     @staticmethod
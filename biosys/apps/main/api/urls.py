@@ -24,15 +24,35 @@ url_patterns = [
     re_path(r'projects?/(?P<pk>\d+)/sites/?', api_views.ProjectSitesView.as_view(), name='project-sites'),  # bulk sites
     re_path(r'projects?/(?P<pk>\d+)/upload-sites/?', api_views.ProjectSitesUploadView.as_view(),
         name='upload-sites'),  # file upload for sites
+    # bulk write and mobile sync (must be before the records pattern that would match them)
+    re_path(r'datasets?/(?P<pk>\d+)/records/sync/?', api_views.DatasetRecordsSyncView.as_view(),
+        name='dataset-records-sync'),
+    re_path(r'datasets?/(?P<pk>\d+)/records/bulk/?', api_views.DatasetRecordsBulkView.as_view(),
+        name='dataset-records-bulk'),
     re_path(r'datasets?/(?P<pk>\d+)/records/?', api_views.DatasetRecordsView.as_view(), name='dataset-records'),
+    re_path(r'datasets?/(?P<pk>\d+)/changes/?', api_views.DatasetRecordChangesView.as_view(),
+        name='dataset-changes'),
+    # background upload (must be before the upload-records pattern that would match it)
+    re_path(r'datasets?/(?P<pk>\d+)/upload-records-job/?', api_views.DatasetUploadRecordsJobView.as_view(),
+        name='dataset-upload-job'),
     # upload data files
     re_path(r'datasets?/(?P<pk>\d+)/upload-records/?', api_views.DatasetUploadRecordsView.as_view(),
         name='dataset-upload'),
+    re_path(r'upload-jobs?/(?P<pk>\d+)/?', api_views.RecordUploadJobView.as_view(), name='upload-job'),
     re_path(r'statistics/?', api_views.StatisticsView.as_view(), name="statistics"),
     re_path(r'whoami/?', api_views.WhoamiView.as_view(), name="whoami"),
     re_path(r'species/?', api_views.SpeciesView.as_view(), name="species"),
     re_path(r'logout/?', api_views.LogoutView.as_view(), name="logout"),
     # utils
+    # batch conversions (must be before the single conversion patterns that would match them)
+    re_path(r'utils/geometry-to-data/dataset/(?P<pk>\d+)/batch/?',
+        api_views.GeoConvertBatchView.as_view(output='data'),
+        name="geometry-to-data-batch"
+        ),
+    re_path(r'utils/data-to-geometry/dataset/(?P<pk>\d+)/batch/?',
+        api_views.GeoConvertBatchView.as_view(output='geometry'),
+        name="data-to-geometry-batch"
+        ),
     re_path(r'utils/geometry-to-data/dataset/(?P<pk>\d+)/?',
         api_views.GeoConvertView.as_view(output='data'),
         name="geometry-to-data"
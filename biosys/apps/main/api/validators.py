@@ -1,5 +1,7 @@
 from main.constants import MODEL_SRID
 from main.models import Dataset
+from main.utils_data_package import TypedRow
+from main.utils_species import SpeciesIndex
 
 
 def get_record_validator_for_dataset(dataset, **kwargs):
@@ -61,32 +63,37 @@ class RecordValidatorResult:
 class GenericRecordValidator(object):
     def __init__(self, dataset, schema_error_as_warning=True, **kwargs):
         self.schema = dataset.schema
+        self.row_validator = self.schema.row_validator
         self.schema_error_as_warning = schema_error_as_warning
         self.default_srid = dataset.project.datum or MODEL_SRID
+        # optional cache for the site lookup (see main.api.uploaders.SiteCache)
+        self.site_cache = kwargs.get('site_cache')
+
+    def cast_row(self, data):
+        """
+        :param data: a dictionary, a list of key => value or a TypedRow
+        :return: the TypedRow of the data. The validation steps use it so that the values are cast only once.
+        """
+        return data if isinstance(data, TypedRow) else self.row_validator.cast_row(data)
 
     def validate(self, data):
-        return self.validate_schema(data)
+        return self.validate_schema(self.cast_row(data))
 
     def validate_schema(self, data):
         """
-        :param data: must be a dictionary or a list of key => value
+        :param data: must be a dictionary, a list of key => value or a TypedRow
         :return: a RecordValidatorResult. To obtain the result as dict call the to_dict method of the result.
         """
-        data = dict(data)
+        typed = self.cast_row(data)
         result = RecordValidatorResult()
-        for field_name, value in data.items():
-            try:
-                schema_error_msg = self.schema.field_validation_error(field_name, value)
-            except Exception as e:
-                schema_error_msg = str(e)
-            if schema_error_msg:
-                if self.schema_error_as_warning:
-                    result.add_column_warning(field_name, schema_error_msg)
-                else:
-                    result.add_column_error(field_name, schema_error_msg)
+        for field_name, schema_error_msg in typed.errors.items():
+            if self.schema_error_as_warning:
+                result.add_column_warning(field_name, schema_error_msg)
+            else:
+                result.add_column_error(field_name, schema_error_msg)
         # check for missing required fields
-        for field in self.schema.required_fields:
-            if field.name not in data:
+        for field in self.row_validator.required_fields:
+            if field.name not in typed.data:
                 msg = "The field '{}' is missing".format(field.name)
                 if self.schema_error_as_warning:
                     result.add_column_warning(field.name, msg)
@@ -106,6 +113,7 @@ class ObservationValidator(GenericRecordValidator):
         self.date_parser = self.schema.date_parser
 
     def validate(self, data):
+        data = self.cast_row(data)
         result = super(ObservationValidator, self).validate(data)
         # every schema validation warnings become errors if they concern geometry or date stuff.
         for field in self.geometry_parser.get_active_fields():
@@ -128,7 +136,7 @@ class ObservationValidator(GenericRecordValidator):
         result = RecordValidatorResult()
         date_field = self.schema.observation_date_field
         try:
-            self.schema.cast_record_observation_date(data)
+            self.cast_row(data).get_record_value('datetime', self.schema.cast_record_observation_date)
         except Exception as e:
             msg = str(e)
             result.add_column_error(date_field.name, msg)
@@ -137,7 +145,8 @@ class ObservationValidator(GenericRecordValidator):
     def validate_geometry(self, data):
         result = RecordValidatorResult()
         try:
-            self.schema.cast_geometry(data, default_srid=self.default_srid or MODEL_SRID)
+            self.cast_row(data).get_record_value('geometry', lambda row: self.schema.cast_geometry(
+                row, default_srid=self.default_srid or MODEL_SRID, site_cache=self.site_cache))
         except Exception as e:
             msg = str(e)
             # the fields involved in the geometry can be many.
@@ -150,11 +159,13 @@ class ObservationValidator(GenericRecordValidator):
 
 class SpeciesObservationValidator(ObservationValidator):
     def __init__(self, dataset, schema_error_as_warning=True, **kwargs):
-        super(SpeciesObservationValidator, self).__init__(dataset, schema_error_as_warning)
+        super(SpeciesObservationValidator, self).__init__(dataset, schema_error_as_warning, **kwargs)
         self.parser = self.schema.species_name_parser
-        self.species_name_id_mapping = kwargs.get('species_name_id_mapping')
+        # a species_name -> name_id dict or a SpeciesIndex
+        self.species_index = SpeciesIndex.from_mapping(kwargs.get('species_name_id_mapping'))
 
     def validate(self, data, schema_error_as_warning=True):
+        data = self.cast_row(data)
         result = super(SpeciesObservationValidator, self).validate(data)
         # every schema validation warnings become errors if they concern species stuff.
         for field in self.parser.get_active_fields():
@@ -170,9 +181,9 @@ class SpeciesObservationValidator(ObservationValidator):
     def validate_species(self, data):
         result = RecordValidatorResult()
         if self.parser.has_name_id:
-            name_id = self.parser.cast_species_name_id(data)
-            if name_id and self.species_name_id_mapping is not None:
-                if name_id not in self.species_name_id_mapping.values():
+            name_id = self.cast_row(data).get_record_value('name_id', self.parser.cast_species_name_id)
+            if name_id and self.species_index is not None:
+                if not self.species_index.has_name_id(name_id):
                     message = "Cannot find a species with nameId={}".format(name_id)
                     result.add_column_error(self.parser.name_id_field.name, message)
         return result
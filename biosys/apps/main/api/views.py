@@ -2,12 +2,12 @@ from __future__ import absolute_import, unicode_literals, print_function, divisi
 
 import datetime
 import logging
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 from os import path
 
 from django.contrib.auth import get_user_model, logout
 from django.core.files.uploadhandler import TemporaryFileUploadHandler
-from django.db.models import Q
+from django.db.models import Count, Q, Sum
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 from dry_rest_permissions.generics import DRYPermissions
@@ -22,18 +22,24 @@ from main import models, constants
 from main.api import serializers
 from main.api import filters
 from main.api.helpers import to_bool
-from main.api.uploaders import SiteUploader, FileReader, RecordCreator, DataPackageBuilder
+from main.api.jobs import submit_upload_job
+from main.api.pagination import RecordPagination
+from main.api.uploaders import SiteUploader, FileReader, RecordCreator, DataPackageBuilder, SiteCache, \
+    iter_upload_results
 from main.api.validators import get_record_validator_for_dataset
-from main.models import Project, Site, Dataset, Record, Program
+from main.models import Project, Site, Dataset, Record, Program, DatasetStatistics, ProjectStatistics
 from main.utils_auth import is_admin, can_create_user
 from main.api.exporters import DefaultExporter
-from main.utils_http import WorkbookResponse, CSVFileResponse
+from main.utils_http import WorkbookResponse, CSVStreamingResponse
 from main.utils_species import NoSpeciesFacade
-from main.utils_misc import search_json_fields, order_by_json_field
+from main.utils_misc import search_json_fields, order_by_json_field, full_text_search
 from main.api.throttling import UserLoginRateThrottle
 
 logger = logging.getLogger(__name__)
 
+# ?search=...&search_mode=fulltext: full text search of the records instead of the default 'contains' search
+FULLTEXT_SEARCH_MODE = 'fulltext'
+
 
 def is_data_engineer(user):
     """
@@ -108,7 +114,7 @@ class ProgramViewSet(viewsets.ModelViewSet):
 
 class ProjectViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated, DRYPermissions)
-    queryset = models.Project.objects.all()
+    queryset = models.Project.objects.all().select_related('statistics')
     serializer_class = serializers.ProjectSerializer
     filter_class = filters.ProjectFilterSet
 
@@ -182,7 +188,7 @@ class ProjectSitesUploadView(APIView):
             msg = "Wrong file type {}. Should be one of: {}".format(file_obj.content_type, SiteUploader.SUPPORTED_TYPES)
             return Response(msg, status=status.HTTP_501_NOT_IMPLEMENTED)
 
-        uploader = SiteUploader(file_obj, self.project)
+        uploader = SiteUploader(file_obj, self.project, batch_size=settings.SITE_UPLOAD_BATCH_SIZE)
         data = {}
         # return an item by parsed row
         # {1: { site: pk|None, error: msg|None}, 2:...., 3:... }
@@ -240,7 +246,7 @@ class DatasetViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated, DRYPermissions)
     serializer_class = serializers.DatasetSerializer
     filter_class = filters.DatasetFilterSet
-    queryset = models.Dataset.objects.all().distinct()
+    queryset = models.Dataset.objects.all().select_related('statistics').distinct()
 
 
 class DatasetRecordsPermission(BasePermission):
@@ -263,23 +269,30 @@ class SpeciesMixin(object):
             logger.exception(msg)
 
 
-class DatasetRecordsView(generics.ListAPIView, generics.DestroyAPIView, SpeciesMixin):
+class DatasetMixin(object):
+    """
+    The views of the records of a dataset: datasets/{pk}/...
+    """
     permission_classes = (IsAuthenticated, DatasetRecordsPermission)
-    # TODO: the filters don't appear in the swagger
-    filter_class = filters.RecordFilterSet
-
-    def __init__(self, **kwargs):
-        super(DatasetRecordsView, self).__init__(**kwargs)
-        self.dataset = None
 
     def dispatch(self, request, *args, **kwargs):
         """
-        Intercept any request to set the dataset.
-        This is necessary for the DatasetRecordsPermission
+        Intercept any request to set the dataset from the pk.
+        This is necessary for the DatasetRecordsPermission.
         :param request:
         """
         self.dataset = get_object_or_404(models.Dataset, pk=kwargs.get('pk'))
-        return super(DatasetRecordsView, self).dispatch(request, *args, **kwargs)
+        return super(DatasetMixin, self).dispatch(request, *args, **kwargs)
+
+
+class DatasetRecordsView(DatasetMixin, generics.ListAPIView, generics.DestroyAPIView, SpeciesMixin):
+    # TODO: the filters don't appear in the swagger
+    filter_class = filters.RecordFilterSet
+    pagination_class = RecordPagination
+
+    def __init__(self, **kwargs):
+        super(DatasetRecordsView, self).__init__(**kwargs)
+        self.dataset = None
 
     def get_serializer_class(self):
         return serializers.RecordSerializer
@@ -307,12 +320,15 @@ class DatasetRecordsView(generics.ListAPIView, generics.DestroyAPIView, SpeciesM
 
             search_param = self.request.query_params.get('search')
             if search_param is not None:
-                field_info = {
-                    'data': self.dataset.schema.field_names,
-                    'source_info': ['file_name', 'row']
-                }
+                if self.request.query_params.get('search_mode') == FULLTEXT_SEARCH_MODE:
+                    queryset = full_text_search(queryset, search_param)
+                else:
+                    field_info = {
+                        'data': self.dataset.schema.field_names,
+                        'source_info': ['file_name', 'row']
+                    }
 
-                queryset = search_json_fields(queryset, field_info, search_param)
+                    queryset = search_json_fields(queryset, field_info, search_param)
 
             ordering_param = self.request.query_params.get('ordering')
             if ordering_param is not None:
@@ -347,12 +363,160 @@ class DatasetRecordsView(generics.ListAPIView, generics.DestroyAPIView, SpeciesM
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class DatasetRecordsBulkView(DatasetMixin, APIView, SpeciesMixin):
+    """
+    Bulk write of the records of a dataset (e.g. mobile sync). POST a list of records ({data, client_id, ...}):
+    - a record with an id updates the dataset record with this id
+    - a record with the client_id of a dataset record updates this record
+    - any other record is created.
+    All the records are validated before any write. If one is not valid the response is a 400 with the errors of
+    every record and nothing is written. Use ?strict to report the schema errors as errors instead of warnings.
+    Returns the records in the request order.
+    """
+
+    def get_instances(self, items):
+        """
+        :return: (instances, missing_ids). For every item the dataset record to update or None, and the item ids
+        that are not records of the dataset.
+        """
+        ids = [int(item['id']) for item in items if item.get('id') is not None]
+        client_ids = [item['client_id'] for item in items if item.get('id') is None and item.get('client_id')]
+        queryset = self.dataset.record_queryset
+        by_id = dict((record.pk, record) for record in queryset.filter(pk__in=ids)) if ids else {}
+        by_client_id = dict(
+            (record.client_id, record) for record in queryset.filter(client_id__in=client_ids)
+        ) if client_ids else {}
+        instances = []
+        missing_ids = []
+        for item in items:
+            if item.get('id') is not None:
+                instance = by_id.get(int(item['id']))
+                if instance is None:
+                    missing_ids.append(item['id'])
+            else:
+                instance = by_client_id.get(item.get('client_id'))
+            instances.append(instance)
+        return instances, missing_ids
+
+    @staticmethod
+    def get_duplicated_client_ids(items, instances=None):
+        """
+        The client ids written by more than one item.
+        :param instances: for every item the record it updates or None. An item without client_id keeps the client id
+        of its record.
+        """
+        instances = instances or [None] * len(items)
+        client_ids = [
+            item['client_id'] if 'client_id' in item else getattr(instance, 'client_id', None)
+            for item, instance in zip(items, instances)
+        ]
+        counts = Counter(client_id for client_id in client_ids if isinstance(client_id, str))
+        return sorted(client_id for client_id, count in counts.items() if client_id and count > 1)
+
+    def get_serializer_context(self):
+        ctx = {
+            'request': self.request,
+            'view': self,
+            'dataset': self.dataset,
+            'strict': 'strict' in self.request.query_params,
+        }
+        if self.dataset.schema.get_fk_for_model('Site') is not None:
+            ctx['site_cache'] = SiteCache(self.dataset.project)
+        if self.dataset.type == Dataset.TYPE_SPECIES_OBSERVATION:
+            ctx['species_naming_facade_class'] = self.species_facade_class
+        return ctx
+
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return Response("A list of records must be provided", status=status.HTTP_400_BAD_REQUEST)
+        try:
+            instances, missing_ids = self.get_instances(items)
+        except (TypeError, ValueError):
+            return Response("The record ids must be integers", status=status.HTTP_400_BAD_REQUEST)
+        if missing_ids:
+            msg = "Records not found in the dataset: {}".format(missing_ids)
+            return Response(msg, status=status.HTTP_400_BAD_REQUEST)
+        duplicated = self.get_duplicated_client_ids(items, instances)
+        if duplicated:
+            msg = "Duplicated client ids: {}".format(duplicated)
+            return Response(msg, status=status.HTTP_400_BAD_REQUEST)
+        for item in items:
+            item['dataset'] = self.dataset.pk
+        serializer = serializers.RecordSerializer(
+            instances, data=items, many=True, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class DatasetRecordsSyncView(DatasetRecordsBulkView):
+    """
+    Mobile sync: create or update the records of a dataset by client_id in one round-trip. POST a list of records
+    ({client_id, data, ...}), every record with a client_id unique in the list.
+    A record with the client_id of a dataset record updates its data (and the fields extracted from the data), any
+    other record is created. The records are written with INSERT ... ON CONFLICT statements.
+    All the records are validated before any write (400 with the errors of every record).
+    Returns a list of {id, client_id, last_modified, created} in the request order.
+    """
+
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return Response("A list of records must be provided", status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(item.get('client_id'), str) and item['client_id'] for item in items):
+            return Response("Every record must have a client_id", status=status.HTTP_400_BAD_REQUEST)
+        duplicated = self.get_duplicated_client_ids(items)
+        if duplicated:
+            msg = "Duplicated client ids: {}".format(duplicated)
+            return Response(msg, status=status.HTTP_400_BAD_REQUEST)
+        for item in items:
+            item['dataset'] = self.dataset.pk
+        serializer = serializers.RecordSerializer(data=items, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        results = serializer.upsert(serializer.validated_data)
+        return Response(serializers.RecordSyncResultSerializer(results, many=True).data, status=status.HTTP_200_OK)
+
+
+class DatasetRecordChangesView(DatasetMixin, APIView):
+    """
+    The change feed of the dataset records (delta sync): the inserted, updated and deleted record ids.
+    GET ?since=<seq>&limit=<n>: the changes after the change <seq> (the last_seq of the previous response), at most
+    limit (default and max RECORD_CHANGES_PAGE_SIZE). Without since, the changes from the start.
+    Returns {changes: [{seq, record_id, operation, created}], last_seq, has_more}. The changes are in the feed order,
+    which is not always the seq order: always continue from last_seq.
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', settings.RECORD_CHANGES_PAGE_SIZE))
+        except ValueError:
+            return Response("since and limit must be integers", status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.RECORD_CHANGES_PAGE_SIZE))
+        try:
+            # one more to know if there are more
+            changes = list(models.RecordChange.get_changes(self.dataset, since=since, limit=limit + 1))
+        except models.RecordChange.DoesNotExist:
+            return Response("Unknown change {}".format(since), status=status.HTTP_400_BAD_REQUEST)
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        data = {
+            'changes': serializers.RecordChangeSerializer(changes, many=True).data,
+            'last_seq': changes[-1].seq if changes else since,
+            'has_more': has_more,
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
 class RecordViewSet(viewsets.ModelViewSet, SpeciesMixin):
     # TODO: implement a patch for the data JSON field. Ability to partially update some of the data properties.
     permission_classes = (IsAuthenticated, DRYPermissions)
     queryset = models.Record.objects.all()
     serializer_class = serializers.RecordSerializer
     filter_class = filters.RecordFilterSet
+    pagination_class = RecordPagination
 
     def __init__(self, **kwargs):
         super(RecordViewSet, self).__init__(**kwargs)
@@ -377,12 +541,15 @@ class RecordViewSet(viewsets.ModelViewSet, SpeciesMixin):
             # add some specific json field queries (postgres)
             search_param = self.request.query_params.get('search')
             if search_param is not None:
-                field_info = {
-                    'data': self.dataset.schema.field_names,
-                    'source_info': ['file_name', 'row']
-                }
+                if self.request.query_params.get('search_mode') == FULLTEXT_SEARCH_MODE:
+                    queryset = full_text_search(queryset, search_param)
+                else:
+                    field_info = {
+                        'data': self.dataset.schema.field_names,
+                        'source_info': ['file_name', 'row']
+                    }
 
-                queryset = search_json_fields(queryset, field_info, search_param)
+                    queryset = search_json_fields(queryset, field_info, search_param)
 
             ordering_param = self.request.query_params.get('ordering')
             if ordering_param is not None:
@@ -429,10 +596,9 @@ class RecordViewSet(viewsets.ModelViewSet, SpeciesMixin):
                 wb = exporter.to_workbook()
                 response = WorkbookResponse(wb, file_name)
             else:
-                # csv
+                # csv: streamed, the records are read by chunks.
                 file_name += '.csv'
-                response = CSVFileResponse(file_name=file_name)
-                exporter.to_csv(response)
+                response = CSVStreamingResponse(exporter.to_csv_stream(), file_name=file_name)
             return response
         else:
             return super(RecordViewSet, self).list(request, *args, **kwargs)
@@ -489,44 +655,32 @@ class StatisticsView(APIView):
     permission_classes = (IsAuthenticated,)
 
     def get(self, request, **kwargs):
+        """
+        The record and site counts are read from the statistics tables (maintained by database triggers).
+        """
         data = OrderedDict()
-        qs = Project.objects.all()
         data['projects'] = {
-            'total': qs.count()
+            'total': Project.objects.count()
         }
-        qs = Dataset.objects.all()
-        data['datasets'] = OrderedDict([
-            ('total', qs.count()),
-            ('generic', {
-                'total': qs.filter(type=Dataset.TYPE_GENERIC).count()
-            }),
-            ('observation', {
-                'total': qs.filter(type=Dataset.TYPE_OBSERVATION).count()
-            }),
-            ('speciesObservation', {
-                'total': qs.filter(type=Dataset.TYPE_SPECIES_OBSERVATION).count()
-            }),
-        ])
-        # records
-        total_records_count = Record.objects.count()
-        generic_record_count = Record.objects.filter(dataset__type=Dataset.TYPE_GENERIC).count()
-        observation_record_count = Record.objects.filter(dataset__type=Dataset.TYPE_OBSERVATION).count()
-        species_observation_count = Record.objects.filter(dataset__type=Dataset.TYPE_SPECIES_OBSERVATION).count()
-        data['records'] = OrderedDict([
-            ('total', total_records_count),
-            ('generic', {
-                'total': generic_record_count
-            }),
-            ('observation', {
-                'total': observation_record_count
-            }),
-            ('speciesObservation', {
-                'total': species_observation_count
-            }),
-        ])
-        qs = Site.objects.all()
+        dataset_counts = dict(Dataset.objects.values_list('type').annotate(total=Count('pk')).order_by())
+        record_counts = dict(
+            DatasetStatistics.objects.values_list('dataset__type').annotate(total=Sum('record_count')).order_by()
+        )
+        for key, counts in [('datasets', dataset_counts), ('records', record_counts)]:
+            data[key] = OrderedDict([
+                ('total', sum(counts.values())),
+                ('generic', {
+                    'total': counts.get(Dataset.TYPE_GENERIC, 0)
+                }),
+                ('observation', {
+                    'total': counts.get(Dataset.TYPE_OBSERVATION, 0)
+                }),
+                ('speciesObservation', {
+                    'total': counts.get(Dataset.TYPE_SPECIES_OBSERVATION, 0)
+                }),
+            ])
         data['sites'] = {
-            'total': qs.count()
+            'total': ProjectStatistics.objects.aggregate(total=Sum('site_count'))['total'] or 0
         }
         return Response(data)
 
@@ -541,22 +695,12 @@ class WhoamiView(APIView):
         return Response(data)
 
 
-class DatasetUploadRecordsView(APIView, SpeciesMixin):
+class DatasetUploadRecordsView(DatasetMixin, APIView, SpeciesMixin):
     """
     Upload file for records (xlsx, csv)
     """
-    permission_classes = (IsAuthenticated, DatasetRecordsPermission)
     parser_classes = (FormParser, MultiPartParser)
 
-    def dispatch(self, request, *args, **kwargs):
-        """
-        Intercept any request to set the dataset from the pk.
-        This is necessary for the DatasetRecordsPermission.
-        :param request:
-        """
-        self.dataset = get_object_or_404(models.Dataset, pk=kwargs.get('pk'))
-        return super(DatasetUploadRecordsView, self).dispatch(request, *args, **kwargs)
-
     def post(self, request, *args, **kwargs):
         file_obj = request.data['file']
         create_site = 'create_site' in request.data and to_bool(request.data['create_site'])
@@ -574,25 +718,52 @@ class DatasetUploadRecordsView(APIView, SpeciesMixin):
         validator.schema_error_as_warning = not strict
         creator = RecordCreator(self.dataset, generator,
                                 validator=validator, create_site=create_site, commit=True,
-                                species_facade_class=self.species_facade_class)
-        data = []
-        has_error = False
-        row = 1  # starts at 1 to match excel row id
-        for record, validator_result in creator:
-            row += 1
-            result = {
-                'row': row
-            }
-            if validator_result.has_errors:
-                has_error = True
-            else:
-                result['recordId'] = record.id
-            result.update(validator_result.to_dict())
-            data.append(result)
+                                species_facade_class=self.species_facade_class,
+                                batch_size=settings.RECORD_UPLOAD_BATCH_SIZE,
+                                workers=settings.RECORD_UPLOAD_WORKERS)
+        data = list(iter_upload_results(creator))
+        has_error = any(result['errors'] for result in data)
         status_code = status.HTTP_200_OK if not has_error else status.HTTP_400_BAD_REQUEST
         return Response(data, status=status_code)
 
 
+class DatasetUploadRecordsJobView(DatasetUploadRecordsView):
+    """
+    Upload file for records (xlsx, csv) processed in the background.
+    Same parameters as the records upload. Returns the job (202). The job progress and the per-row results (once
+    done) can be polled with the upload-jobs/{pk} endpoint.
+    """
+
+    def post(self, request, *args, **kwargs):
+        file_obj = request.data['file']
+        if file_obj.content_type not in FileReader.SUPPORTED_TYPES:
+            msg = "Wrong file type {}. Should be one of: {}".format(file_obj.content_type, SiteUploader.SUPPORTED_TYPES)
+            return Response(msg, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        job = models.RecordUploadJob.objects.create(
+            dataset=self.dataset,
+            user=request.user,
+            file=file_obj,
+            file_name=file_obj.name,
+            content_type=file_obj.content_type,
+            create_site='create_site' in request.data and to_bool(request.data['create_site']),
+            delete_previous='delete_previous' in request.data and to_bool(request.data['delete_previous']),
+            strict='strict' in request.data and to_bool(request.data['strict']),
+        )
+        submit_upload_job(job, self.species_facade_class)
+        job.refresh_from_db()
+        return Response(serializers.RecordUploadJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class RecordUploadJobView(generics.RetrieveAPIView):
+    """
+    Status, progress and results of a records upload job.
+    """
+    permission_classes = (IsAuthenticated, DRYPermissions)
+    serializer_class = serializers.RecordUploadJobSerializer
+    queryset = models.RecordUploadJob.objects.all()
+
+
 class SpeciesView(APIView, SpeciesMixin):
     def get(self, request, *args, **kwargs):
         """
@@ -695,6 +866,95 @@ class GeoConvertView(APIView):
                                 status=status.HTTP_400_BAD_REQUEST)
 
 
+class GeoConvertBatchView(GeoConvertView):
+    """
+    Batch version of the GeoConvertView.
+    The payload is a list of {data, geometry} (same as the single conversion) and the response is the list of the
+    conversions in the same order, each one with an 'error' (null if the conversion succeeded).
+    The dataset schema is parsed once and the reprojections are grouped by srid.
+    """
+
+    def to_geometries(self, dataset, items):
+        geom_parser = dataset.schema.geometry_parser
+        site_cache = SiteCache(dataset.project) if geom_parser.is_site_code else None
+        geometries = geom_parser.cast_geometries(
+            [item['data'] for item in items],
+            default_srid=dataset.project.datum or constants.MODEL_SRID,
+            site_cache=site_cache
+        )
+        for item, geometry in zip(items, geometries):
+            if isinstance(geometry, Exception):
+                item['error'] = str(geometry)
+            else:
+                item['geometry'] = geometry
+
+    def to_records_data(self, dataset, items):
+        geometries = []
+        for item in items:
+            geometry = item.get('geometry')
+            if geometry is not None and not geometry.srid:
+                geometry.srid = constants.MODEL_SRID
+            geometries.append(geometry)
+        records_data = dataset.schema.geometry_parser.from_geometries_to_records(
+            geometries,
+            [item['data'] for item in items],
+            default_srid=dataset.project.datum or constants.MODEL_SRID
+        )
+        for item, record_data in zip(items, records_data):
+            if isinstance(record_data, Exception):
+                item['error'] = str(record_data)
+            else:
+                item['data'] = record_data
+
+    def post(self, request, **kwargs):
+        dataset = get_object_or_404(Dataset, pk=kwargs.get('pk'))
+        if dataset.type == Dataset.TYPE_GENERIC:
+            return Response("Conversion not available for records from generic dataset",
+                            status=status.HTTP_400_BAD_REQUEST)
+        if self.output not in [self.OUTPUT_DATA, self.OUTPUT_GEOMETRY]:
+            return Response("Output format not valid {}. Should be one of:{}"
+                            .format(self.output, [self.OUTPUT_DATA, self.OUTPUT_GEOMETRY]),
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(request.data, list):
+            return Response("A list of {data, geometry} is expected.", status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > settings.GEO_CONVERT_BATCH_MAX_SIZE:
+            return Response("Too many items. The maximum is {}.".format(settings.GEO_CONVERT_BATCH_MAX_SIZE),
+                            status=status.HTTP_400_BAD_REQUEST)
+        # the items in the request order. The ones with an error are not converted.
+        items = []
+        for payload in request.data:
+            serializer = self.serializer_class(data=payload)
+            if serializer.is_valid():
+                item = {
+                    'data': serializer.validated_data.get('data', {}),
+                    'geometry': serializer.validated_data.get('geometry'),
+                    'error': None
+                }
+                if self.output == self.OUTPUT_DATA and item['geometry'] is None:
+                    item['error'] = "geometry is required."
+            else:
+                item = {'data': None, 'geometry': None, 'error': serializer.errors}
+            items.append(item)
+        valid_items = [item for item in items if item['error'] is None]
+        if self.output == self.OUTPUT_GEOMETRY:
+            self.to_geometries(dataset, valid_items)
+        else:
+            self.to_records_data(dataset, valid_items)
+        results = []
+        for payload, item in zip(request.data, items):
+            if item['error'] is None:
+                result = dict(self.serializer_class(item).data)
+            else:
+                # send back what was sent
+                result = {
+                    'data': payload.get('data') if isinstance(payload, dict) else None,
+                    'geometry': payload.get('geometry') if isinstance(payload, dict) else None,
+                }
+            result['error'] = item['error']
+            results.append(result)
+        return Response(results)
+
+
 class InferDatasetView(APIView):
     """
     Accept a xlsx or csv file and return a datapackage with schema inferred
@@ -50,6 +50,8 @@ DATUM_CHOICES = [
 ]
 DATUM_DICT = dict(DATUM_CHOICES)
 SUPPORTED_DATUMS = DATUM_DICT.values()
+# datum name (lower case) -> srid. reversed: the first srid wins in case of duplicate names, like a search in the list.
+DATUM_SRID_BY_LOWER_NAME = {name.lower(): srid for srid, name in reversed(DATUM_CHOICES)}
 
 """
 Given a datum and a zone number the srid can be calculated with the following offsets.
@@ -73,10 +75,7 @@ def is_projected_srid(srid):
 
 def get_datum_srid(datum):
     # case insensitive search
-    for srid, datum_name in DATUM_CHOICES:
-        if datum_name.lower() == datum.lower():
-            return srid
-    return None
+    return DATUM_SRID_BY_LOWER_NAME.get(datum.lower())
 
 
 def get_datum_and_zone(srid):
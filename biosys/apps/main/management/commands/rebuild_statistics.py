@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main.models import rebuild_statistics, DatasetStatistics, ProjectStatistics
+
+
+class Command(BaseCommand):
+    help = "Recompute the dataset and project statistics (record, site and dataset counts). " \
+           "They are maintained by database triggers, this is only needed if they got out of sync " \
+           "(e.g. after a TRUNCATE or a restore with triggers disabled)."
+
+    def handle(self, *args, **options):
+        rebuild_statistics()
+        self.stdout.write(self.style.SUCCESS(
+            "Statistics rebuilt for {} datasets and {} projects".format(
+                DatasetStatistics.objects.count(), ProjectStatistics.objects.count())
+        ))
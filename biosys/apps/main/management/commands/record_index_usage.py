@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main.utils_indexes import get_record_index_usage
+
+
+class Command(BaseCommand):
+    help = "Report the usage (number of scans since the last statistics reset) of the record table indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--unused', action='store_true', help="Only the indexes that have never been scanned.")
+
+    def handle(self, *args, **options):
+        usages = get_record_index_usage()
+        if options['unused']:
+            usages = [usage for usage in usages if not usage['scans']]
+        self.stdout.write("{:<60} {:>12} {:>14} {:>10}".format('index', 'scans', 'tuples read', 'size'))
+        for usage in usages:
+            self.stdout.write("{name:<60} {scans:>12} {tuples_read:>14} {size:>10}".format(**usage))
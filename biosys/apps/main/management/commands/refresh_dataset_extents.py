@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main.models import DatasetStatistics
+
+
+class Command(BaseCommand):
+    help = "Recompute and save the stale dataset extents (flagged by the record triggers when a geometry on the edge " \
+           "of the extent is deleted or changed). The stale extents are otherwise refreshed by their first read."
+
+    def handle(self, *args, **options):
+        statistics = DatasetStatistics.objects.filter(extent_stale=True).order_by('pk')
+        count = 0
+        for dataset_statistics in statistics:
+            dataset_statistics.refresh_extent()
+            count += 1
+        self.stdout.write(self.style.SUCCESS("Extent refreshed for {} datasets".format(count)))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Dataset
+from main.utils_indexes import sync_dataset_indexes
+
+
+class Command(BaseCommand):
+    help = "Create/drop the per dataset record indexes (search and ordering) to match the dataset schemas. " \
+           "See main.utils_indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset_ids', nargs='*', type=int, help="The dataset ids. All datasets if none.")
+        parser.add_argument('--drop', action='store_true', help="Drop the indexes instead.")
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.all().order_by('pk')
+        if options['dataset_ids']:
+            datasets = datasets.filter(pk__in=options['dataset_ids'])
+        for dataset in datasets:
+            field_names = [] if options['drop'] else dataset.schema.field_names
+            created, dropped = sync_dataset_indexes(dataset.pk, field_names)
+            self.stdout.write("Dataset {}: {} index(es) created, {} dropped".format(
+                dataset.pk, len(created), len(dropped)))
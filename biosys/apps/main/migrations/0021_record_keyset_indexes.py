@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_form_dataset'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['dataset', 'id'], name='main_record_dataset_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['dataset', 'last_modified', 'id'], name='main_record_ds_last_mod_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import main.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0021_record_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordUploadJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to=main.models.get_upload_job_path)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('content_type', models.CharField(blank=True, max_length=255)),
+                ('create_site', models.BooleanField(default=False)),
+                ('delete_previous', models.BooleanField(default=False)),
+                ('strict', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'),
+                                                     ('success', 'Success'), ('error', 'Error')],
+                                            default='pending', max_length=20)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('rows_with_error', models.IntegerField(default=0)),
+                ('results', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                              related_name='upload_jobs', to='main.Dataset')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                           to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -0,0 +1,217 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The statistics are maintained by statement level triggers using transition tables (Postgres >= 10), so a bulk
+# insert/delete/update costs one aggregate over the affected rows, not one trigger call per row.
+# Deletes only decrement existing statistics (never insert): on a project/dataset delete the statistics row can be
+# deleted before the records or sites.
+# Trade-off: every write statement updates the statistics row of its dataset(s) and project(s), so the concurrent
+# record writes to a same dataset or project wait on these row locks until the writing transaction ends. The record
+# writes are mostly uploads and syncs of one dataset by its custodians, where this is cheaper than a delta table summed
+# on every read of the counts.
+
+UPSERT_PROJECT_DELTAS = """
+    INSERT INTO main_projectstatistics AS s (project_id, dataset_count, site_count, record_count)
+        SELECT project_id, sum(dataset_count), sum(site_count), sum(record_count) FROM project_deltas
+        GROUP BY project_id
+    ON CONFLICT (project_id) DO UPDATE SET
+        dataset_count = s.dataset_count + EXCLUDED.dataset_count,
+        site_count = s.site_count + EXCLUDED.site_count,
+        record_count = s.record_count + EXCLUDED.record_count;
+"""
+
+DECREMENT_PROJECT_DELTAS = """
+    UPDATE main_projectstatistics s SET
+        dataset_count = s.dataset_count + d.dataset_count,
+        site_count = s.site_count + d.site_count,
+        record_count = s.record_count + d.record_count
+    FROM (
+        SELECT project_id, sum(dataset_count) AS dataset_count, sum(site_count) AS site_count,
+            sum(record_count) AS record_count
+        FROM project_deltas GROUP BY project_id
+    ) d
+    WHERE s.project_id = d.project_id;
+"""
+
+RECORD_DELTAS = {
+    'INSERT': "SELECT dataset_id, count(*) AS n FROM new_rows GROUP BY dataset_id",
+    'DELETE': "SELECT dataset_id, -count(*) AS n FROM old_rows GROUP BY dataset_id",
+    # records moved to another dataset
+    'UPDATE': """
+        SELECT dataset_id, sum(n) AS n FROM (
+            SELECT o.dataset_id, -1 AS n FROM old_rows o JOIN new_rows r ON r.id = o.id
+                WHERE r.dataset_id <> o.dataset_id
+            UNION ALL
+            SELECT r.dataset_id, 1 AS n FROM old_rows o JOIN new_rows r ON r.id = o.id
+                WHERE r.dataset_id <> o.dataset_id
+        ) moves GROUP BY dataset_id
+    """,
+}
+
+RECORD_STATEMENT = """
+    WITH dataset_deltas AS ({deltas}),
+    updated AS (
+        {dataset_write}
+    ),
+    project_deltas AS (
+        SELECT d.project_id, 0 AS dataset_count, 0 AS site_count, dd.n AS record_count
+        FROM dataset_deltas dd JOIN main_dataset d ON d.id = dd.dataset_id
+    )
+    {project_write}
+"""
+
+UPSERT_DATASET_DELTAS = """
+        INSERT INTO main_datasetstatistics AS s (dataset_id, record_count)
+            SELECT dataset_id, n FROM dataset_deltas
+        ON CONFLICT (dataset_id) DO UPDATE SET record_count = s.record_count + EXCLUDED.record_count
+"""
+
+DECREMENT_DATASET_DELTAS = """
+        UPDATE main_datasetstatistics s SET record_count = s.record_count + dd.n
+        FROM dataset_deltas dd WHERE s.dataset_id = dd.dataset_id
+"""
+
+DATASET_DELTAS = {
+    'INSERT': "SELECT project_id, count(*) AS dataset_count, 0 AS site_count, 0 AS record_count "
+              "FROM new_rows GROUP BY project_id",
+    'DELETE': "SELECT project_id, -count(*) AS dataset_count, 0 AS site_count, 0 AS record_count "
+              "FROM old_rows GROUP BY project_id",
+    # datasets moved to another project, with their records.
+    'UPDATE': """
+        SELECT o.project_id, -1 AS dataset_count, 0 AS site_count, -coalesce(ds.record_count, 0) AS record_count
+            FROM old_rows o JOIN new_rows r ON r.id = o.id
+            LEFT JOIN main_datasetstatistics ds ON ds.dataset_id = o.id
+            WHERE r.project_id <> o.project_id
+        UNION ALL
+        SELECT r.project_id, 1 AS dataset_count, 0 AS site_count, coalesce(ds.record_count, 0) AS record_count
+            FROM old_rows o JOIN new_rows r ON r.id = o.id
+            LEFT JOIN main_datasetstatistics ds ON ds.dataset_id = o.id
+            WHERE r.project_id <> o.project_id
+    """,
+}
+
+SITE_DELTAS = {
+    'INSERT': "SELECT project_id, 0 AS dataset_count, count(*) AS site_count, 0 AS record_count "
+              "FROM new_rows GROUP BY project_id",
+    'DELETE': "SELECT project_id, 0 AS dataset_count, -count(*) AS site_count, 0 AS record_count "
+              "FROM old_rows GROUP BY project_id",
+    # sites moved to another project
+    'UPDATE': """
+        SELECT o.project_id, 0 AS dataset_count, -1 AS site_count, 0 AS record_count
+            FROM old_rows o JOIN new_rows r ON r.id = o.id WHERE r.project_id <> o.project_id
+        UNION ALL
+        SELECT r.project_id, 0 AS dataset_count, 1 AS site_count, 0 AS record_count
+            FROM old_rows o JOIN new_rows r ON r.id = o.id WHERE r.project_id <> o.project_id
+    """,
+}
+
+TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION {name}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {insert}
+    ELSIF TG_OP = 'DELETE' THEN
+        {delete}
+    ELSE
+        {update}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TRIGGERS = """
+CREATE TRIGGER {name}_insert AFTER INSERT ON {table}
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE {name}();
+CREATE TRIGGER {name}_delete AFTER DELETE ON {table}
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE {name}();
+CREATE TRIGGER {name}_update AFTER UPDATE ON {table}
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE {name}();
+"""
+
+
+def record_statement(op):
+    write_dataset = DECREMENT_DATASET_DELTAS if op == 'DELETE' else UPSERT_DATASET_DELTAS
+    write_project = DECREMENT_PROJECT_DELTAS if op == 'DELETE' else UPSERT_PROJECT_DELTAS
+    return RECORD_STATEMENT.format(deltas=RECORD_DELTAS[op], dataset_write=write_dataset, project_write=write_project)
+
+
+def project_statement(deltas, op):
+    write_project = DECREMENT_PROJECT_DELTAS if op == 'DELETE' else UPSERT_PROJECT_DELTAS
+    return 'WITH project_deltas AS ({}) {}'.format(deltas[op], write_project)
+
+
+def create_sql(name, table, statement):
+    return TRIGGER_FUNCTION.format(
+        name=name,
+        insert=statement('INSERT'),
+        delete=statement('DELETE'),
+        update=statement('UPDATE'),
+    ) + TRIGGERS.format(name=name, table=table)
+
+
+def drop_sql(name, table):
+    return """
+    DROP TRIGGER IF EXISTS {name}_insert ON {table};
+    DROP TRIGGER IF EXISTS {name}_delete ON {table};
+    DROP TRIGGER IF EXISTS {name}_update ON {table};
+    DROP FUNCTION IF EXISTS {name}();
+    """.format(name=name, table=table)
+
+
+STATISTICS_TRIGGERS = [
+    ('main_record_statistics', 'main_record', record_statement),
+    ('main_dataset_statistics', 'main_dataset', lambda op: project_statement(DATASET_DELTAS, op)),
+    ('main_site_statistics', 'main_site', lambda op: project_statement(SITE_DELTAS, op)),
+]
+
+POPULATE_STATISTICS_SQL = """
+INSERT INTO main_datasetstatistics (dataset_id, record_count)
+    SELECT d.id, count(r.id) FROM main_dataset d LEFT JOIN main_record r ON r.dataset_id = d.id GROUP BY d.id;
+INSERT INTO main_projectstatistics (project_id, dataset_count, site_count, record_count)
+    SELECT p.id,
+        (SELECT count(*) FROM main_dataset d WHERE d.project_id = p.id),
+        (SELECT count(*) FROM main_site s WHERE s.project_id = p.id),
+        (SELECT coalesce(sum(ds.record_count), 0) FROM main_datasetstatistics ds
+            JOIN main_dataset d ON d.id = ds.dataset_id WHERE d.project_id = p.id)
+    FROM main_project p;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_recorduploadjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetStatistics',
+            fields=[
+                ('dataset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                                                 related_name='statistics', serialize=False, to='main.dataset')),
+                ('record_count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'dataset_statistics',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectStatistics',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                                                 related_name='statistics', serialize=False, to='main.project')),
+                ('dataset_count', models.BigIntegerField(default=0)),
+                ('site_count', models.BigIntegerField(default=0)),
+                ('record_count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'project_statistics',
+            },
+        ),
+    ] + [
+        migrations.RunSQL(create_sql(name, table, statement), reverse_sql=drop_sql(name, table))
+        for name, table, statement in STATISTICS_TRIGGERS
+    ] + [
+        migrations.RunSQL(POPULATE_STATISTICS_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
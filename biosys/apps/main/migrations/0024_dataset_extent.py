@@ -0,0 +1,108 @@
+from importlib import import_module
+
+from django.db import migrations, models
+
+# The record statistics trigger function of 0023 extended with the dataset extent.
+statistics_0023 = import_module('main.migrations.0023_statistics')
+
+# grow the extent of the datasets with the geometries of the given rows (dataset_id, geometry).
+GROW_EXTENT = """
+    UPDATE main_datasetstatistics s SET
+        extent_xmin = LEAST(s.extent_xmin, e.xmin), extent_ymin = LEAST(s.extent_ymin, e.ymin),
+        extent_xmax = GREATEST(s.extent_xmax, e.xmax), extent_ymax = GREATEST(s.extent_ymax, e.ymax)
+    FROM (
+        SELECT g.dataset_id, min(ST_XMin(g.geometry)) AS xmin, min(ST_YMin(g.geometry)) AS ymin,
+            max(ST_XMax(g.geometry)) AS xmax, max(ST_YMax(g.geometry)) AS ymax
+        FROM ({rows}) g WHERE g.geometry IS NOT NULL GROUP BY g.dataset_id
+    ) e
+    WHERE s.dataset_id = e.dataset_id AND NOT s.extent_stale;
+"""
+
+# flag as stale the extent of the datasets if one of the removed geometries (dataset_id, geometry) touches its edge.
+# A geometry strictly inside the extent can be removed without changing it.
+STALE_EXTENT = """
+    UPDATE main_datasetstatistics s SET extent_stale = true
+    FROM (
+        SELECT DISTINCT g.dataset_id FROM ({rows}) g JOIN main_datasetstatistics b ON b.dataset_id = g.dataset_id
+        WHERE g.geometry IS NOT NULL AND NOT b.extent_stale AND (
+            ST_XMin(g.geometry) <= b.extent_xmin OR ST_YMin(g.geometry) <= b.extent_ymin OR
+            ST_XMax(g.geometry) >= b.extent_xmax OR ST_YMax(g.geometry) >= b.extent_ymax
+        )
+    ) t
+    WHERE s.dataset_id = t.dataset_id;
+"""
+
+CHANGED_ROWS = """
+    SELECT {side}.dataset_id, {side}.geometry FROM old_rows o JOIN new_rows r ON r.id = o.id
+    WHERE r.geometry IS DISTINCT FROM o.geometry OR r.dataset_id <> o.dataset_id
+"""
+
+EXTENT_STATEMENTS = {
+    'INSERT': GROW_EXTENT.format(rows="SELECT dataset_id, geometry FROM new_rows"),
+    'DELETE': STALE_EXTENT.format(rows="SELECT dataset_id, geometry FROM old_rows"),
+    'UPDATE': STALE_EXTENT.format(rows=CHANGED_ROWS.format(side='o')) +
+              GROW_EXTENT.format(rows=CHANGED_ROWS.format(side='r')),
+}
+
+
+def record_statement(op):
+    return statistics_0023.record_statement(op) + EXTENT_STATEMENTS[op]
+
+
+def record_function_sql(statement):
+    return statistics_0023.TRIGGER_FUNCTION.format(
+        name='main_record_statistics',
+        insert=statement('INSERT'),
+        delete=statement('DELETE'),
+        update=statement('UPDATE'),
+    )
+
+
+POPULATE_EXTENT_SQL = """
+UPDATE main_datasetstatistics s SET
+    extent_xmin = ST_XMin(e.extent), extent_ymin = ST_YMin(e.extent),
+    extent_xmax = ST_XMax(e.extent), extent_ymax = ST_YMax(e.extent),
+    extent_stale = false
+FROM (SELECT dataset_id, ST_Extent(geometry) AS extent FROM main_record GROUP BY dataset_id) e
+WHERE s.dataset_id = e.dataset_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_statistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetstatistics',
+            name='extent_xmin',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datasetstatistics',
+            name='extent_ymin',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datasetstatistics',
+            name='extent_xmax',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datasetstatistics',
+            name='extent_ymax',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='datasetstatistics',
+            name='extent_stale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunSQL(
+            record_function_sql(record_statement),
+            reverse_sql=record_function_sql(statistics_0023.record_statement)
+        ),
+        migrations.RunSQL(POPULATE_EXTENT_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
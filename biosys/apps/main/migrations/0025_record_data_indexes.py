@@ -0,0 +1,20 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0024_dataset_extent'),
+    ]
+
+    operations = [
+        # for the per dataset search indexes (see main.utils_indexes)
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='record',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['data'], name='main_record_data_gin',
+                                                           opclasses=['jsonb_path_ops']),
+        ),
+    ]
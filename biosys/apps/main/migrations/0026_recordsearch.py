@@ -0,0 +1,72 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The string and number values of the data and the upload file name (as jsonb_to_tsvector of postgres 11, which is
+# not available on postgres 10). The 'simple' configuration: no stemming or stop words, the data are mostly names and
+# codes.
+VECTOR = "to_tsvector('simple', coalesce((" \
+         "SELECT string_agg(v.value #>> '{{}}', ' ') " \
+         "FROM jsonb_each(CASE WHEN jsonb_typeof({row}.data) = 'object' THEN {row}.data ELSE '{{}}' END) v " \
+         "WHERE jsonb_typeof(v.value) IN ('string', 'number')" \
+         "), '')) || " \
+         "to_tsvector('simple', coalesce({row}.source_info ->> 'file_name', ''))"
+
+CREATE_SQL = """
+CREATE OR REPLACE FUNCTION main_record_search() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO main_recordsearch (record_id, vector) SELECT r.id, {new_vector} FROM new_rows r;
+    ELSIF TG_OP = 'DELETE' THEN
+        DELETE FROM main_recordsearch s USING old_rows o WHERE s.record_id = o.id;
+    ELSE
+        UPDATE main_recordsearch s SET vector = {new_vector}
+        FROM new_rows r JOIN old_rows o ON o.id = r.id
+        WHERE s.record_id = r.id AND (r.data IS DISTINCT FROM o.data OR r.source_info IS DISTINCT FROM o.source_info);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER main_record_search_insert AFTER INSERT ON main_record
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE main_record_search();
+CREATE TRIGGER main_record_search_delete AFTER DELETE ON main_record
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE main_record_search();
+CREATE TRIGGER main_record_search_update AFTER UPDATE ON main_record
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE main_record_search();
+""".format(new_vector=VECTOR.format(row='r'))
+
+DROP_SQL = """
+DROP TRIGGER IF EXISTS main_record_search_insert ON main_record;
+DROP TRIGGER IF EXISTS main_record_search_delete ON main_record;
+DROP TRIGGER IF EXISTS main_record_search_update ON main_record;
+DROP FUNCTION IF EXISTS main_record_search();
+"""
+
+POPULATE_SQL = "INSERT INTO main_recordsearch (record_id, vector) SELECT r.id, {} FROM main_record r;".format(
+    VECTOR.format(row='r'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0025_record_data_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordSearch',
+            fields=[
+                ('record', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True,
+                                                related_name='search', serialize=False, to='main.record')),
+                ('vector', django.contrib.postgres.search.SearchVectorField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recordsearch',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['vector'], name='main_recordsearch_vector_gin'),
+        ),
+        migrations.RunSQL(CREATE_SQL, reverse_sql=DROP_SQL),
+        migrations.RunSQL(POPULATE_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
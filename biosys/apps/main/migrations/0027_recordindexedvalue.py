@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0026_recordsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordIndexedValue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=500)),
+                ('number', models.FloatField(blank=True, null=True)),
+                ('date', models.DateField(blank=True, null=True)),
+                ('datetime', models.DateTimeField(blank=True, null=True)),
+                ('string', models.TextField(blank=True, null=True)),
+                ('record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                             related_name='indexed_values', to='main.record')),
+            ],
+            options={
+                'unique_together': {('record', 'field')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recordindexedvalue',
+            index=models.Index(fields=['field', 'number'], name='main_record_iv_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recordindexedvalue',
+            index=models.Index(fields=['field', 'date'], name='main_record_iv_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recordindexedvalue',
+            index=models.Index(fields=['field', 'datetime'], name='main_record_iv_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recordindexedvalue',
+            index=models.Index(fields=['field', 'string'], name='main_record_iv_string_idx'),
+        ),
+    ]
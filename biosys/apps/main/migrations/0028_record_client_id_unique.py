@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+# Before the unique constraint: the duplicated client ids of a dataset are only kept on the last modified record.
+# The blank client ids are not constrained and left as they are.
+CLEAR_DUPLICATED_CLIENT_IDS_SQL = """
+UPDATE main_record r SET client_id = NULL
+    FROM main_record o
+    WHERE o.dataset_id = r.dataset_id AND o.client_id = r.client_id AND r.client_id <> ''
+        AND (o.last_modified, o.id) > (r.last_modified, r.id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0027_recordindexedvalue'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CLEAR_DUPLICATED_CLIENT_IDS_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='record',
+            constraint=models.UniqueConstraint(condition=models.Q(client_id__isnull=False) & ~models.Q(client_id=''),
+                                               fields=('dataset', 'client_id'),
+                                               name='main_record_dataset_client_id_uniq'),
+        ),
+    ]
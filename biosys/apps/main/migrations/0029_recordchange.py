@@ -0,0 +1,90 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# The record changes are written by statement level triggers using transition tables (Postgres >= 10), one insert
+# per statement whatever the number of records.
+
+CHANGES_SQL = {
+    'INSERT': "SELECT dataset_id, id AS record_id, 'insert' AS operation FROM new_rows",
+    'DELETE': "SELECT dataset_id, id AS record_id, 'delete' AS operation FROM old_rows",
+    'UPDATE': """
+        SELECT r.dataset_id, r.id AS record_id, 'update' AS operation
+            FROM old_rows o JOIN new_rows r ON r.id = o.id WHERE r.dataset_id = o.dataset_id
+        UNION ALL
+        -- records moved to another dataset
+        SELECT o.dataset_id, o.id AS record_id, 'delete' AS operation
+            FROM old_rows o JOIN new_rows r ON r.id = o.id WHERE r.dataset_id <> o.dataset_id
+        UNION ALL
+        SELECT r.dataset_id, r.id AS record_id, 'insert' AS operation
+            FROM old_rows o JOIN new_rows r ON r.id = o.id WHERE r.dataset_id <> o.dataset_id
+    """,
+}
+
+INSERT_CHANGES = """
+        INSERT INTO main_recordchange (dataset_id, record_id, operation, txid, created)
+            SELECT dataset_id, record_id, operation, txid_current(), now() FROM ({changes}) changes
+            ORDER BY record_id;
+"""
+
+TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION main_record_changes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {insert}
+    ELSIF TG_OP = 'DELETE' THEN
+        {delete}
+    ELSE
+        {update}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER main_record_changes_insert AFTER INSERT ON main_record
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE main_record_changes();
+CREATE TRIGGER main_record_changes_delete AFTER DELETE ON main_record
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE main_record_changes();
+CREATE TRIGGER main_record_changes_update AFTER UPDATE ON main_record
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE main_record_changes();
+""".format(
+    insert=INSERT_CHANGES.format(changes=CHANGES_SQL['INSERT']),
+    delete=INSERT_CHANGES.format(changes=CHANGES_SQL['DELETE']),
+    update=INSERT_CHANGES.format(changes=CHANGES_SQL['UPDATE']),
+)
+
+DROP_TRIGGER_FUNCTION = """
+DROP TRIGGER IF EXISTS main_record_changes_insert ON main_record;
+DROP TRIGGER IF EXISTS main_record_changes_delete ON main_record;
+DROP TRIGGER IF EXISTS main_record_changes_update ON main_record;
+DROP FUNCTION IF EXISTS main_record_changes();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0028_record_client_id_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('record_id', models.IntegerField()),
+                ('operation', models.CharField(choices=[('insert', 'insert'), ('update', 'update'),
+                                                        ('delete', 'delete')], max_length=6)),
+                ('txid', models.BigIntegerField()),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('dataset', models.ForeignKey(db_constraint=False,
+                                              on_delete=django.db.models.deletion.DO_NOTHING,
+                                              related_name='record_changes', to='main.dataset')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recordchange',
+            index=models.Index(fields=['dataset', 'txid', 'seq'], name='main_recordchange_feed_idx'),
+        ),
+        migrations.RunSQL(TRIGGER_FUNCTION, reverse_sql=DROP_TRIGGER_FUNCTION),
+    ]
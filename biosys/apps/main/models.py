@@ -1,5 +1,7 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
+import datetime
+import json
 import logging
 from os import path
 
@@ -9,16 +11,23 @@ from tableschema import validate as tableschema_validate
 from tableschema import exceptions as tableschema_exceptions
 from django.conf import settings
 from django.contrib.gis.db import models
-from django.contrib.gis.db.models import Extent
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, transaction
+from django.db.models.sql import InsertQuery
 from django.db.models import JSONField
+from django.db.models.fields.json import KeyTransform
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.text import Truncator
 from django.db.models.query_utils import Q
 from timezone_field import TimeZoneField
 
 from main.constants import DATUM_CHOICES, MODEL_SRID
 from main.utils_auth import is_admin
-from main.utils_data_package import GenericSchema, ObservationSchema, SpeciesObservationSchema
+from main.utils_indexes import sync_dataset_indexes
+from main.utils_data_package import GenericSchema, ObservationSchema, SpeciesObservationSchema, SchemaCache, \
+    BiosysSchema, is_blank_value
 
 logger = logging.getLogger(__name__)
 
@@ -197,15 +206,15 @@ class Project(models.Model):
 
     @property
     def dataset_count(self):
-        return self.projects.count()
+        return get_statistics(self, ProjectStatistics, project_id=self.pk).dataset_count
 
     @property
     def site_count(self):
-        return self.site_set.count()
+        return get_statistics(self, ProjectStatistics, project_id=self.pk).site_count
 
     @property
     def record_count(self):
-        return Record.objects.filter(dataset__project=self).count()
+        return get_statistics(self, ProjectStatistics, project_id=self.pk).record_count
 
     class Meta:
         ordering = ['name']
@@ -310,6 +319,10 @@ class Form(models.Model):
         return '{}'.format(self.name)
 
 
+# Process-wide cache of the dataset parsed schemas (see Dataset.schema)
+schema_cache = SchemaCache(max_size=settings.SCHEMA_CACHE_SIZE)
+
+
 class Dataset(models.Model):
     TYPE_GENERIC = 'generic'
     TYPE_OBSERVATION = 'observation'
@@ -336,6 +349,61 @@ class Dataset(models.Model):
     def __str__(self):
         return '{}'.format(self.name)
 
+    def save(self, *args, **kwargs):
+        previous_data_package = None
+        if self.pk is not None:
+            previous_data_package = Dataset.objects.filter(pk=self.pk).values_list('data_package', flat=True).first()
+        super(Dataset, self).save(*args, **kwargs)
+        schema_cache.invalidate(self.pk)
+        if settings.RECORD_DATASET_INDEXES:
+            self._sync_record_indexes(self.pk, self.schema.field_names)
+        if previous_data_package is not None and \
+                self._get_indexed_fields(previous_data_package) != self._get_indexed_fields(self.data_package):
+            self._rebuild_indexed_values(self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super(Dataset, self).delete(*args, **kwargs)
+        schema_cache.invalidate(pk)
+        if settings.RECORD_DATASET_INDEXES:
+            self._sync_record_indexes(pk, [])
+        return result
+
+    @staticmethod
+    def _sync_record_indexes(dataset_id, field_names):
+        def _sync():
+            try:
+                sync_dataset_indexes(dataset_id, field_names)
+            except Exception:
+                logger.exception('Error while syncing the record indexes of the dataset {}'.format(dataset_id))
+
+        # after the commit, so the indexes can be built concurrently.
+        transaction.on_commit(_sync)
+
+    @staticmethod
+    def _rebuild_indexed_values(dataset_id):
+        def _rebuild():
+            try:
+                with transaction.atomic():
+                    dataset = Dataset.objects.filter(pk=dataset_id).first()
+                    if dataset is not None:
+                        RecordIndexedValue.rebuild_dataset(dataset)
+            except Exception:
+                logger.exception('Error while rebuilding the indexed values of the dataset {}'.format(dataset_id))
+
+        # after the commit: the dataset update doesn't wait for the rewrite of all its records values.
+        transaction.on_commit(_rebuild)
+
+    @staticmethod
+    def _get_indexed_fields(data_package):
+        # the raw descriptors of the schema indexed fields, to detect a change without parsing the schema.
+        resources = (data_package or {}).get('resources') or [{}]
+        fields = resources[0].get('schema', {}).get('fields', [])
+        return [
+            field for field in fields
+            if (field.get(BiosysSchema.BIOSYS_KEY_NAME) or {}).get(BiosysSchema.INDEXED_KEY_NAME) is True
+        ]
+
     @property
     def record_model(self):
         """
@@ -351,11 +419,17 @@ class Dataset(models.Model):
 
     @property
     def record_count(self):
-        return self.record_queryset.count()
+        return get_statistics(self, DatasetStatistics, dataset_id=self.pk).record_count
 
     @property
     def extent(self):
-        return self.record_queryset.aggregate(Extent('geometry'))['geometry__extent']
+        statistics = get_statistics(self, DatasetStatistics, dataset_id=self.pk)
+        if statistics.extent_stale:
+            # stored once, after the current transaction: the read doesn't hold the statistics row lock until the end
+            # of the request and the next reads don't touch the records.
+            transaction.on_commit(statistics.refresh_stale_extent)
+            return statistics.compute_extent()
+        return statistics.extent
 
     @property
     def schema_class(self):
@@ -372,7 +446,8 @@ class Dataset(models.Model):
 
     @property
     def schema(self):
-        return self.schema_class(self.schema_data)
+        # the parsed schema is cached: don't modify it.
+        return schema_cache.get(self.pk, self.schema_class, self.schema_data)
 
     @property
     def resource(self):
@@ -594,6 +669,10 @@ class Dataset(models.Model):
 
 
 class Record(models.Model):
+    # the fields written by the upsert of an existing record (see upsert_by_client_id). The curation flags and the
+    # source info are only set on insert.
+    UPSERT_UPDATE_FIELDS = ['data', 'site', 'datetime', 'geometry', 'species_name', 'name_id', 'last_modified']
+
     dataset = models.ForeignKey(Dataset, null=False, blank=False, on_delete=models.CASCADE)
     data = JSONField()
     site = models.ForeignKey(Site, null=True, blank=True, on_delete=models.SET_NULL)
@@ -621,10 +700,65 @@ class Record(models.Model):
     def __str__(self):
         return "{0}: {1}".format(self.dataset.name, Truncator(self.data).chars(100))
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        sync_indexed_values = adding or self._indexed_data_changed(kwargs.get('update_fields'))
+        super(Record, self).save(*args, **kwargs)
+        if sync_indexed_values:
+            RecordIndexedValue.sync_records([self], replace=not adding)
+
+    def _indexed_data_changed(self, update_fields=None):
+        """
+        Before the save of an existing record: True if the indexed values have to be written again, i.e. the
+        dataset has indexed fields and the saved data (or dataset) differ from the stored ones.
+        """
+        if update_fields is not None and not {'data', 'dataset'} & set(update_fields):
+            return False
+        if 'data' in self.get_deferred_fields() or not self.dataset.schema.indexed_fields:
+            return False
+        return not Record.objects.filter(pk=self.pk, dataset_id=self.dataset_id, data=self.data).exists()
+
     @property
     def data_with_id(self):
         return dict({'id': self.id}, **self.data)
 
+    @classmethod
+    def upsert_by_client_id(cls, records):
+        """
+        Insert the records in one statement. A record with the client_id of an existing record of its dataset updates
+        this record instead (INSERT ... ON CONFLICT (dataset_id, client_id) DO UPDATE).
+        The client_id of the records must be set, not empty and unique per dataset. The indexed values are not written
+        (see RecordIndexedValue.sync_records).
+        :param records: unsaved records. Their pk, created and last_modified are set from the database.
+        :return: for every record, True if it has been inserted, False if it has updated an existing record.
+        """
+        if not records:
+            return []
+        fields = [field for field in cls._meta.concrete_fields if not field.primary_key]
+        query = InsertQuery(cls)
+        query.insert_values(fields, records)
+        insert_sql, params = query.get_compiler(connection=connection).as_sql()[0]
+        qn = connection.ops.quote_name
+        update_sql = ', '.join(
+            '{column} = EXCLUDED.{column}'.format(column=qn(cls._meta.get_field(name).column))
+            for name in cls.UPSERT_UPDATE_FIELDS
+        )
+        # the conflict target must repeat the predicate of the partial unique index.
+        sql = '{} ON CONFLICT (dataset_id, client_id) WHERE client_id IS NOT NULL AND client_id <> \'\' ' \
+              'DO UPDATE SET {} RETURNING id, created, last_modified, (xmax = 0)'.format(insert_sql, update_sql)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        inserted = []
+        # the rows are returned in the VALUES order (as for bulk_create).
+        for record, (pk, created, last_modified, is_insert) in zip(records, rows):
+            record.pk = pk
+            record.created = created
+            record.last_modified = last_modified
+            record._state.adding = False
+            inserted.append(is_insert)
+        return inserted
+
     @property
     def parents(self):
         """
@@ -729,6 +863,466 @@ class Record(models.Model):
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            # keyset (cursor) pagination of the dataset records (see main.api.pagination)
+            models.Index(fields=['dataset', 'id'], name='main_record_dataset_id_idx'),
+            models.Index(fields=['dataset', 'last_modified', 'id'], name='main_record_ds_last_mod_idx'),
+            # json containment filters (data @> ...). The search and ordering indexes are per dataset, see
+            # main.utils_indexes
+            GinIndex(fields=['data'], name='main_record_data_gin', opclasses=['jsonb_path_ops']),
+        ]
+        constraints = [
+            # mobile sync: one record per client id in a dataset (see upsert_by_client_id). The blank client id of
+            # the forms is not an id.
+            models.UniqueConstraint(fields=['dataset', 'client_id'],
+                                    condition=Q(client_id__isnull=False) & ~Q(client_id=''),
+                                    name='main_record_dataset_client_id_uniq'),
+        ]
+
+
+class RecordSearch(models.Model):
+    """
+    The full text search vector of a record: the words of its data string and numeric values and of its source file
+    name (see main.utils_misc.full_text_search).
+    Kept in a side table, so it's not loaded with the records, and maintained by database triggers on the records
+    (see migration 0026_recordsearch), including the bulk inserts and updates.
+    """
+    record = models.OneToOneField(Record, primary_key=True, related_name='search',
+                                  on_delete=models.DO_NOTHING)  # deleted by trigger
+    vector = SearchVectorField()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['vector'], name='main_recordsearch_vector_gin'),
+        ]
+
+
+class RecordChange(models.Model):
+    """
+    The change log of the records, for the delta sync of the clients (see main.api.views.DatasetRecordChangesView).
+    One row per inserted, updated or deleted record, written by statement level triggers on the records (see migration
+    0029_recordchange), so the bulk writes and the queryset updates and deletes are logged as well. A record moved to
+    another dataset is logged as a delete in its old dataset and an insert in the new one.
+    Append only: the dataset is not a database foreign key so the changes survive the records and the dataset.
+    The seq are allocated in the insert order, not the commit order. The changes are read in (txid, seq) order and
+    only once their transaction is older than every running transaction (see get_changes), so that a client never
+    misses a change committed after its last read.
+    """
+    OPERATION_INSERT = 'insert'
+    OPERATION_UPDATE = 'update'
+    OPERATION_DELETE = 'delete'
+    OPERATION_CHOICES = (
+        (OPERATION_INSERT, OPERATION_INSERT),
+        (OPERATION_UPDATE, OPERATION_UPDATE),
+        (OPERATION_DELETE, OPERATION_DELETE),
+    )
+    # the changes of the transactions finished before every running one. Not the changes of the current transaction:
+    # a read past them would skip the changes of the older transactions still running.
+    VISIBLE_SQL = 'main_recordchange.txid < txid_snapshot_xmin(txid_current_snapshot())'
+
+    seq = models.BigAutoField(primary_key=True)
+    dataset = models.ForeignKey(Dataset, related_name='record_changes', on_delete=models.DO_NOTHING,
+                                db_constraint=False)
+    record_id = models.IntegerField()
+    operation = models.CharField(max_length=6, choices=OPERATION_CHOICES)
+    txid = models.BigIntegerField()
+    created = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def get_changes(cls, dataset, since=None, limit=None):
+        """
+        The changes of a dataset after a change, in (txid, seq) order.
+        :param since: the seq of the last change read by the client. None to read from the start.
+        :param limit: max number of changes
+        :return: a queryset. Raise a RecordChange.DoesNotExist if the since change doesn't exist.
+        """
+        queryset = cls.objects.filter(dataset=dataset).extra(where=[cls.VISIBLE_SQL])
+        if since:
+            since_txid = cls.objects.values_list('txid', flat=True).get(seq=since)
+            queryset = queryset.filter(Q(txid__gt=since_txid) | Q(txid=since_txid, seq__gt=since))
+        queryset = queryset.order_by('txid', 'seq')
+        return queryset[:limit] if limit else queryset
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dataset', 'txid', 'seq'], name='main_recordchange_feed_idx'),
+        ]
+
+
+class RecordIndexedValue(models.Model):
+    """
+    The typed value of a record data field tagged as indexed in the dataset schema (biosys: {indexed: true}), for the
+    index backed filters of the records: data.<field>__<lookup> (see main.api.filters.RecordFilterSet). Range queries
+    on the number and date fields can't be done on the record json data without casting every record.
+    One row per record and indexed field with a non blank value. Only the column of the field type is set.
+    Written on the record save when its data change and on the bulk writes (see sync_records) and rebuilt for all the
+    dataset records after the commit of a change of the indexed fields of the dataset schema (see rebuild_dataset).
+    """
+    NUMBER_COLUMN = 'number'
+    DATE_COLUMN = 'date'
+    DATETIME_COLUMN = 'datetime'
+    STRING_COLUMN = 'string'
+
+    record = models.ForeignKey(Record, related_name='indexed_values', on_delete=models.CASCADE)
+    field = models.CharField(max_length=500)
+    number = models.FloatField(null=True, blank=True)
+    date = models.DateField(null=True, blank=True)
+    datetime = models.DateTimeField(null=True, blank=True)
+    string = models.TextField(null=True, blank=True)
+
+    @classmethod
+    def get_column(cls, field_type):
+        """
+        The column of the values of a schema field type. The types without a specific column are indexed as string.
+        """
+        if field_type in ['number', 'integer']:
+            return cls.NUMBER_COLUMN
+        if field_type == 'date':
+            return cls.DATE_COLUMN
+        if field_type == 'datetime':
+            return cls.DATETIME_COLUMN
+        return cls.STRING_COLUMN
+
+    @classmethod
+    def cast_value(cls, field, value, tz=None):
+        """
+        :param field: a SchemaField
+        :param tz: the timezone of the naive datetime values
+        :return: the value for the field column or None if the value is blank or can't be cast.
+        """
+        if is_blank_value(value):
+            return None
+        column = cls.get_column(field.type)
+        if column == cls.STRING_COLUMN:
+            return str(value).strip() or None
+        try:
+            value = field.cast(value)
+        except Exception:
+            return None
+        if column == cls.DATETIME_COLUMN and isinstance(value, datetime.datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value, tz or timezone.get_current_timezone())
+        return value
+
+    @classmethod
+    def build_values(cls, dataset, fields, records):
+        """
+        :param fields: the dataset schema indexed fields
+        :param records: saved records of the dataset
+        :return: a generator of unsaved RecordIndexedValue
+        """
+        tz = None
+        if any(cls.get_column(field.type) == cls.DATETIME_COLUMN for field in fields):
+            tz = dataset.project.timezone
+        for record in records:
+            data = record.data or {}
+            for field in fields:
+                value = cls.cast_value(field, data.get(field.name), tz=tz)
+                if value is not None:
+                    yield cls(record_id=record.pk, field=field.name, **{cls.get_column(field.type): value})
+
+    @classmethod
+    def sync_records(cls, records, replace=True):
+        """
+        Write the indexed values of saved records. Nothing is done for the records of a dataset without indexed field.
+        :param replace: False for new records (no previous values to delete).
+        """
+        by_dataset = {}
+        for record in records:
+            by_dataset.setdefault(record.dataset_id, []).append(record)
+        for dataset_records in by_dataset.values():
+            dataset = dataset_records[0].dataset
+            fields = dataset.schema.indexed_fields
+            if not fields:
+                continue
+            if replace:
+                cls.objects.filter(record__in=[record.pk for record in dataset_records]).delete()
+            cls.objects.bulk_create(cls.build_values(dataset, fields, dataset_records))
+
+    @classmethod
+    def rebuild_dataset(cls, dataset, batch_size=2000):
+        """
+        Rewrite the indexed values of all the dataset records.
+        """
+        cls.objects.filter(record__dataset=dataset).delete()
+        fields = dataset.schema.indexed_fields
+        if not fields:
+            return
+        records = dataset.record_queryset.only('id', 'data').iterator(chunk_size=batch_size)
+        batch = []
+        for value in cls.build_values(dataset, fields, records):
+            batch.append(value)
+            if len(batch) >= batch_size:
+                cls.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            cls.objects.bulk_create(batch)
+
+    class Meta:
+        unique_together = ('record', 'field')
+        indexes = [
+            models.Index(fields=['field', 'number'], name='main_record_iv_number_idx'),
+            models.Index(fields=['field', 'date'], name='main_record_iv_date_idx'),
+            models.Index(fields=['field', 'datetime'], name='main_record_iv_datetime_idx'),
+            models.Index(fields=['field', 'string'], name='main_record_iv_string_idx'),
+        ]
+
+
+class RecordRelationsResolver(object):
+    """
+    Batch version of the Record.parents and Record.children properties.
+    Resolve the parent id and children ids of a list of records (typically a page of records) with one query per
+    related dataset instead of one per record.
+    The foreign key mapping between datasets is computed once per resolver (dataset of the records).
+    Usage:
+        resolver = RecordRelationsResolver().resolve(records)
+        resolver.parent_ids[record.pk]  # the FIRST parent id or None
+        resolver.children_ids[record.pk]  # a list of children ids or None if the dataset has no primary key
+    """
+
+    def __init__(self):
+        # dataset pk -> (parent_dataset, parent_field, child_field) or None
+        self._parent_lookups = {}
+        # dataset pk -> [(child_dataset, parent_field, child_field), ...] or None
+        self._children_lookups = {}
+        self.parent_ids = {}
+        self.children_ids = {}
+
+    @staticmethod
+    def _key(value):
+        # json values are not always hashable (list, dict)
+        return json.dumps(value, sort_keys=True)
+
+    @staticmethod
+    def _find_related_ids(dataset, field, values):
+        """
+        :return: a dict key(value) -> [record ids] (ordered by id) for the records of the dataset where
+        data[field] is one of the values.
+        """
+        result = {}
+        if not values:
+            return result
+        queryset = Record.objects.filter(dataset=dataset) \
+            .annotate(_related_value=KeyTransform(field, 'data')) \
+            .filter(_related_value__in=values) \
+            .order_by('id') \
+            .values_list('_related_value', 'id')
+        for value, record_id in queryset:
+            result.setdefault(RecordRelationsResolver._key(value), []).append(record_id)
+        return result
+
+    def _get_parent_lookup(self, dataset):
+        if dataset.pk not in self._parent_lookups:
+            lookup = None
+            if dataset.has_foreign_keys:
+                parent_dataset = dataset.get_parent_dataset
+                if parent_dataset:
+                    parent_field, child_field = dataset.get_fk_lookup_fields_for_dataset(parent_dataset)
+                    if parent_field and child_field:
+                        lookup = (parent_dataset, parent_field, child_field)
+            self._parent_lookups[dataset.pk] = lookup
+        return self._parent_lookups[dataset.pk]
+
+    def _get_children_lookups(self, dataset):
+        if dataset.pk not in self._children_lookups:
+            lookups = None
+            if dataset.has_primary_key:
+                lookups = []
+                for child_dataset in dataset.get_children_datasets():
+                    parent_field, child_field = child_dataset.get_fk_lookup_fields_for_dataset(dataset)
+                    if parent_field and child_field:
+                        lookups.append((child_dataset, parent_field, child_field))
+            self._children_lookups[dataset.pk] = lookups
+        return self._children_lookups[dataset.pk]
+
+    def resolve(self, records):
+        """
+        :param records: an iterable of Record. Better if the dataset is 'selected related'.
+        :return: self
+        """
+        records_by_dataset = {}
+        datasets = {}
+        for record in records:
+            records_by_dataset.setdefault(record.dataset_id, []).append(record)
+            datasets.setdefault(record.dataset_id, record.dataset)
+
+        for dataset_id, dataset_records in records_by_dataset.items():
+            dataset = datasets[dataset_id]
+            self._resolve_parents(dataset, dataset_records)
+            self._resolve_children(dataset, dataset_records)
+        return self
+
+    def _resolve_parents(self, dataset, records):
+        lookup = self._get_parent_lookup(dataset)
+        if lookup is None:
+            # same as Record.parents: None if no foreign key, no parent if no parent dataset.
+            for record in records:
+                self.parent_ids[record.pk] = None
+            return
+        parent_dataset, parent_field, child_field = lookup
+        values = [record.data.get(child_field) for record in records]
+        related = self._find_related_ids(parent_dataset, parent_field, [v for v in values if v])
+        for record, value in zip(records, values):
+            ids = related.get(self._key(value)) if value else None
+            self.parent_ids[record.pk] = ids[0] if ids else None
+
+    def _resolve_children(self, dataset, records):
+        lookups = self._get_children_lookups(dataset)
+        if lookups is None:
+            for record in records:
+                self.children_ids[record.pk] = None
+            return
+        for record in records:
+            self.children_ids[record.pk] = []
+        for child_dataset, parent_field, child_field in lookups:
+            values = [record.data.get(parent_field) for record in records]
+            related = self._find_related_ids(child_dataset, child_field, [v for v in values if v])
+            for record, value in zip(records, values):
+                if value:
+                    self.children_ids[record.pk] += related.get(self._key(value), [])
+        # the children are ordered by id (Record ordering) whatever their dataset.
+        for record in records:
+            self.children_ids[record.pk].sort()
+
+
+class DatasetStatistics(models.Model):
+    """
+    The record count and the extent (bounding box of the record geometries) of a dataset.
+    Maintained by database triggers on the records (see migrations 0023_statistics and 0024_dataset_extent) so that
+    bulk inserts, deletes, updates and raw SQL are accounted for.
+    The extent grows with the inserted/updated geometries. When a geometry on the edge of the extent is deleted or
+    changed the extent is flagged as stale: the first read computes it from the records and stores it after its
+    transaction (see refresh_stale_extent).
+    The record writes lock the statistics row until the end of their transaction: the concurrent writes to the records
+    of a dataset are serialised on it (see migration 0023_statistics).
+    Can be recomputed with the rebuild_statistics management command.
+    """
+    dataset = models.OneToOneField(Dataset, primary_key=True, on_delete=models.CASCADE, related_name='statistics')
+    record_count = models.BigIntegerField(default=0)
+    extent_xmin = models.FloatField(null=True, blank=True)
+    extent_ymin = models.FloatField(null=True, blank=True)
+    extent_xmax = models.FloatField(null=True, blank=True)
+    extent_ymax = models.FloatField(null=True, blank=True)
+    extent_stale = models.BooleanField(default=False)
+
+    EXTENT_SQL = """
+        SELECT ST_XMin(e.extent), ST_YMin(e.extent), ST_XMax(e.extent), ST_YMax(e.extent)
+        FROM (SELECT ST_Extent(geometry) AS extent FROM main_record WHERE dataset_id = %s) e
+    """
+
+    REFRESH_EXTENT_SQL = """
+        UPDATE main_datasetstatistics s SET
+            extent_xmin = ST_XMin(e.extent), extent_ymin = ST_YMin(e.extent),
+            extent_xmax = ST_XMax(e.extent), extent_ymax = ST_YMax(e.extent),
+            extent_stale = false
+        FROM (SELECT ST_Extent(geometry) AS extent FROM main_record WHERE dataset_id = %s) e
+        WHERE s.dataset_id = %s
+    """
+
+    # a row locked by a record write is skipped: its extent stays stale until the next read.
+    REFRESH_STALE_EXTENT_SQL = REFRESH_EXTENT_SQL + """
+        AND s.dataset_id IN (
+            SELECT dataset_id FROM main_datasetstatistics WHERE dataset_id = %s AND extent_stale FOR UPDATE SKIP LOCKED
+        )
+    """
+
+    class Meta:
+        verbose_name_plural = "dataset_statistics"
+
+    @property
+    def extent(self):
+        """
+        Same as the Extent('geometry') aggregate of the dataset records: (xmin, ymin, xmax, ymax) or None
+        """
+        if self.extent_xmin is None:
+            return None
+        return self.extent_xmin, self.extent_ymin, self.extent_xmax, self.extent_ymax
+
+    def compute_extent(self):
+        """
+        The extent computed from the records, without saving it.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(self.EXTENT_SQL, [self.dataset_id])
+            extent = cursor.fetchone()
+        return tuple(extent) if extent is not None and extent[0] is not None else None
+
+    def refresh_extent(self):
+        """
+        Recompute and save the extent from the records.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(self.REFRESH_EXTENT_SQL, [self.dataset_id, self.dataset_id])
+        self.refresh_from_db(fields=['extent_xmin', 'extent_ymin', 'extent_xmax', 'extent_ymax', 'extent_stale'])
+
+    def refresh_stale_extent(self):
+        """
+        Recompute and save the extent in its own transaction, if it is still stale. Errors are logged, not raised: it
+        runs after the commit of the request that read the extent.
+        """
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(self.REFRESH_STALE_EXTENT_SQL, [self.dataset_id, self.dataset_id, self.dataset_id])
+        except Exception:
+            logger.exception('Error while refreshing the extent of the dataset {}'.format(self.dataset_id))
+
+
+class ProjectStatistics(models.Model):
+    """
+    The dataset, site and record counts of a project. Maintained by database triggers on the datasets, sites and
+    records (see migration 0023_statistics). As for the DatasetStatistics, the concurrent writes to a project are
+    serialised on its statistics row.
+    Can be recomputed with the rebuild_statistics management command.
+    """
+    project = models.OneToOneField(Project, primary_key=True, on_delete=models.CASCADE, related_name='statistics')
+    dataset_count = models.BigIntegerField(default=0)
+    site_count = models.BigIntegerField(default=0)
+    record_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "project_statistics"
+
+
+REBUILD_STATISTICS_SQL = """
+LOCK TABLE main_project, main_dataset, main_site, main_record IN SHARE MODE;
+DELETE FROM main_datasetstatistics;
+DELETE FROM main_projectstatistics;
+INSERT INTO main_datasetstatistics (dataset_id, record_count, extent_xmin, extent_ymin, extent_xmax, extent_ymax)
+    SELECT d.id, count(r.id),
+        ST_XMin(ST_Extent(r.geometry)), ST_YMin(ST_Extent(r.geometry)),
+        ST_XMax(ST_Extent(r.geometry)), ST_YMax(ST_Extent(r.geometry))
+    FROM main_dataset d LEFT JOIN main_record r ON r.dataset_id = d.id GROUP BY d.id;
+INSERT INTO main_projectstatistics (project_id, dataset_count, site_count, record_count)
+    SELECT p.id,
+        (SELECT count(*) FROM main_dataset d WHERE d.project_id = p.id),
+        (SELECT count(*) FROM main_site s WHERE s.project_id = p.id),
+        (SELECT coalesce(sum(ds.record_count), 0) FROM main_datasetstatistics ds
+            JOIN main_dataset d ON d.id = ds.dataset_id WHERE d.project_id = p.id)
+    FROM main_project p;
+"""
+
+
+def rebuild_statistics():
+    """
+    Recompute all the dataset and project statistics. The writes on the projects, datasets, sites and records are
+    blocked during the rebuild.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_STATISTICS_SQL)
+
+
+def get_statistics(instance, statistics_model, **lookup):
+    """
+    The statistics of a project or a dataset, with all counts to 0 if there's none yet.
+    The statistics are maintained by the database, not by the instance, so they are read from the database unless
+    they have been loaded with select_related('statistics') (list views).
+    """
+    if type(instance).statistics.is_cached(instance):
+        statistics = getattr(instance, 'statistics', None)
+    else:
+        statistics = statistics_model.objects.filter(**lookup).first()
+    return statistics if statistics is not None else statistics_model(**lookup)
 
 
 def get_media_path(instance, filename):
@@ -1027,3 +1621,77 @@ class DatasetMedia(models.Model):
 
     def has_object_destroy_permission(self, request):
         return is_admin(request.user) or self.is_data_engineer(request.user)
+
+
+def get_upload_job_path(instance, filename):
+    """
+    The function used in RecordUploadJob file field to build the path of the uploaded file.
+    :param instance:
+    :param filename:
+    :return: string
+    """
+    try:
+        return 'project_{project}/dataset_{dataset}/uploads/{filename}'.format(
+            project=instance.dataset.project.id,
+            dataset=instance.dataset.id,
+            filename=filename
+        )
+    except Exception as e:
+        logger.exception('Error while building the upload job file name')
+        return 'unknown/uploads/{}'.format(filename)
+
+
+class RecordUploadJob(models.Model):
+    """
+    A records file upload processed in the background (see main.api.jobs).
+    The per-row results (same as the synchronous upload response) are stored once the job is done.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCESS = 'success'
+    STATUS_ERROR = 'error'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, STATUS_PENDING.capitalize()),
+        (STATUS_RUNNING, STATUS_RUNNING.capitalize()),
+        (STATUS_SUCCESS, STATUS_SUCCESS.capitalize()),
+        (STATUS_ERROR, STATUS_ERROR.capitalize()),
+    ]
+    dataset = models.ForeignKey(Dataset, blank=False, null=False, on_delete=models.CASCADE,
+                                related_name='upload_jobs')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    file = models.FileField(upload_to=get_upload_job_path)
+    file_name = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    # upload options
+    create_site = models.BooleanField(default=False)
+    delete_previous = models.BooleanField(default=False)
+    strict = models.BooleanField(default=False)
+    # progress
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    rows_processed = models.IntegerField(default=0)
+    rows_with_error = models.IntegerField(default=0)
+    results = JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return '{} ({})'.format(self.file_name, self.status)
+
+    @property
+    def is_done(self):
+        return self.status in [self.STATUS_SUCCESS, self.STATUS_ERROR]
+
+    # API permissions
+    @staticmethod
+    def has_read_permission(request):
+        return True
+
+    def has_object_read_permission(self, request):
+        user = request.user
+        return is_admin(user) or user == self.user or \
+            self.dataset.is_custodian(user) or self.dataset.is_data_engineer(user)
@@ -4,7 +4,7 @@ import tempfile
 
 from django.conf import settings
 from django.shortcuts import reverse
-from django.test import TestCase, override_settings
+from django.test import TestCase, TransactionTestCase, override_settings
 from openpyxl import Workbook
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -71,9 +71,7 @@ class LightSpeciesFacade(SpeciesFacade):
         return []
 
 
-@override_settings(PASSWORD_HASHERS=('django.contrib.auth.hashers.MD5PasswordHasher',),
-                   REST_FRAMEWORK_TEST_SETTINGS=REST_FRAMEWORK_TEST_SETTINGS)
-class BaseUserTestCase(TestCase):
+class BaseUserMixin(object):
     """
     A test case that provides some users and authenticated clients.
     This class also set the species facade to be the test one (not real herbie).
@@ -311,6 +309,22 @@ class BaseUserTestCase(TestCase):
         return dataset
 
 
+@override_settings(PASSWORD_HASHERS=('django.contrib.auth.hashers.MD5PasswordHasher',),
+                   REST_FRAMEWORK_TEST_SETTINGS=REST_FRAMEWORK_TEST_SETTINGS)
+class BaseUserTestCase(BaseUserMixin, TestCase):
+    """
+    Every test runs in a transaction rolled back at its end.
+    """
+
+
+@override_settings(PASSWORD_HASHERS=('django.contrib.auth.hashers.MD5PasswordHasher',),
+                   REST_FRAMEWORK_TEST_SETTINGS=REST_FRAMEWORK_TEST_SETTINGS)
+class BaseUserTransactionTestCase(BaseUserMixin, TransactionTestCase):
+    """
+    The BaseUserTestCase for the tests that need their writes committed, e.g. to read the record changes.
+    """
+
+
 def set_site(record_data, dataset, site):
     """
     Update the 'Site' column value with the given site code
@@ -1,7 +1,7 @@
 from django.urls import reverse
 from rest_framework import status
 
-from main.models import Dataset, Record
+from main.models import Dataset
 from main.tests.api import helpers
 from main import constants
 
@@ -190,6 +190,60 @@ class LatLongSchema(helpers.BaseUserTestCase):
         expected_geometry = new_geometry
         self.assertEqual(data['geometry'], expected_geometry)
 
+    def test_batch(self):
+        project = self.project_1
+        client = self.custodian_1_client
+        schema = self.schema_with_lat_long()
+        dataset = self._create_dataset_with_schema(project, self.data_engineer_1_client, schema)
+
+        # data to geometry
+        url = reverse('api:data-to-geometry-batch', kwargs={'pk': dataset.pk})
+        # not a list
+        resp = client.post(url, data={'data': {'Longitude': 118, 'Latitude': -34.0}}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        payload = [
+            {'data': {'Longitude': 118, 'Latitude': -34.0, 'Datum': 'WGS84'}},
+            {'data': {'Longitude': 118, 'Latitude': -34.0, 'Datum': 'Unknown'}},
+            {'data': {'What': 'No coordinates'}},
+            {'data': {'Longitude': 117.5, 'Latitude': -33.0, 'Datum': 'WGS84'}},
+        ]
+        resp = client.post(url, data=payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        results = resp.json()
+        self.assertEqual(len(results), len(payload))
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual(results[0]['data'], payload[0]['data'])
+        self.assertEqual(results[0]['geometry'], {'type': 'Point', 'coordinates': [118, -34.0]})
+        self.assertIsNotNone(results[1]['error'])
+        self.assertEqual(results[1]['data'], payload[1]['data'])
+        self.assertIsNotNone(results[2]['error'])
+        self.assertIsNone(results[3]['error'])
+        self.assertEqual(results[3]['geometry'], {'type': 'Point', 'coordinates': [117.5, -33.0]})
+
+        # geometry to data
+        url = reverse('api:geometry-to-data-batch', kwargs={'pk': dataset.pk})
+        payload = [
+            {'geometry': {'type': 'Point', 'coordinates': [118, -34.0]}},
+            {'data': {'What': 'No geometry'}},
+            {
+                'geometry': {'type': 'Point', 'coordinates': [117.5, -33.0]},
+                'data': {'What': 'Updated What', 'Longitude': 0, 'Latitude': 0, 'Datum': 'WGS84'}
+            },
+        ]
+        resp = client.post(url, data=payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        results = resp.json()
+        self.assertEqual(len(results), len(payload))
+        expected_datum, expected_zone = constants.get_datum_and_zone(project.datum)
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual(results[0]['data'], {'Longitude': 118.0, 'Latitude': -34.0, 'Datum': expected_datum})
+        self.assertEqual(results[1]['error'], 'geometry is required.')
+        self.assertIsNone(results[2]['error'])
+        self.assertEqual(results[2]['data'], {
+            'What': 'Updated What', 'Longitude': 117.5, 'Latitude': -33.0, 'Datum': 'WGS84'
+        })
+        self.assertEqual(results[2]['geometry'], payload[2]['geometry'])
+
 
 class EastingNorthingSchema(helpers.BaseUserTestCase):
     @staticmethod
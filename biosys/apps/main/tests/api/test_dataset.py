@@ -1,7 +1,7 @@
 from django.urls import reverse
 from rest_framework import status
 
-from main.models import Dataset
+from main.models import Dataset, Record
 from main.tests.api import helpers
 from main.tests.test_data_package import (
     clone,
@@ -697,6 +697,51 @@ class TestRecordsView(helpers.BaseUserTestCase):
         self.assertEqual(len(resp.json()), 0)
 
 
+class TestRecordChanges(helpers.BaseUserTransactionTestCase):
+    """
+    The change feed of the dataset records. The changes are only visible once committed.
+    """
+
+    def _more_setup(self):
+        self.client = self.data_engineer_1_client
+        self.dataset = self._create_dataset_with_schema(self.project_1, self.client, TestRecordsView.schema_fields)
+        self.url = reverse('api:dataset-records', kwargs={'pk': self.dataset.pk})
+
+    def test_changes(self):
+        url = reverse('api:dataset-changes', kwargs={'pk': self.dataset.pk})
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json(), {'changes': [], 'last_seq': 0, 'has_more': False})
+
+        records = [self._create_record(self.client, self.dataset, {'What': str(i)}) for i in range(3)]
+        Record.objects.filter(pk=records[0].pk).update(data={'What': 'updated'})
+        resp = self.client.delete(self.url, data=[records[1].pk], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        changes = resp.json()['changes']
+        self.assertEqual(
+            [(change['record_id'], change['operation']) for change in changes],
+            [(records[0].pk, 'insert'), (records[1].pk, 'insert'), (records[2].pk, 'insert'),
+             (records[0].pk, 'update'), (records[1].pk, 'delete')]
+        )
+        self.assertFalse(resp.json()['has_more'])
+        self.assertEqual(resp.json()['last_seq'], changes[-1]['seq'])
+
+        # paging from the last read change
+        resp = self.client.get(url, {'since': changes[1]['seq'], 'limit': 2})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([change['seq'] for change in resp.json()['changes']], [c['seq'] for c in changes[2:4]])
+        self.assertTrue(resp.json()['has_more'])
+        resp = self.client.get(url, {'since': resp.json()['last_seq']})
+        self.assertEqual([change['seq'] for change in resp.json()['changes']], [changes[4]['seq']])
+
+        # read only access
+        self.assertEqual(self.readonly_client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, {'since': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class TestDatasetRecordsSearchAndOrdering(helpers.BaseUserTestCase):
 
     def _more_setup(self):
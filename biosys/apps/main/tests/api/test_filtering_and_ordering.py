@@ -1,4 +1,5 @@
 import json
+from unittest import mock
 
 from django.urls import reverse
 from django.contrib.gis.geos import Polygon, Point, MultiPolygon
@@ -93,6 +94,40 @@ class TestJsonSearchAndOrdering(helpers.BaseUserTestCase):
         record_values_as_string = [str(v) for v in record['data'].values()]
         self.assertEqual(sorted(list(record_values_as_string)), expected_data)
 
+    def test_full_text_search(self):
+        """
+        search_mode=fulltext: prefix match of every word, best match first.
+        """
+        dataset = self._create_dataset_and_records_from_rows([
+            ['What', 'When', 'Who'],
+            ['Acacia pycnantha', '2018-02-14', 'Serge'],
+            ['Acacia saligna', '2018-02-14', 'Shay'],
+            ['Eucalyptus', '2018-02-14', 'Acacia Serge'],
+        ])
+        client = self.custodian_1_client
+        for url, params in [
+            (reverse('api:record-list'), {'dataset__id': dataset.pk}),
+            (reverse('api:dataset-records', kwargs={'pk': dataset.pk}), {}),
+        ]:
+            params.update({'search_mode': 'fulltext'})
+            params['search'] = 'acac pyc'
+            resp = client.get(url, params)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual([r['data']['What'] for r in resp.json()], ['Acacia pycnantha'])
+
+            params['search'] = 'serge'
+            resp = client.get(url, params)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(sorted([r['data']['What'] for r in resp.json()]), ['Acacia pycnantha', 'Eucalyptus'])
+
+        # the search vector follows the record updates
+        record = dataset.record_queryset.get(data__What='Eucalyptus')
+        record.data['Who'] = 'Tim'
+        record.save()
+        resp = client.get(reverse('api:record-list'),
+                          {'dataset__id': dataset.pk, 'search_mode': 'fulltext', 'search': 'serge'})
+        self.assertEqual([r['data']['What'] for r in resp.json()], ['Acacia pycnantha'])
+
     def test_string_ordering_in_json_data(self):
         """
         Test that if we provide a dataset and an order parameter (field) we can order through the data json field
@@ -466,6 +501,63 @@ class TestJsonSearchAndOrdering(helpers.BaseUserTestCase):
         records = resp.json()
         self.assertEqual(len(records), expected_number)
 
+    def test_indexed_fields_filters(self):
+        """
+        data.<field>__<lookup> filters on the fields tagged as indexed in the schema.
+        """
+        client = self.custodian_1_client
+        fields = [
+            {'name': 'What', 'type': 'string', 'biosys': {'indexed': True}},
+            {'name': 'When', 'type': 'date', 'format': 'any', 'biosys': {'indexed': True}},
+            {'name': 'Count', 'type': 'integer', 'biosys': {'indexed': True}},
+            {'name': 'Comment', 'type': 'string'},
+        ]
+        dataset = self._create_dataset_with_schema(self.project_1, client, fields)
+        resp = self._upload_records_from_rows([
+            ['What', 'When', 'Count', 'Comment'],
+            ['Canis lupus', '14/02/2018', 3, 'a'],
+            ['Chubby bat', '18/05/2017', 12, 'b'],
+            ['Crashed the db', '01/01/2019', '', 'c'],
+        ], dataset.pk)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        # a record created with the api
+        self._create_record(client, dataset, {'What': 'Quokka', 'When': '2018-06-01', 'Count': 7})
+
+        url = reverse('api:dataset-records', kwargs={'pk': dataset.pk})
+        cases = [
+            ({'data.Count__gte': 5}, ['Chubby bat', 'Quokka']),
+            ({'data.Count__gt': 3, 'data.Count__lt': 10}, ['Quokka']),
+            ({'data.Count': 3}, ['Canis lupus']),
+            ({'data.Count__in': '3,12'}, ['Canis lupus', 'Chubby bat']),
+            ({'data.When__gte': '2018-01-01'}, ['Canis lupus', 'Crashed the db', 'Quokka']),
+            ({'data.When__lt': '01/06/2018'}, ['Canis lupus', 'Chubby bat']),
+            ({'data.What': 'Quokka'}, ['Quokka']),
+        ]
+        for params, expected in cases:
+            resp = client.get(url, params)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK, params)
+            self.assertEqual(sorted([r['data']['What'] for r in resp.json()]), expected, params)
+
+        # not scoped to a dataset: the field types are looked up in all the schemas
+        resp = client.get(reverse('api:record-list'), {'data.Count__gte': 5})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted([r['data']['What'] for r in resp.json()]), ['Chubby bat', 'Quokka'])
+
+        # not an indexed field
+        resp = client.get(url, {'data.Comment': 'a'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        # invalid value
+        resp = client.get(url, {'data.Count__gte': 'many'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # tag a field after the records creation: the values are rebuilt after the commit
+        dataset.data_package['resources'][0]['schema']['fields'][3]['biosys'] = {'indexed': True}
+        with mock.patch('main.models.transaction.on_commit', side_effect=lambda func: func()):
+            dataset.save()
+        resp = client.get(url, {'data.Comment': 'b'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['data']['What'] for r in resp.json()], ['Chubby bat'])
+
 
 class TestSpatialFiltering(helpers.BaseUserTestCase):
     """
@@ -1125,3 +1125,275 @@ class TestForeignKey(helpers.BaseUserTestCase):
             data = resp.json()
             self.assertEqual(data['children'], expected_children_ids)
             self.assertEqual(data['parent'], expected_parent_id)
+
+    def test_fk_list(self):
+        """
+        The records list resolves the parents and children of all the records in one go (see RecordListSerializer).
+        The result must be the same as the record by record resolution.
+        """
+        parent_dataset = self._create_dataset_and_records_from_rows([
+            ['Survey ID', 'Where', 'When', 'Who'],
+            ['ID-001', 'King\'s Park', '2018-07-15', 'Tim Reynolds'],
+            ['ID-002', 'Cottesloe', '2018-07-11', 'SLB'],
+            ['ID-003', 'Somewhere', '2018-07-13', 'Phil Bill']
+        ])
+        parent_dataset.data_package['resources'][0]['schema']['primaryKey'] = 'Survey ID'
+        parent_dataset.save()
+        child_schema = helpers.create_schema_from_fields([
+            {
+                "name": "Survey ID",
+                "type": "string",
+                "constraints": helpers.REQUIRED_CONSTRAINTS
+            },
+            {
+                "name": "What",
+                "type": "string",
+                "constraints": helpers.NOT_REQUIRED_CONSTRAINTS
+            }
+        ])
+        child_schema['foreignKeys'] = [{
+            'fields': 'Survey ID',
+            'reference': {
+                'fields': 'Survey ID',
+                'resource': parent_dataset.name
+            }
+        }]
+        child_dataset = self._create_dataset_with_schema(
+            self.project_1,
+            self.data_engineer_1_client,
+            child_schema
+        )
+        rows = [
+            ['Survey ID', 'What'],
+            ['ID-001', 'Canis lupus'],
+            ['ID-003', 'A frog'],
+            ['ID-001', 'A tooth brush'],
+            ['ID-004', 'An orphan'],
+        ]
+        self._upload_records_from_rows(rows, child_dataset.id, strict=False)
+
+        client = self.custodian_1_client
+        url = reverse('api:record-list')
+        for dataset in [parent_dataset, child_dataset]:
+            resp = client.get(url, {'dataset__id': dataset.pk})
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            records = resp.json()
+            self.assertEqual(len(records), dataset.record_queryset.count())
+            for data in records:
+                record = Record.objects.get(pk=data['id'])
+                parents = record.parents
+                children = record.children
+                self.assertEqual(data['parent'], parents[0].id if parents else None)
+                self.assertEqual(data['children'], [r.id for r in children] if children is not None else None)
+
+        # sanity check
+        id_001 = parent_dataset.record_queryset.filter(data__contains={'Survey ID': 'ID-001'}).first()
+        resp = client.get(url, {'dataset__id': parent_dataset.pk})
+        data = [r for r in resp.json() if r['id'] == id_001.pk][0]
+        self.assertEqual(
+            data['children'],
+            list(child_dataset.record_queryset.filter(data__contains={'Survey ID': 'ID-001'})
+                 .order_by('id').values_list('id', flat=True))
+        )
+        self.assertEqual(len(data['children']), 2)
+
+
+class TestBulkWrite(helpers.BaseUserTestCase):
+
+    def setUp(self):
+        super(TestBulkWrite, self).setUp()
+        self.site_1 = factories.SiteFactory(project=self.project_1, code='COT')
+        self.ds_1 = self._create_dataset_from_rows([['What', 'When', 'Who', 'Site']])
+        schema = self.ds_1.schema_data
+        helpers.add_model_field_foreign_key_to_schema(
+            schema,
+            {
+                'schema_field': 'Site',
+                'model': 'Site',
+                'model_field': 'code'
+            }
+        )
+        self.ds_1.data_package = helpers.create_data_package_from_schema(schema)
+        self.ds_1.save()
+        self.url = reverse('api:dataset-records-bulk', kwargs={'pk': self.ds_1.pk})
+
+    def test_permissions(self):
+        data = [{'data': {'What': 'Something'}}]
+        for client in [self.anonymous_client, self.readonly_client, self.custodian_2_client]:
+            self.assertIn(
+                client.post(self.url, data, format='json').status_code,
+                [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN]
+            )
+        self.assertEqual(self.ds_1.record_queryset.count(), 0)
+        for client in [self.custodian_1_client, self.admin_client]:
+            self.assertEqual(client.post(self.url, data, format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ds_1.record_queryset.count(), 2)
+
+    def test_create_update_and_upsert(self):
+        client = self.custodian_1_client
+        data = [
+            {'client_id': 'mobile-1', 'data': {'What': 'One', 'Site': 'COT'}},
+            {'client_id': 'mobile-2', 'data': {'What': 'Two'}},
+        ]
+        resp = client.post(self.url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        created = resp.json()
+        self.assertEqual([r['client_id'] for r in created], ['mobile-1', 'mobile-2'])
+        self.assertEqual(created[0]['site'], self.site_1.pk)
+        self.assertIsNone(created[1]['site'])
+        record_2 = Record.objects.get(pk=created[1]['id'])
+
+        data = [
+            # update by id
+            {'id': record_2.pk, 'data': {'What': 'Two bis', 'Site': 'COT'}, 'validated': True},
+            # upsert by client id: existing
+            {'client_id': 'mobile-1', 'data': {'What': 'One bis'}},
+            # upsert by client id: new
+            {'client_id': 'mobile-3', 'data': {'What': 'Three'}},
+        ]
+        resp = client.post(self.url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        results = resp.json()
+        self.assertEqual([r['id'] for r in results[:2]], [record_2.pk, created[0]['id']])
+        self.assertEqual(self.ds_1.record_queryset.count(), 3)
+        record_2.refresh_from_db()
+        self.assertEqual(record_2.data['What'], 'Two bis')
+        self.assertEqual(record_2.site, self.site_1)
+        self.assertTrue(record_2.validated)
+        self.assertGreater(record_2.last_modified, record_2.created)
+        self.assertEqual(Record.objects.get(pk=created[0]['id']).data['What'], 'One bis')
+        self.assertEqual(Record.objects.get(pk=results[2]['id']).client_id, 'mobile-3')
+
+    def test_nothing_written_on_error(self):
+        client = self.custodian_1_client
+        data = [
+            {'client_id': 'mobile-1', 'data': {'What': 'One'}},
+            {'client_id': 'mobile-2', 'data': {}},
+        ]
+        resp = client.post(self.url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(resp.json()), 2)
+        self.assertEqual(self.ds_1.record_queryset.count(), 0)
+
+        # unknown record id
+        data = [{'id': 0, 'data': {'What': 'One'}}]
+        resp = client.post(self.url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.ds_1.record_queryset.count(), 0)
+
+    def test_duplicated_client_ids(self):
+        client = self.custodian_1_client
+        data = [
+            {'client_id': 'mobile-1', 'data': {'What': 'One'}},
+            {'client_id': 'mobile-1', 'data': {'What': 'One bis'}},
+        ]
+        resp = client.post(self.url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.ds_1.record_queryset.count(), 0)
+
+        resp = client.post(self.url, [
+            {'client_id': 'mobile-1', 'data': {'What': 'One'}},
+            {'client_id': 'mobile-2', 'data': {'What': 'Two'}},
+        ], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        record_1, record_2 = [Record.objects.get(pk=r['id']) for r in resp.json()]
+        for data in [
+            # a new record with the new client id of an updated record
+            [{'id': record_1.pk, 'client_id': 'mobile-3', 'data': {'What': 'One'}},
+             {'client_id': 'mobile-3', 'data': {'What': 'Three'}}],
+            # an updated record with the client id of another updated record
+            [{'id': record_1.pk, 'client_id': 'mobile-2', 'data': {'What': 'One'}},
+             {'id': record_2.pk, 'data': {'What': 'Two'}}],
+        ]:
+            resp = client.post(self.url, data, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        # an updated record with the client id of a record not in the request
+        resp = client.post(self.url, [{'id': record_1.pk, 'client_id': 'mobile-2', 'data': {'What': 'One'}}],
+                           format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('client_id', resp.json())
+        self.assertEqual(self.ds_1.record_queryset.count(), 2)
+        record_1.refresh_from_db()
+        self.assertEqual(record_1.client_id, 'mobile-1')
+
+
+class TestSync(helpers.BaseUserTestCase):
+
+    def setUp(self):
+        super(TestSync, self).setUp()
+        self.ds_1 = self._create_dataset_from_rows([['What', 'When', 'Who']])
+        self.url = reverse('api:dataset-records-sync', kwargs={'pk': self.ds_1.pk})
+
+    def test_permissions(self):
+        data = [{'client_id': 'mobile-1', 'data': {'What': 'Something'}}]
+        for client in [self.anonymous_client, self.readonly_client, self.custodian_2_client]:
+            self.assertIn(
+                client.post(self.url, data, format='json').status_code,
+                [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN]
+            )
+        self.assertEqual(self.ds_1.record_queryset.count(), 0)
+        self.assertEqual(self.custodian_1_client.post(self.url, data, format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ds_1.record_queryset.count(), 1)
+
+    def test_upsert(self):
+        client = self.custodian_1_client
+        data = [
+            {'client_id': 'mobile-1', 'data': {'What': 'One'}},
+            {'client_id': 'mobile-2', 'data': {'What': 'Two'}, 'validated': True},
+        ]
+        resp = client.post(self.url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        first = resp.json()
+        self.assertEqual([r['client_id'] for r in first], ['mobile-1', 'mobile-2'])
+        self.assertTrue(all(r['created'] for r in first))
+        self.assertTrue(all(r['last_modified'] for r in first))
+
+        data = [
+            {'client_id': 'mobile-3', 'data': {'What': 'Three'}},
+            {'client_id': 'mobile-2', 'data': {'What': 'Two bis'}},
+        ]
+        resp = client.post(self.url, data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        second = resp.json()
+        self.assertEqual([r['created'] for r in second], [True, False])
+        self.assertEqual(second[1]['id'], first[1]['id'])
+        self.assertEqual(self.ds_1.record_queryset.count(), 3)
+        record = Record.objects.get(pk=first[1]['id'])
+        self.assertEqual(record.data['What'], 'Two bis')
+        # the curation flags are not reset by the sync
+        self.assertTrue(record.validated)
+        self.assertGreater(record.last_modified, record.created)
+
+    def test_client_id_required_and_unique(self):
+        client = self.custodian_1_client
+        for data in [
+            [{'data': {'What': 'One'}}],
+            [{'client_id': 'mobile-1', 'data': {'What': 'One'}}, {'client_id': 'mobile-1', 'data': {'What': 'Two'}}],
+        ]:
+            resp = client.post(self.url, data, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.ds_1.record_queryset.count(), 0)
+
+        # the single record create reports the duplicated client id
+        self._create_record(client, self.ds_1, {'What': 'One'})
+        record = self.ds_1.record_queryset.first()
+        record.client_id = 'mobile-1'
+        record.save()
+        resp = client.post(reverse('api:record-list'), {
+            'dataset': self.ds_1.pk,
+            'client_id': 'mobile-1',
+            'data': {'What': 'Two'}
+        }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('client_id', resp.json())
+
+    def test_blank_client_ids_not_unique(self):
+        client = self.custodian_1_client
+        for what in ['One', 'Two']:
+            resp = client.post(reverse('api:record-list'), {
+                'dataset': self.ds_1.pk,
+                'client_id': '',
+                'data': {'What': what}
+            }, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.ds_1.record_queryset.filter(client_id='').count(), 2)
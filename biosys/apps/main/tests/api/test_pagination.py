@@ -0,0 +1,112 @@
+from django.urls import reverse
+from rest_framework import status
+
+from main.tests.api import helpers
+
+
+class TestCursorPagination(helpers.BaseUserTestCase):
+    """
+    Opt-in keyset pagination of the records: ?pagination=cursor
+    """
+
+    def _more_setup(self):
+        self.dataset = self._create_dataset_and_records_from_rows([
+            ['What', 'Who'],
+            ['Crashed the db', 'Serge'],
+            ['Restored the db', 'Shay'],
+            ['Crashed the db', 'Shay'],
+            ['Fixed a bug', 'Serge'],
+            ['Added a bug', 'Tim'],
+        ])
+        # one record without 'What'
+        record = self.dataset.record_queryset.last()
+        record.data.pop('What')
+        record.save()
+        self.records = list(self.dataset.record_queryset.order_by('id'))
+        self.client = self.custodian_1_client
+
+    def _fetch_all(self, url, params):
+        """
+        Follow the next links and return the list of pages (list of records)
+        """
+        pages = []
+        resp = self.client.get(url, params)
+        while True:
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            data = resp.json()
+            self.assertIn('next', data)
+            pages.append(data['results'])
+            if data['next'] is None:
+                break
+            resp = self.client.get(data['next'])
+        return pages
+
+    def test_default_pagination_unchanged(self):
+        url = reverse('api:dataset-records', kwargs={'pk': self.dataset.pk})
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.json()), len(self.records))
+        resp = self.client.get(url, {'limit': 2, 'offset': 2})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.json()
+        self.assertEqual(data['count'], len(self.records))
+        self.assertEqual([r['id'] for r in data['results']], [r.id for r in self.records[2:4]])
+
+    def test_by_id(self):
+        for url_name, params in [
+            ('api:dataset-records', {}),
+            ('api:record-list', {'dataset__id': self.dataset.pk})
+        ]:
+            url = reverse(url_name, kwargs={'pk': self.dataset.pk}) if url_name == 'api:dataset-records' \
+                else reverse(url_name)
+            params.update({'pagination': 'cursor', 'limit': 2})
+            pages = self._fetch_all(url, params)
+            self.assertEqual([len(page) for page in pages], [2, 2, 1])
+            ids = [r['id'] for page in pages for r in page]
+            self.assertEqual(ids, [r.id for r in self.records])
+
+            params['ordering'] = '-id'
+            pages = self._fetch_all(url, params)
+            ids = [r['id'] for page in pages for r in page]
+            self.assertEqual(ids, [r.id for r in reversed(self.records)])
+
+    def test_by_last_modified(self):
+        url = reverse('api:dataset-records', kwargs={'pk': self.dataset.pk})
+        params = {'pagination': 'cursor', 'limit': 2, 'ordering': 'last_modified'}
+        pages = self._fetch_all(url, params)
+        ids = [r['id'] for page in pages for r in page]
+        expected = sorted(self.records, key=lambda r: (r.last_modified, r.id))
+        self.assertEqual(ids, [r.id for r in expected])
+
+    def test_by_json_field(self):
+        """
+        Records with the same value are ordered by id. A missing value is ordered first (json null).
+        """
+        url = reverse('api:dataset-records', kwargs={'pk': self.dataset.pk})
+        params = {'pagination': 'cursor', 'limit': 2, 'ordering': 'What'}
+        pages = self._fetch_all(url, params)
+        ids = [r['id'] for page in pages for r in page]
+        expected = sorted(self.records, key=lambda r: (r.data.get('What') is not None, r.data.get('What', ''), r.id))
+        self.assertEqual(ids, [r.id for r in expected])
+
+    def test_with_filter(self):
+        url = reverse('api:dataset-records', kwargs={'pk': self.dataset.pk})
+        params = {'pagination': 'cursor', 'limit': 1, 'search': 'Shay'}
+        pages = self._fetch_all(url, params)
+        ids = [r['id'] for page in pages for r in page]
+        self.assertEqual(ids, [r.id for r in self.records if r.data.get('Who') == 'Shay'])
+
+    def test_unsupported_ordering(self):
+        url = reverse('api:dataset-records', kwargs={'pk': self.dataset.pk})
+        resp = self.client.get(url, {'pagination': 'cursor', 'ordering': 'datetime'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_cursor(self):
+        url = reverse('api:dataset-records', kwargs={'pk': self.dataset.pk})
+        resp = self.client.get(url, {'pagination': 'cursor', 'cursor': 'not a cursor'})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        # a cursor from another ordering
+        resp = self.client.get(url, {'pagination': 'cursor', 'limit': 1})
+        next_url = resp.json()['next']
+        resp = self.client.get(next_url + '&ordering=last_modified')
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
@@ -227,9 +227,39 @@ class TestCSVFormat(helpers.BaseUserTestCase):
         filename, ext = path.splitext(match.group(1))
         self.assertEqual(ext, '.csv')
         # read content
-        reader = csv.reader(io.StringIO(resp.content.decode('utf-8')), dialect='excel')
+        content = b''.join(resp.streaming_content)
+        reader = csv.reader(io.StringIO(content.decode('utf-8')), dialect='excel')
         for expected_row, actual_row in zip(expected_rows, reader):
             expected_row_string = [str(v) for v in expected_row]
             self.assertEqual(actual_row, expected_row_string)
 
+    @override_settings(EXPORTER_CLASS='main.api.exporters.BionetExporter', EXPORT_CHUNK_SIZE=1)
+    def test_bionet_streamed_by_chunks(self):
+        """
+        The Bionet exporter adds two ignored lines at the top. Chunks smaller than the number of records should
+        not affect the output.
+        """
+        expected_rows = [
+            ['What', 'When', 'Latitude', 'Longitude'],
+            ['a big bird in Cottesloe', '2018-01-24', -32, 115.75],
+            ['a chubby bat somewhere', '2017-12-24', -33.6, 116.678],
+            ['something in the null island', '2018-05-25', 0, 0]
+        ]
+        dataset = self._create_dataset_and_records_from_rows(expected_rows)
+        client = self.custodian_1_client
+        url = reverse('api:record-list')
+        query_params = {
+            'dataset__id': dataset.pk,
+            'output': 'csv'
+        }
+        resp = client.get(url, query_params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        content = b''.join(resp.streaming_content)
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8')), dialect='excel'))
+        self.assertEqual(rows[:2], [['Bionet Ignored Line'], ['Bionet Ignored Line']])
+        self.assertEqual(len(rows), len(expected_rows) + 2)
+        for expected_row, actual_row in zip(expected_rows, rows[2:]):
+            self.assertEqual(actual_row, [str(v) for v in expected_row])
+
 
@@ -1,12 +1,17 @@
 import datetime
 from os import path
+from unittest import mock
 
 from django.contrib.gis.geos import Point
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 
-from main.models import Dataset, Site
+from main.api.uploaders import RecordCreator
+from main.models import Dataset, Site, RecordUploadJob
 from main.tests import factories
 from main.tests.api import helpers
 
@@ -336,6 +341,200 @@ class TestGenericRecord(helpers.BaseUserTestCase):
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+class TestBatchUpload(helpers.BaseUserTestCase):
+    """
+    Records are inserted by batches (bulk insert) of RECORD_UPLOAD_BATCH_SIZE.
+    The response must still be one item per row in the file order.
+    """
+
+    def _more_setup(self):
+        self.fields = [
+            {
+                "name": "Column A",
+                "type": "string",
+                "constraints": helpers.NOT_REQUIRED_CONSTRAINTS
+            },
+            {
+                "name": "Column B",
+                "type": "string",
+                "constraints": helpers.REQUIRED_CONSTRAINTS
+            }
+        ]
+        self.ds = factories.DatasetFactory(
+            project=self.project_1,
+            type=Dataset.TYPE_GENERIC,
+            data_package=helpers.create_data_package_from_fields(self.fields))
+        self.url = reverse('api:dataset-upload', kwargs={'pk': self.ds.pk})
+
+    def _upload(self, csv_data):
+        file_ = helpers.rows_to_csv_file(csv_data)
+        with open(file_) as fp:
+            data = {
+                'file': fp,
+                'strict': True
+            }
+            return self.custodian_1_client.post(self.url, data=data, format='multipart')
+
+    @override_settings(RECORD_UPLOAD_BATCH_SIZE=2)
+    def test_batches_happy_path(self):
+        csv_data = [['Column A', 'Column B']] + [['A{}'.format(i), 'B{}'.format(i)] for i in range(5)]
+        resp = self._upload(csv_data)
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        results = resp.json()
+        self.assertEqual(len(results), 5)
+        qs = self.ds.record_queryset.order_by('pk')
+        self.assertEqual(qs.count(), 5)
+        for index, (result, record) in enumerate(zip(results, qs)):
+            self.assertEqual(result['row'], index + 2)
+            self.assertEqual(result['recordId'], record.pk)
+            self.assertEqual(result['errors'], {})
+            self.assertEqual(record.data, {'Column A': 'A{}'.format(index), 'Column B': 'B{}'.format(index)})
+            self.assertEqual(record.source_info['row'], index + 2)
+
+    @override_settings(RECORD_UPLOAD_BATCH_SIZE=2)
+    def test_batches_with_error(self):
+        """
+        An invalid row must not prevent the valid rows of the same batch to be inserted.
+        """
+        csv_data = [
+            ['Column A', 'Column B'],
+            ['A1', 'B1'],
+            ['A2', ''],
+            ['A3', 'B3'],
+        ]
+        resp = self._upload(csv_data)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, resp.status_code)
+        results = resp.json()
+        self.assertEqual([r['row'] for r in results], [2, 3, 4])
+        self.assertIn('recordId', results[0])
+        self.assertNotIn('recordId', results[1])
+        self.assertIn('Column B', results[1]['errors'])
+        self.assertIn('recordId', results[2])
+        self.assertEqual(
+            list(self.ds.record_queryset.order_by('pk').values_list('pk', flat=True)),
+            [results[0]['recordId'], results[2]['recordId']]
+        )
+
+    @override_settings(RECORD_UPLOAD_BATCH_SIZE=3, RECORD_UPLOAD_WORKERS=2)
+    def test_parallel_validation(self):
+        """
+        With validation workers the results must come back in row order.
+        """
+        csv_data = [['Column A', 'Column B']] + \
+                   [['A{}'.format(i), 'B{}'.format(i) if i % 4 else ''] for i in range(11)]
+        with mock.patch.object(RecordCreator, 'WORKER_CHUNK_SIZE', 2):
+            resp = self._upload(csv_data)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, resp.status_code)
+        results = resp.json()
+        self.assertEqual([r['row'] for r in results], list(range(2, 13)))
+        record_ids = []
+        for index, result in enumerate(results):
+            if index % 4:
+                self.assertEqual(result['errors'], {})
+                record_ids.append(result['recordId'])
+            else:
+                self.assertNotIn('recordId', result)
+                self.assertIn('Column B', result['errors'])
+        qs = self.ds.record_queryset.order_by('pk')
+        self.assertEqual(list(qs.values_list('pk', flat=True)), record_ids)
+        for record in qs:
+            index = record.source_info['row'] - 2
+            self.assertEqual(record.data, {'Column A': 'A{}'.format(index), 'Column B': 'B{}'.format(index)})
+
+    @override_settings(RECORD_UPLOAD_BATCH_SIZE=3, RECORD_UPLOAD_WORKERS=2)
+    def test_no_validation_workers_in_threaded_process(self):
+        """
+        The workers are forked: not in a process running other threads.
+        """
+        csv_data = [['Column A', 'Column B']] + [['A{}'.format(i), 'B{}'.format(i)] for i in range(5)]
+        with mock.patch('main.api.uploaders.threading.active_count', return_value=2), \
+                mock.patch.object(RecordCreator, '_iter_validated_parallel') as parallel:
+            resp = self._upload(csv_data)
+        self.assertEqual(status.HTTP_200_OK, resp.status_code)
+        parallel.assert_not_called()
+        self.assertEqual(self.ds.record_queryset.count(), 5)
+
+
+@override_settings(UPLOAD_JOB_WORKERS=0)
+class TestUploadJob(helpers.BaseUserTestCase):
+    """
+    Records upload as a background job: datasets/{pk}/upload-records-job and upload-jobs/{pk}
+    """
+
+    def _more_setup(self):
+        self.fields = [
+            {
+                "name": "Column A",
+                "type": "string",
+                "constraints": helpers.NOT_REQUIRED_CONSTRAINTS
+            },
+            {
+                "name": "Column B",
+                "type": "string",
+                "constraints": helpers.REQUIRED_CONSTRAINTS
+            }
+        ]
+        self.ds = factories.DatasetFactory(
+            project=self.project_1,
+            type=Dataset.TYPE_GENERIC,
+            data_package=helpers.create_data_package_from_fields(self.fields))
+        self.url = reverse('api:dataset-upload-job', kwargs={'pk': self.ds.pk})
+
+    def _upload(self, csv_data, client=None):
+        client = client or self.custodian_1_client
+        file_ = helpers.rows_to_csv_file(csv_data)
+        with open(file_) as fp:
+            data = {
+                'file': fp,
+                'strict': True
+            }
+            return client.post(self.url, data=data, format='multipart')
+
+    def test_job_results(self):
+        csv_data = [
+            ['Column A', 'Column B'],
+            ['A1', 'B1'],
+            ['A2', ''],
+            ['A3', 'B3'],
+        ]
+        resp = self._upload(csv_data)
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        job_id = resp.json()['id']
+
+        resp = self.custodian_1_client.get(reverse('api:upload-job', kwargs={'pk': job_id}))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        job = resp.json()
+        self.assertEqual(job['status'], 'success')
+        self.assertEqual(job['rows_processed'], 3)
+        self.assertEqual(job['rows_with_error'], 1)
+        results = job['results']
+        self.assertEqual([r['row'] for r in results], [2, 3, 4])
+        self.assertIn('Column B', results[1]['errors'])
+        self.assertEqual(
+            list(self.ds.record_queryset.order_by('pk').values_list('pk', flat=True)),
+            [results[0]['recordId'], results[2]['recordId']]
+        )
+        record = self.ds.record_queryset.order_by('pk').first()
+        self.assertTrue(record.source_info['file_name'].endswith('.csv'))
+        self.assertNotIn('/', record.source_info['file_name'])
+        # the uploaded file is deleted
+        self.assertFalse(RecordUploadJob.objects.get(pk=job_id).file)
+
+    def test_permissions(self):
+        csv_data = [
+            ['Column A', 'Column B'],
+            ['A1', 'B1'],
+        ]
+        # not a custodian
+        resp = self._upload(csv_data, client=self.custodian_2_client)
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+        resp = self._upload(csv_data)
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        url = reverse('api:upload-job', kwargs={'pk': resp.json()['id']})
+        self.assertEqual(self.custodian_2_client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.admin_client.get(url).status_code, status.HTTP_200_OK)
+
+
 class TestObservation(helpers.BaseUserTestCase):
     all_fields_nothing_required = [
         {
@@ -470,3 +669,54 @@ class TestObservation(helpers.BaseUserTestCase):
             expected_date = datetime.date(2017, 6, 4)
             self.assertEqual(timezone.localtime(record.datetime).date(), expected_date)
             self.assertEqual(record.geometry, self.site.geometry)
+
+    def test_site_lookup_cached(self):
+        """
+        The sites must be looked up once per upload and not for every row.
+        """
+        csv_data = [['What', 'Site']] + [['Row {}'.format(i), self.site.code] for i in range(10)]
+        file_ = helpers.rows_to_xlsx_file(csv_data)
+        client = self.custodian_1_client
+        with open(file_, 'rb') as fp:
+            data = {
+                'file': fp,
+                'strict': True
+            }
+            with CaptureQueriesContext(connection) as context:
+                resp = client.post(self.url, data=data, format='multipart')
+            self.assertEqual(status.HTTP_200_OK, resp.status_code)
+            site_queries = [q for q in context.captured_queries
+                            if q['sql'].startswith('SELECT') and 'FROM "main_site"' in q['sql']]
+            self.assertEqual(len(site_queries), 1)
+            records = self.dataset.record_queryset.all()
+            self.assertEqual(len(records), 10)
+            for record in records:
+                self.assertEqual(record.site, self.site)
+                self.assertEqual(record.geometry, self.site.geometry)
+
+    def test_create_site_once(self):
+        """
+        With create_site the new site must be created once and reused for the following rows.
+        """
+        csv_data = [
+            ['What', 'Site', 'Latitude', 'Longitude'],
+            ['Row 1', 'NEW', -32.0, 115.75],
+            ['Row 2', 'NEW', -32.0, 115.75],
+        ]
+        file_ = helpers.rows_to_xlsx_file(csv_data)
+        client = self.custodian_1_client
+        with open(file_, 'rb') as fp:
+            data = {
+                'file': fp,
+                'strict': True,
+                'create_site': True
+            }
+            resp = client.post(self.url, data=data, format='multipart')
+            self.assertEqual(status.HTTP_200_OK, resp.status_code)
+            sites = Site.objects.filter(project=self.project, code='NEW')
+            self.assertEqual(sites.count(), 1)
+            site = sites.first()
+            records = self.dataset.record_queryset.all()
+            self.assertEqual(len(records), 2)
+            for record in records:
+                self.assertEqual(record.site, site)
@@ -1,6 +1,7 @@
 import json
 
 from django.contrib.gis.geos import GEOSGeometry
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 
@@ -430,6 +431,43 @@ class TestSiteUpload(helpers.BaseUserTestCase):
             self.assertEqual(len(csv_data) - 1, qs.count())
             self.assertEqual(['C1', 'C2'], [s.code for s in qs.order_by('code')])
 
+    @override_settings(SITE_UPLOAD_BATCH_SIZE=2)
+    def test_upload_update_by_batch(self):
+        """
+        Existing sites are updated, new ones created, in row order and with an error on the faulty rows only.
+        """
+        project = self.project_1
+        existing = factories.SiteFactory.create(project=project, code='C1', name='Old name')
+        csv_data = [
+            ['Site Code', 'Site Name', 'Description', 'Latitude', 'Longitude', 'Attribute1'],
+            ['C1', 'Site 1', 'Description1', -32, 116, 'attr11'],
+            ['C2', 'Site 2', 'Description2', -31, 117, 'attr21'],
+            ['', 'No code', '', '', '', ''],
+            ['C3', 'Site 3', 'Description3', '', '', 'attr31'],
+            ['C2', 'Site 2 bis', 'Description2', -31, 117, 'attr21'],
+        ]
+        csv_file = helpers.rows_to_csv_file(csv_data)
+        url = reverse('api:upload-sites', kwargs={'pk': project.pk})
+        with open(csv_file) as fp:
+            resp = self.custodian_1_client.post(url, data={'file': fp}, format='multipart')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, resp.status_code)
+        results = resp.json()
+        qs = Site.objects.filter(project=project)
+        self.assertEqual(['C1', 'C2', 'C3'], [s.code for s in qs.order_by('code')])
+        c1, c2, c3 = qs.order_by('code')
+        self.assertEqual(c1.pk, existing.pk)
+        self.assertEqual(c1.name, 'Site 1')
+        self.assertEqual((116, -32), (c1.geometry.x, c1.geometry.y))
+        self.assertEqual(c1.attributes['Attribute1'], 'attr11')
+        self.assertEqual(c2.name, 'Site 2 bis')
+        self.assertIsNone(c3.geometry)
+        self.assertEqual(
+            [results[str(row)]['site'] for row in range(1, 6)],
+            [c1.pk, c2.pk, None, c3.pk, c2.pk]
+        )
+        self.assertIsNotNone(results['3']['error'])
+        self.assertEqual([results[str(row)]['error'] for row in [1, 2, 4, 5]], [None] * 4)
+
 
 class TestSerialization(helpers.BaseUserTestCase):
 
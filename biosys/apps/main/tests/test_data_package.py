@@ -1,4 +1,5 @@
 import copy
+import datetime
 
 from django.contrib.gis.geos import GEOSGeometry
 from django.test import TestCase
@@ -408,6 +409,103 @@ class TestGenericSchemaValidation(TestCase):
         self.sch = GenericSchema(self.descriptor)
 
 
+class TestCompiledRowValidator(TestCase):
+    """
+    The compiled validator fast checks must never accept a value that SchemaField.validation_error rejects and must
+    return the same error messages.
+    """
+    values = [
+        None, '', '  ', 'abc', ' abc ', '1', '01', '+1', '-1', '-0', ' 1', '1.0', '1.5', '.5', '1e3', '1,000',
+        1, 0, True, False, 1.0, 1.5, 'true', 'yes', ' No ', 'maybe',
+        '2017-01-05', '2017-1-5', '2017-02-30', '05/01/2017', datetime.date(2017, 1, 5),
+        datetime.datetime(2017, 1, 5, 3), [1]
+    ]
+
+    def _fields(self):
+        for type_, format_ in [('string', 'default'), ('string', 'email'), ('integer', 'default'),
+                               ('number', 'default'), ('boolean', 'default'), ('date', 'default'), ('date', 'any')]:
+            for constraints in [{}, REQUIRED_CONSTRAINTS, NOT_REQUIRED_CONSTRAINTS, {'enum': ['abc', '1']},
+                                {'required': True, 'minLength': 2}]:
+                if (type_, format_) != ('string', 'default') and set(constraints.keys()) - {'required'}:
+                    continue
+                yield {
+                    'name': 'Field',
+                    'type': type_,
+                    'format': format_,
+                    'constraints': clone(constraints)
+                }
+
+    def test_same_as_field_validation(self):
+        fast_checks = 0
+        for descriptor in self._fields():
+            schema = GenericSchema({'fields': [descriptor]})
+            field = schema.get_field_by_name('Field')
+            validator = schema.row_validator
+            if validator.fast_checks['Field'] is not None:
+                fast_checks += 1
+            for value in self.values:
+                self.assertEqual(
+                    validator.field_validation_error('Field', value),
+                    field.validation_error(value),
+                    msg='{} {}'.format(descriptor, value)
+                )
+        self.assertTrue(fast_checks > 0)
+
+    def test_unknown_field(self):
+        schema = GenericSchema({'fields': [{'name': 'Field', 'type': 'string'}]})
+        with self.assertRaises(Exception):
+            schema.row_validator.field_validation_error('Unknown', 'value')
+
+    def test_fast_check_not_compiled(self):
+        schema = GenericSchema({'fields': [
+            {'name': 'Email', 'type': 'string', 'format': 'email'},
+            {'name': 'Count', 'type': 'integer', 'constraints': {'minimum': 0}},
+        ]})
+        self.assertIsNone(schema.row_validator.fast_checks['Email'])
+        self.assertIsNone(schema.row_validator.fast_checks['Count'])
+        self.assertEqual(schema.field_validation_error('Count', -1),
+                         schema.fields[1].validation_error(-1))
+
+    def test_cast_row_same_as_validation_and_cast_numbers(self):
+        """
+        The one pass cast_row gives the same errors as the field validation and the same numbers as cast_numbers.
+        """
+        for descriptor in self._fields():
+            schema = GenericSchema({'fields': [descriptor]})
+            for value in self.values:
+                row = {'Field': value}
+                typed = schema.cast_row(row)
+                error = schema.row_validator.field_validation_error('Field', value)
+                self.assertEqual(typed.errors.get('Field'), error, msg='{} {}'.format(descriptor, value))
+                expected = schema.cast_numbers(dict(row))
+                self.assertEqual(typed.cast_data, expected, msg='{} {}'.format(descriptor, value))
+                self.assertEqual([type(v) for v in typed.cast_data.values()], [type(v) for v in expected.values()])
+                self.assertEqual(typed.data, row)
+        typed = GenericSchema({'fields': [{'name': 'Field', 'type': 'string'}]}).cast_row({'Unknown': 'value'})
+        self.assertIn('Unknown', typed.errors)
+
+    def test_typed_row_record_values(self):
+        typed = TypedRow({'Field': 'value'})
+        calls = []
+
+        def cast(data):
+            calls.append(data)
+            return data['Field'].upper()
+
+        self.assertEqual(typed.get_record_value('upper', cast), 'VALUE')
+        self.assertEqual(typed.get_record_value('upper', cast), 'VALUE')
+        self.assertEqual(len(calls), 1)
+
+        def fail(data):
+            calls.append(data)
+            raise Exception('cast error')
+
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                typed.get_record_value('fail', fail)
+        self.assertEqual(len(calls), 2)
+
+
 class TestObservationSchemaCast(TestCase):
     def setUp(self):
         self.descriptor = clone(LAT_LONG_OBSERVATION_SCHEMA)
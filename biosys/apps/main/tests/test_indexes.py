@@ -0,0 +1,78 @@
+from django.db import connection
+from django.test import TestCase
+
+from main.models import Dataset
+from main.tests import factories
+from main.tests.api import helpers
+from main.utils_indexes import sync_dataset_indexes, get_dataset_index_names, get_record_index_usage, \
+    get_index_name, TRIGRAM, SORT
+
+
+class TestDatasetIndexes(TestCase):
+
+    def setUp(self):
+        self.project = factories.ProjectFactory.create(program=factories.ProgramFactory.create())
+        self.fields = [
+            {
+                "name": "What",
+                "type": "string",
+            },
+            {
+                "name": "Count",
+                "type": "integer",
+            }
+        ]
+        self.ds = factories.DatasetFactory.create(
+            project=self.project,
+            type=Dataset.TYPE_GENERIC,
+            data_package=helpers.create_data_package_from_fields(self.fields)
+        )
+
+    def test_sync(self):
+        created, dropped = sync_dataset_indexes(self.ds.pk, ['What', 'Count'])
+        # trigram + sort per field + trigram on source_info file_name and row
+        self.assertEqual(len(created), 6)
+        self.assertEqual(dropped, [])
+        self.assertEqual(get_dataset_index_names(self.ds.pk), set(created))
+        self.assertIn(get_index_name(self.ds.pk, TRIGRAM, 'data', 'What'), created)
+        self.assertIn(get_index_name(self.ds.pk, SORT, 'data', 'Count'), created)
+        # nothing to do
+        self.assertEqual(sync_dataset_indexes(self.ds.pk, ['What', 'Count']), ([], []))
+        # a field removed from the schema
+        created, dropped = sync_dataset_indexes(self.ds.pk, ['What'])
+        self.assertEqual(created, [])
+        self.assertEqual(
+            set(dropped),
+            {get_index_name(self.ds.pk, TRIGRAM, 'data', 'Count'), get_index_name(self.ds.pk, SORT, 'data', 'Count')}
+        )
+        # drop all
+        sync_dataset_indexes(self.ds.pk, [])
+        self.assertEqual(get_dataset_index_names(self.ds.pk), set())
+
+    def test_invalid_index_rebuilt(self):
+        sync_dataset_indexes(self.ds.pk, ['What'])
+        name = get_index_name(self.ds.pk, TRIGRAM, 'data', 'What')
+        # as left by a failed CREATE INDEX CONCURRENTLY
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE pg_index SET indisvalid = false WHERE indexrelid = %s::regclass', ['"{}"'.format(name)]
+            )
+        self.assertEqual(get_dataset_index_names(self.ds.pk, valid=False), {name})
+        self.assertEqual(sync_dataset_indexes(self.ds.pk, ['What']), ([name], []))
+        self.assertEqual(get_dataset_index_names(self.ds.pk, valid=False), set())
+        self.assertIn(name, get_dataset_index_names(self.ds.pk, valid=True))
+
+    def test_other_dataset_untouched(self):
+        other = factories.DatasetFactory.create(
+            project=self.project,
+            type=Dataset.TYPE_GENERIC,
+            data_package=helpers.create_data_package_from_fields(self.fields)
+        )
+        sync_dataset_indexes(self.ds.pk, ['What'])
+        sync_dataset_indexes(other.pk, ['What'])
+        sync_dataset_indexes(self.ds.pk, [])
+        self.assertEqual(len(get_dataset_index_names(other.pk)), 4)
+
+    def test_usage(self):
+        names = [usage['name'] for usage in get_record_index_usage()]
+        self.assertIn('main_record_data_gin', names)
@@ -1,5 +1,11 @@
 from __future__ import unicode_literals
 
+import io
+from unittest.mock import patch
+
+from django.contrib.gis.db.models import Extent
+from django.contrib.gis.geos import Point
+from django.core.management import call_command
 from django.test import TestCase
 
 from main.models import *
@@ -56,3 +62,151 @@ class TestSite(TestCase):
         site2.project = site1.project
         with self.assertRaises(Exception):
             site2.save()
+
+
+class TestDatasetSchemaCache(TestCase):
+    def setUp(self):
+        from main.tests.api import helpers
+        self.helpers = helpers
+        self.project = factories.ProjectFactory.create(program=factories.ProgramFactory.create())
+        self.fields = [
+            {
+                "name": "Column A",
+                "type": "string",
+            },
+            {
+                "name": "Column B",
+                "type": "integer",
+            }
+        ]
+        self.ds = factories.DatasetFactory.create(
+            project=self.project,
+            type=Dataset.TYPE_GENERIC,
+            data_package=helpers.create_data_package_from_fields(self.fields)
+        )
+        schema_cache.clear()
+
+    def test_schema_built_once(self):
+        schema = self.ds.schema
+        self.assertEqual(schema_cache.misses, 1)
+        # same instance
+        self.assertIs(self.ds.schema, schema)
+        # another instance of the same dataset
+        self.assertIs(Dataset.objects.get(pk=self.ds.pk).schema, schema)
+        self.assertEqual(schema_cache.misses, 1)
+        self.assertEqual(schema_cache.hits, 2)
+
+    def test_schema_invalidated_on_change(self):
+        schema = self.ds.schema
+        self.assertEqual(schema.field_names, ['Column A', 'Column B'])
+        self.ds.data_package = self.helpers.create_data_package_from_fields(self.fields[:1])
+        # not saved yet: the hash of the descriptor changed
+        self.assertEqual(self.ds.schema.field_names, ['Column A'])
+        self.ds.save()
+        self.assertEqual(Dataset.objects.get(pk=self.ds.pk).schema.field_names, ['Column A'])
+        # the save evicted the dataset schemas
+        self.ds.save()
+        self.assertEqual(len(schema_cache), 0)
+
+    def test_schema_evicted_on_delete(self):
+        self.assertIsInstance(self.ds.schema, GenericSchema)
+        self.assertEqual(len(schema_cache), 1)
+        self.ds.delete()
+        self.assertEqual(len(schema_cache), 0)
+
+
+class TestStatistics(TestCase):
+    """
+    The dataset and project counts are maintained by database triggers.
+    """
+
+    def setUp(self):
+        from main.tests.api import helpers
+        program = factories.ProgramFactory.create()
+        self.project = factories.ProjectFactory.create(program=program)
+        self.other_project = factories.ProjectFactory.create(program=program)
+        self.ds = factories.DatasetFactory.create(
+            project=self.project,
+            type=Dataset.TYPE_GENERIC,
+            data_package=helpers.create_data_package_from_fields([{"name": "Column A", "type": "string"}])
+        )
+
+    def _create_records(self, count, dataset=None):
+        dataset = dataset or self.ds
+        return Record.objects.bulk_create([
+            Record(dataset=dataset, data={'Column A': str(i)}) for i in range(count)
+        ])
+
+    def test_bulk_insert_and_delete(self):
+        self.assertEqual(self.ds.record_count, 0)
+        self._create_records(5)
+        Record.objects.create(dataset=self.ds, data={'Column A': 'one more'})
+        self.assertEqual(self.ds.record_count, 6)
+        self.assertEqual(self.project.record_count, 6)
+        self.ds.record_queryset.filter(data__contains={'Column A': '1'}).delete()
+        self.assertEqual(self.ds.record_count, 5)
+        self.assertEqual(self.project.record_count, 5)
+        self.ds.record_queryset.delete()
+        self.assertEqual(self.ds.record_count, 0)
+        self.assertEqual(self.project.record_count, 0)
+
+    def test_project_counts(self):
+        self.assertEqual(self.project.dataset_count, 1)
+        factories.SiteFactory.create_batch(3, project=self.project)
+        self.assertEqual(self.project.site_count, 3)
+        self._create_records(4)
+        # move the dataset (and its records) to another project
+        self.ds.project = self.other_project
+        self.ds.save()
+        self.assertEqual(self.project.dataset_count, 0)
+        self.assertEqual(self.project.record_count, 0)
+        self.assertEqual(self.other_project.dataset_count, 1)
+        self.assertEqual(self.other_project.record_count, 4)
+        self.ds.delete()
+        self.assertEqual(self.other_project.dataset_count, 0)
+        self.assertEqual(self.other_project.record_count, 0)
+
+    def test_rebuild(self):
+        self._create_records(3)
+        DatasetStatistics.objects.all().update(record_count=0)
+        ProjectStatistics.objects.all().delete()
+        rebuild_statistics()
+        self.assertEqual(self.ds.record_count, 3)
+        self.assertEqual(self.project.record_count, 3)
+        self.assertEqual(self.project.dataset_count, 1)
+        self.assertEqual(self.other_project.record_count, 0)
+
+    def test_extent(self):
+        self.assertIsNone(self.ds.extent)
+        records = Record.objects.bulk_create([
+            Record(dataset=self.ds, data={}, geometry=Point(x, y, srid=4326))
+            for x, y in [(115, -32), (116, -31), (117, -30)]
+        ])
+        self.assertEqual(self.ds.extent, (115, -32, 117, -30))
+        # a geometry inside the extent: no recompute needed
+        records[1].delete()
+        self.assertFalse(DatasetStatistics.objects.get(dataset=self.ds).extent_stale)
+        self.assertEqual(self.ds.extent, (115, -32, 117, -30))
+        # a geometry on the edge: computed by the first read and stored after its transaction
+        Record.objects.filter(pk=records[2].pk).update(geometry=Point(116, -31, srid=4326))
+        self.assertTrue(DatasetStatistics.objects.get(dataset=self.ds).extent_stale)
+        # the TestCase transaction is never committed
+        with patch('main.models.transaction.on_commit', side_effect=lambda func: func()):
+            self.assertEqual(self.ds.extent, (115, -32, 116, -31))
+        statistics = DatasetStatistics.objects.get(dataset=self.ds)
+        self.assertFalse(statistics.extent_stale)
+        self.assertEqual(statistics.extent, (115, -32, 116, -31))
+        with patch.object(DatasetStatistics, 'compute_extent') as compute_extent:
+            self.assertEqual(self.ds.extent, (115, -32, 116, -31))
+            compute_extent.assert_not_called()
+        # or by the management command
+        records[0].delete()
+        self.assertTrue(DatasetStatistics.objects.get(dataset=self.ds).extent_stale)
+        call_command('refresh_dataset_extents', stdout=io.StringIO())
+        statistics = DatasetStatistics.objects.get(dataset=self.ds)
+        self.assertFalse(statistics.extent_stale)
+        self.assertEqual(statistics.extent, (116, -31, 116, -31))
+        self.assertEqual(
+            self.ds.extent,
+            self.ds.record_queryset.aggregate(Extent('geometry'))['geometry__extent']
+        )
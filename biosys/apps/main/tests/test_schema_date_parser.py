@@ -2,7 +2,8 @@ import datetime
 
 from django.test import TestCase
 
-from main.utils_data_package import ObservationSchema, ObservationDateParser, InvalidDateType
+from main.utils_data_package import ObservationSchema, ObservationDateParser, InvalidDateType, DayFirstDateParser, \
+    parse_datetime_day_first_dateutil
 
 from main.tests.test_data_package import clone, GENERIC_SCHEMA, REQUIRED_CONSTRAINTS, NOT_REQUIRED_CONSTRAINTS
 
@@ -388,3 +389,33 @@ class TestObservationDateParser(TestCase):
                 parser.cast_date({
                     "The expected date": dt
                 })
+
+
+class TestDayFirstDateParser(TestCase):
+
+    def test_same_as_dateutil(self):
+        parser = DayFirstDateParser()
+        values = [
+            '2018-02-01', '2018-02-01T13:45', '2018-02-01 13:45:07', '2018-2-1', '2018/02/01',
+            '01/02/2018', '1/2/2018', '01/02/2018 9:05', '01/02/2018 13:45:07', '12/31/2018', '01-02-2018',
+            '1 Feb 2018', 'Feb 1, 2018',
+        ]
+        for value in values:
+            self.assertEqual(parser.parse(value), parse_datetime_day_first_dateutil(value), value)
+        for value in ['31/04/2018', '2018-13-01', 'blah blah']:
+            with self.assertRaises(ValueError):
+                parser.parse(value)
+
+    def test_format_detection_and_cache(self):
+        parser = DayFirstDateParser()
+        self.assertIsNone(parser.format)
+        self.assertEqual(parser.parse('20/12/2017'), datetime.datetime(2017, 12, 20))
+        detected = parser.format
+        self.assertIsNotNone(detected)
+        # a dateutil only value doesn't change the detected format
+        self.assertEqual(parser.parse('20 Dec 2017'), datetime.datetime(2017, 12, 20))
+        self.assertIs(parser.format, detected)
+        self.assertEqual(parser.parse('2017-12-20'), datetime.datetime(2017, 12, 20))
+        self.assertIsNot(parser.format, detected)
+        self.assertEqual(parser.parse('20/12/2017'), datetime.datetime(2017, 12, 20))
+        self.assertEqual(parser.parse.cache_info().hits, 1)
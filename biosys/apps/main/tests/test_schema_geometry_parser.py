@@ -637,3 +637,80 @@ class LatLongAndSiteCode(TestCase):
         self.assertFalse(parser.is_easting_northing_only)
         self.assertIsNotNone(parser.site_code_field)
         self.assertEqual(parser.site_code_field.name, 'Site Code')
+
+
+class CastGeometries(TestCase):
+    """
+    The batch cast of the geometries
+    """
+
+    def setUp(self):
+        schema_fields = [
+            {
+                "name": "Easting",
+                "type": "number",
+                "constraints": {
+                    "required": True,
+                }
+            },
+            {
+                "name": "Northing",
+                "type": "number",
+                "constraints": {
+                    "required": True,
+                }
+            },
+            {
+                "name": "Datum",
+                "type": "string"
+            },
+            {
+                "name": "Zone",
+                "type": "integer"
+            }
+        ]
+        self.parser = GeometryParser(helpers.create_schema_from_fields(schema_fields))
+
+    def test_same_as_cast_geometry(self):
+        records = [
+            {'Easting': 405542.537, 'Northing': 6459127.469, 'Datum': 'GDA94', 'Zone': 50},
+            {'Easting': 115.75, 'Northing': -32.0, 'Datum': 'WGS84', 'Zone': ''},
+            {'Easting': 405542.537, 'Northing': 6459127.469, 'Datum': 'AGD84', 'Zone': 50},
+            {'Easting': 405600, 'Northing': 6459100, 'Datum': 'gda94', 'Zone': '50'},
+        ]
+        geometries = self.parser.cast_geometries(records)
+        self.assertEqual(len(geometries), len(records))
+        for record, geometry in zip(records, geometries):
+            self.assertEqual(geometry.srid, MODEL_SRID)
+            expected = self.parser.cast_geometry(record)
+            expected.transform(MODEL_SRID)
+            self.assertAlmostEqual(geometry.x, expected.x, places=6)
+            self.assertAlmostEqual(geometry.y, expected.y, places=6)
+
+    def test_errors_per_record(self):
+        records = [
+            {'Easting': 405542.537, 'Northing': 6459127.469, 'Datum': 'GDA94', 'Zone': 50},
+            {'Easting': 405542.537, 'Northing': 6459127.469, 'Datum': 'GDA94', 'Zone': 'fifty'},
+            {'Easting': 405542.537, 'Northing': 6459127.469, 'Datum': 'UNKNOWN', 'Zone': ''},
+            {'Easting': 'east', 'Northing': 6459127.469, 'Datum': 'GDA94', 'Zone': 50},
+            {'Easting': '', 'Northing': '', 'Datum': 'GDA94', 'Zone': 50},
+        ]
+        geometries = self.parser.cast_geometries(records)
+        self.assertIsInstance(geometries[0], Point)
+        for record, error in zip(records[1:], geometries[1:]):
+            self.assertIsInstance(error, Exception)
+            with self.assertRaises(Exception) as context:
+                self.parser.cast_geometry(record)
+            self.assertEqual(str(error), str(context.exception))
+
+    def test_srid_memoized(self):
+        record = {'Easting': 405542.537, 'Northing': 6459127.469, 'Datum': 'GDA94', 'Zone': 50}
+        self.assertEqual(self.parser.cast_srid(record), 28350)
+        self.assertEqual(len(self.parser._srid_cache), 1)
+        self.assertEqual(self.parser.cast_srid(dict(record, Easting=0)), 28350)
+        self.assertEqual(len(self.parser._srid_cache), 1)
+        # the errors are memoized as well
+        for _ in range(2):
+            with self.assertRaises(InvalidDatumError):
+                self.parser.cast_srid(dict(record, Zone=12))
+        self.assertEqual(len(self.parser._srid_cache), 2)
@@ -1,6 +1,16 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os import path
+from unittest import mock
 
-from main.utils_species import HerbieFacade
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from main.utils_species import HerbieFacade, CachedHerbieFacade, SpeciesIndex, get_key_for_value
 
 
 class TestHerbieFacade(TestCase):
@@ -37,3 +47,138 @@ class TestHerbieFacade(TestCase):
             self.assertTrue(self.facade.PROPERTY_NAME_ID.herbie_name in sp)
         except Exception as e:
             self.fail("Should not raise an exception!: {}: '{}'".format(e.__class__, e))
+
+
+class TestSpeciesIndex(TestCase):
+    def setUp(self):
+        self.mapping = {
+            'Canis lupus': 1,
+            'Chubby bat': 2,
+            'Chubby bat (synonym)': 2,
+        }
+        self.index = SpeciesIndex(self.mapping)
+
+    def test_lookups(self):
+        self.assertEqual(self.index.get_name_id('Canis lupus'), 1)
+        self.assertEqual(self.index.get_name_id('Unknown', -1), -1)
+        self.assertEqual(self.index.get_species_name(1), 'Canis lupus')
+        self.assertIsNone(self.index.get_species_name(3))
+        self.assertTrue(self.index.has_name_id(2))
+        self.assertFalse(self.index.has_name_id(3))
+        self.assertEqual(set(self.index.name_ids), {1, 2})
+        self.assertEqual(len(self.index), 3)
+
+    def test_same_as_get_key_for_value(self):
+        """
+        The reverse lookup must return the first species name, like get_key_for_value
+        """
+        for name_id in [1, 2, 3]:
+            self.assertEqual(self.index.get_species_name(name_id), get_key_for_value(self.mapping, name_id))
+
+    def test_from_mapping(self):
+        self.assertIs(SpeciesIndex.from_mapping(self.index), self.index)
+        self.assertIsNone(SpeciesIndex.from_mapping(None))
+        self.assertEqual(SpeciesIndex.from_mapping(self.mapping).get_species_name(1), 'Canis lupus')
+        self.assertFalse(SpeciesIndex())
+
+
+class StubHerbieHandler(BaseHTTPRequestHandler):
+    species = []
+    requests_count = 0
+
+    def do_GET(self):
+        StubHerbieHandler.requests_count += 1
+        body = json.dumps({
+            'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'geometry': None, 'properties': sp} for sp in self.species]
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestCachedHerbieFacade(TestCase):
+    """
+    Use a local stub of the Herbie WFS service.
+    """
+
+    def setUp(self):
+        StubHerbieHandler.species = [
+            {'species_name': 'Canis lupus', 'name_id': 1},
+            {'species_name': 'Chubby bat', 'name_id': 2},
+            {'species_name': 'Chubby bat (synonym)', 'name_id': 2},
+        ]
+        StubHerbieHandler.requests_count = 0
+        self.server = HTTPServer(('127.0.0.1', 0), StubHerbieHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        url = 'http://127.0.0.1:{}/ows?service=wfs'.format(self.server.server_address[1])
+        patcher = mock.patch.object(HerbieFacade, 'BASE_URL', url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        settings_override = override_settings(SPECIES_CACHE_PATH=path.join(self.tmp_dir, 'species.json'),
+                                              SPECIES_CACHE_TTL=3600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        CachedHerbieFacade.clear_memo()
+        self.addCleanup(CachedHerbieFacade.clear_memo)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_memoized(self):
+        expected = {'Canis lupus': 1, 'Chubby bat': 2, 'Chubby bat (synonym)': 2}
+        self.assertEqual(CachedHerbieFacade().name_id_by_species_name(), expected)
+        self.assertEqual(StubHerbieHandler.requests_count, 1)
+        self.assertEqual(CachedHerbieFacade().name_id_by_species_name(), expected)
+        self.assertEqual(StubHerbieHandler.requests_count, 1)
+
+    def test_persistent_store(self):
+        expected = CachedHerbieFacade().name_id_by_species_name()
+        self.assertTrue(path.exists(settings.SPECIES_CACHE_PATH))
+        # new process (empty memo) and herbie down
+        CachedHerbieFacade.clear_memo()
+        self.server.shutdown()
+        self.assertEqual(CachedHerbieFacade().name_id_by_species_name(), expected)
+        self.assertEqual(StubHerbieHandler.requests_count, 1)
+
+    def test_reverse_lookup(self):
+        names = CachedHerbieFacade().species_name_by_name_id()
+        self.assertEqual(names[1], 'Canis lupus')
+        self.assertIn(names[2], ['Chubby bat', 'Chubby bat (synonym)'])
+        self.assertNotIn(3, names)
+
+    def test_background_refresh(self):
+        facade = CachedHerbieFacade()
+        facade.name_id_by_species_name()
+        StubHerbieHandler.species = [{'species_name': 'Canis lupus', 'name_id': 10}]
+        with override_settings(SPECIES_CACHE_TTL=0):
+            time.sleep(0.01)
+            # the stale value is returned while the refresh is happening
+            self.assertEqual(facade.name_id_by_species_name()['Canis lupus'], 1)
+            CachedHerbieFacade._refresh_thread.join(5)
+        self.assertEqual(StubHerbieHandler.requests_count, 2)
+        self.assertEqual(facade.name_id_by_species_name(), {'Canis lupus': 10})
+        self.assertEqual(facade.species_name_by_name_id(), {10: 'Canis lupus'})
+        # the store has been updated
+        CachedHerbieFacade.clear_memo()
+        self.assertEqual(facade.name_id_by_species_name(), {'Canis lupus': 10})
+        self.assertEqual(StubHerbieHandler.requests_count, 2)
+
+    def test_refresh_error_keeps_cache(self):
+        facade = CachedHerbieFacade()
+        expected = facade.name_id_by_species_name()
+        self.server.shutdown()
+        self.server.server_close()
+        facade.refresh()
+        self.assertEqual(facade.name_id_by_species_name(), expected)
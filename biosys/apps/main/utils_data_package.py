@@ -1,13 +1,19 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
+import copy
 import datetime
 import decimal
+import functools
+import hashlib
 import json
 import logging
 import re
+import threading
+from collections import OrderedDict
 
 from dateutil.parser import parse as date_parse
-from django.contrib.gis.geos import Point
+from django.contrib.gis.gdal import CoordTransform, SpatialReference
+from django.contrib.gis.geos import Point, MultiPoint
 from future.utils import raise_with_traceback
 from tableschema import Field as TableField
 from tableschema import Schema as TableSchema
@@ -16,6 +22,10 @@ from main.constants import MODEL_SRID, SUPPORTED_DATUMS, get_datum_srid, is_supp
     is_projected_srid, get_datum_and_zone
 
 YYYY_MM_DD_REGEX = re.compile(r'^\d{4}-\d{2}-\d{2}')
+# Fast validation paths (see SchemaField.compile_fast_check)
+INTEGER_REGEX = re.compile(r'0|-?[1-9][0-9]*')
+NUMBER_REGEX = re.compile(r'[+-]?([0-9]+(\.[0-9]*)?|\.[0-9]+)([eE][+-]?[0-9]+)?')
+ISO_DATE_REGEX = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}')
 
 logger = logging.getLogger(__name__)
 
@@ -53,7 +63,21 @@ class FieldSchemaError(Exception):
     pass
 
 
-def parse_datetime_day_first(value):
+# The fast paths of the day first date parser: the date/datetime formats parsed without dateutil.
+# They only match values that dateutil (see parse_datetime_day_first) parses the same way: YYYY-MM-DD with 2 digits
+# month and day and day first DD/MM/YYYY or DD-MM-YYYY. Not YYYY/MM/DD that dateutil reads as YYYY/DD/MM with day first.
+_TIME_PATTERN = r'(?:{separator}(?P<hour>\d{{{hour_digits}}}):(?P<minute>\d{{2}})(?::(?P<second>\d{{2}}))?)?'
+DAY_FIRST_DATE_FORMATS = [
+    re.compile(r'(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})' +
+               _TIME_PATTERN.format(separator='[T ]', hour_digits='2')),
+    re.compile(r'(?P<day>\d{1,2})/(?P<month>\d{1,2})/(?P<year>\d{4})' +
+               _TIME_PATTERN.format(separator=' ', hour_digits='1,2')),
+    re.compile(r'(?P<day>\d{1,2})-(?P<month>\d{1,2})-(?P<year>\d{4})' +
+               _TIME_PATTERN.format(separator=' ', hour_digits='1,2')),
+]
+
+
+def parse_datetime_day_first_dateutil(value):
     """
     use the dateutil.parse() to parse a date/datetime with the date first (dd/mm/yyyy) (not month first mm/dd/yyyy)
     in case of ambiguity
@@ -67,20 +91,66 @@ def parse_datetime_day_first(value):
     return date_parse(value, dayfirst=dayfirst)
 
 
-def cast_date_any_format(value):
+class DayFirstDateParser(object):
+    """
+    Same result as parse_datetime_day_first_dateutil but faster on the regular columns:
+    - the values are first matched against the fast formats (DAY_FIRST_DATE_FORMATS), starting with the format
+    detected on the previous values (the last one that matched). dateutil is only used on the misses.
+    - the results are memoized (LRU): the files repeat the same few dates again and again, and the same value is
+    parsed by the validation and by the record cast.
+    A parser is thread safe. There's one per date field (see SchemaField) so the format is detected per column.
+    """
+    CACHE_SIZE = 1024
+
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.format = None
+        self.parse = functools.lru_cache(maxsize=cache_size)(self._parse)
+
+    def _parse(self, value):
+        detected = self.format
+        formats = [detected] + [f for f in DAY_FIRST_DATE_FORMATS if f is not detected] if detected \
+            else DAY_FIRST_DATE_FORMATS
+        for date_format in formats:
+            match = date_format.fullmatch(value)
+            if match is not None:
+                try:
+                    result = datetime.datetime(*(int(match.group(name) or 0) for name in
+                                                 ['year', 'month', 'day', 'hour', 'minute', 'second']))
+                except ValueError:
+                    # e.g month first 12/31/2018. Let dateutil decide.
+                    break
+                self.format = date_format
+                return result
+        return parse_datetime_day_first_dateutil(value)
+
+
+_default_date_parser = DayFirstDateParser()
+
+
+def parse_datetime_day_first(value, date_parser=None):
+    """
+    Parse a date/datetime with the date first (dd/mm/yyyy) (not month first mm/dd/yyyy) in case of ambiguity
+    :param value: a string
+    :param date_parser: the DayFirstDateParser to use (the one of a field). A shared one if None.
+    :return: a datetime
+    """
+    return (date_parser or _default_date_parser).parse(value)
+
+
+def cast_date_any_format(value, date_parser=None):
     if isinstance(value, datetime.date):
         return value
     try:
-        return parse_datetime_day_first(value).date()
+        return parse_datetime_day_first(value, date_parser=date_parser).date()
     except (TypeError, ValueError) as e:
         raise_with_traceback(InvalidDateType(e))
 
 
-def cast_datetime_any_format(value):
+def cast_datetime_any_format(value, date_parser=None):
     if isinstance(value, datetime.datetime):
         return value
     try:
-        return parse_datetime_day_first(value)
+        return parse_datetime_day_first(value, date_parser=date_parser)
     except (TypeError, ValueError) as e:
         raise_with_traceback(InvalidDateType(e))
 
@@ -119,10 +189,13 @@ class BiosysSchema:
       constraints: ....
       biosys: {
                 type: observationDate|latitude|longitude|...
+                indexed: true|false
               }
     }
     """
     BIOSYS_KEY_NAME = 'biosys'
+    # the typed values of an indexed field are stored for the record range filters (see main.models.RecordIndexedValue)
+    INDEXED_KEY_NAME = 'indexed'
     OBSERVATION_DATE_TYPE_NAME = 'observationDate'
     LATITUDE_TYPE_NAME = 'latitude'
     LONGITUDE_TYPE_NAME = 'longitude'
@@ -188,6 +261,9 @@ class BiosysSchema:
     def is_species(self):
         return self.type == self.SPECIES_TYPE_NAME
 
+    def is_indexed(self):
+        return self.get(self.INDEXED_KEY_NAME) is True
+
 
 class SchemaField:
     """
@@ -210,6 +286,8 @@ class SchemaField:
         # biosys specific
         self.biosys = BiosysSchema(self.descriptor.get(BiosysSchema.BIOSYS_KEY_NAME))
         self.constraints = SchemaConstraints(self.descriptor.get('constraints', {}))
+        # the date parser of the format 'any' (see cast)
+        self.date_parser = DayFirstDateParser() if self.is_datetime_types and self.get('format') == 'any' else None
 
     # implement some dict like methods
     def __getitem__(self, item):
@@ -287,10 +365,28 @@ class SchemaField:
 
         # date or datetime with format='any
         if self.is_datetime_types and self.format == 'any' and value:
-            return cast_date_any_format(value) if self.is_date_type else cast_datetime_any_format(value)
+            if self.is_date_type:
+                return cast_date_any_format(value, date_parser=self.date_parser)
+            return cast_datetime_any_format(value, date_parser=self.date_parser)
         # delegates to tableschema.Field.cast_value
         return self.tableschema_field.cast_value(value, constraints=True)
 
+    def cast_json_number(self, value):
+        """
+        Cast a numeric field value into a json serializable python number. An int or float.
+        Will throw an exception if the value can't be cast (see cast).
+        """
+        python_value = self.cast(value)
+        # The frictionless cast will cast a number to a python Decimal(), which is not json serializable
+        # by default. Cast it to a float or int. We want to keep it as entered as possible. E.g if entered
+        # 0 we don't want 0.0 or vice versa
+        if isinstance(python_value, decimal.Decimal):
+            if str(value).find('.') > 0:
+                python_value = float(python_value)
+            else:
+                python_value = int(python_value)
+        return python_value
+
     def validation_error(self, value):
         """
         Return an error message if the value is not valid according to the schema.
@@ -314,6 +410,8 @@ class SchemaField:
                     not_integer = True
                 if not_integer:
                     return 'The field "{}" must be a whole number.'.format(self.name)
+                # the cast (with constraints) succeeded, no need to cast again.
+                return None
         try:
             self.cast(value)
         except Exception as e:
@@ -324,6 +422,119 @@ class SchemaField:
                 error = "The value must be one the following: {}".format(values)
         return error
 
+    def compile_fast_check(self):
+        """
+        Build a function value -> bool that returns True only if the value is valid, without going through the
+        tableschema cast. It returns False when the value is not valid or when it can't tell, in which case the
+        validation_error method must be used (it gives the error message).
+        Fast checks are only built for the string (default format), integer, number, boolean and date (default or
+        'any' format) types without other constraints than required and enum.
+        :return: the check function or None if the field has no fast check.
+        """
+        if set(self.constraints.descriptor.keys()) - {'required', 'unique', 'enum'}:
+            return None
+        type_ = self.type
+        format_ = self.get('format', 'default')
+        required = bool(self.required)
+        enum = self.constraints.enum
+        enum_values = None
+        if enum is not None:
+            if type_ not in ['string', 'integer']:
+                return None
+            try:
+                # tableschema checks the enum constraint against the casted enum values
+                enum_values = set(self.tableschema_field.cast_value(v, constraints=False) for v in enum)
+            except Exception:
+                return None
+
+        if type_ == 'string' and format_ == 'default':
+            def check(value):
+                if value is None:
+                    return not required
+                if not isinstance(value, str):
+                    return False
+                value = value.strip()
+                if not value:
+                    return not required
+                return enum_values is None or value in enum_values
+            return check
+
+        if type_ == 'integer' and 'bareNumber' not in self.descriptor:
+            def check(value):
+                if value is None:
+                    return not required
+                if isinstance(value, bool):
+                    return False
+                if isinstance(value, int):
+                    casted = value
+                elif isinstance(value, str):
+                    # must be written as it would be casted back to string: no space, no leading 0 or + sign.
+                    if not INTEGER_REGEX.fullmatch(value):
+                        return is_empty_string(value) and not required
+                    casted = int(value)
+                else:
+                    return False
+                return enum_values is None or casted in enum_values
+            return check
+
+        if type_ == 'number' and not {'bareNumber', 'groupChar', 'decimalChar'} & set(self.descriptor.keys()):
+            def check(value):
+                if value is None:
+                    return not required
+                if isinstance(value, bool):
+                    return False
+                if isinstance(value, (int, float)):
+                    return True
+                if isinstance(value, str):
+                    value = value.strip()
+                    if not value:
+                        return not required
+                    return NUMBER_REGEX.fullmatch(value) is not None
+                return False
+            return check
+
+        if type_ == 'boolean':
+            true_values = set(v for v in self.get('trueValues', []) if isinstance(v, str))
+            false_values = set(v for v in self.get('falseValues', []) if isinstance(v, str))
+
+            def check(value):
+                if value is None:
+                    return not required
+                if isinstance(value, bool):
+                    return True
+                if isinstance(value, str):
+                    value = value.strip()
+                    if not value:
+                        return not required
+                    return value in true_values or value in false_values
+                return False
+            return check
+
+        # note: the date cast requires an explicit format in the descriptor.
+        if type_ == 'date' and self.get('format') in ['default', 'any']:
+            def check(value):
+                if value is None:
+                    return not required
+                if isinstance(value, datetime.datetime):
+                    return False
+                if isinstance(value, datetime.date):
+                    return True
+                if isinstance(value, str):
+                    value = value.strip()
+                    if not value:
+                        return not required
+                    if not ISO_DATE_REGEX.fullmatch(value):
+                        return False
+                    try:
+                        datetime.datetime.strptime(value, '%Y-%m-%d')
+                        return True
+                    except ValueError:
+                        return False
+                return False
+            return check
+
+        return None
+
     def __curate_descriptor(self, descriptor):
         """
         Apply some changes to the descriptor:
@@ -443,6 +654,11 @@ class GenericSchema(object):
         self.foreign_keys = [SchemaForeignKey(fk) for fk in
                              self.schema_model.foreign_keys] if self.schema_model.foreign_keys else []
         self.project = project
+        # name -> field. In case of duplicate names the first field wins (same as a search in the list).
+        self.fields_by_name = {}
+        for field in self.fields:
+            self.fields_by_name.setdefault(field.name, field)
+        self._row_validator = None
 
     # implement some dict like methods
     def __getitem__(self, item):
@@ -467,19 +683,24 @@ class GenericSchema(object):
     def numeric_fields(self):
         return [f for f in self.fields if f.is_numeric]
 
+    @property
+    def indexed_fields(self):
+        return [f for f in self.fields if f.biosys.is_indexed()]
+
     def get_field_by_name(self, name):
-        for f in self.fields:
-            if f.name == name:
-                return f
-        return None
+        return self.fields_by_name.get(name)
+
+    @property
+    def row_validator(self):
+        """
+        The compiled validator of this schema, built on first use.
+        """
+        if self._row_validator is None:
+            self._row_validator = CompiledRowValidator(self)
+        return self._row_validator
 
     def field_validation_error(self, field_name, value):
-        field = self.get_field_by_name(field_name)
-        if field is not None:
-            return field.validation_error(value)
-        else:
-            raise Exception("The field '{}' doesn't exists in the schema. Should be one of {}"
-                            .format(field_name, self.field_names))
+        return self.row_validator.field_validation_error(field_name, value)
 
     def is_field_valid(self, field_name, value):
         return self.field_validation_error(field_name, value) is None
@@ -508,30 +729,28 @@ class GenericSchema(object):
     def cast_numbers(self, row, raise_error=False):
         """
         Replace the numeric fields value by a json serializable python number. An int or float
-        :param row: a dict of (field_name, value)
+        :param row: a dict of (field_name, value) or a TypedRow (already cast, see cast_row)
         :param raise_error: if True any casting error will raise an exception
         :return:  in place replacement {field_name: value} where the numeric fields are casted into python numbers
         """
+        if isinstance(row, TypedRow):
+            return row.cast_data
         for field in self.numeric_fields:
             if field.name in row:
-                value = row[field.name]
                 try:
-                    python_value = field.cast(value)
-                    # The frictionless cast will cast a number to a python Decimal(), which is not json serializable
-                    # by default. Cast it to a float or int. We want to keep it as entered as possible. E.g if entered
-                    # 0 we don't want 0.0 or vice versa
-                    if isinstance(python_value, decimal.Decimal):
-                        if str(value).find('.') > 0:
-                            python_value = float(python_value)
-                        else:
-                            python_value = int(python_value)
-                    row[field.name] = python_value
+                    row[field.name] = field.cast_json_number(row[field.name])
                 except Exception as e:
                     if raise_error:
                         raise e
                     pass
         return row
 
+    def cast_row(self, row):
+        """
+        Validate and cast the row in one pass. See TypedRow.
+        """
+        return self.row_validator.cast_row(row)
+
     def rows_validator(self, rows):
         for row in rows:
             yield self.validate_row(row)
@@ -580,6 +799,108 @@ class GenericSchema(object):
         return self.get('name')
 
 
+class TypedRow(object):
+    """
+    A row validated and cast in one pass (see CompiledRowValidator.cast_row). It is shared by the record validators
+    (see main.api.validators) and the record creation (see main.api.uploaders.RecordCreator) so the values are not
+    cast again by each step.
+    """
+
+    def __init__(self, data):
+        # the row as given {column: value}
+        self.data = data
+        # the row with the numeric values cast into json numbers (see GenericSchema.cast_numbers)
+        self.cast_data = dict(data)
+        # {field name: schema validation error message}, in the row order.
+        self.errors = {}
+        # the record values cast from the row (observation date, geometry...), see get_record_value
+        self._record_values = {}
+
+    def get_record_value(self, name, cast):
+        """
+        The memoized result of cast(self.data). A cast exception is memoized as well and raised again.
+        :param name: the record value name (e.g. 'geometry')
+        :param cast: a function row -> value
+        """
+        if name not in self._record_values:
+            try:
+                self.set_record_value(name, cast(self.data))
+            except Exception as e:
+                self.set_record_value(name, error=e)
+        value, error = self._record_values[name]
+        if error is not None:
+            raise error
+        return value
+
+    def set_record_value(self, name, value=None, error=None):
+        """
+        Set a record value cast elsewhere (e.g. the geometries cast by chunk).
+        """
+        self._record_values[name] = (value, error)
+
+
+class CompiledRowValidator(object):
+    """
+    A field validator compiled once per schema.
+    The fields are looked up by name in a dict and the common values are accepted by the type specialized field fast
+    checks (see SchemaField.compile_fast_check). Everything else goes through SchemaField.validation_error so the
+    error messages are exactly the same.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.fields_by_name = schema.fields_by_name
+        self.required_fields = schema.required_fields
+        self.fast_checks = dict((name, field.compile_fast_check()) for name, field in self.fields_by_name.items())
+
+    def field_validation_error(self, field_name, value):
+        """
+        :return: None if value is valid or an error message string
+        """
+        check = self.fast_checks.get(field_name)
+        if check is not None and check(value):
+            return None
+        return self._field_validation_error(field_name, value)
+
+    def _field_validation_error(self, field_name, value):
+        field = self.fields_by_name.get(field_name)
+        if field is None:
+            raise Exception("The field '{}' doesn't exists in the schema. Should be one of {}"
+                            .format(field_name, self.schema.field_names))
+        return field.validation_error(value)
+
+    def cast_row(self, row):
+        """
+        Validate the row values and cast the numeric ones.
+        :param row: a dict or a list of (column, value)
+        :return: a TypedRow
+        """
+        typed = TypedRow(dict(row))
+        for field_name, value in typed.data.items():
+            check = self.fast_checks.get(field_name)
+            is_valid = check is not None and check(value)
+            if not is_valid:
+                try:
+                    error = self._field_validation_error(field_name, value)
+                except Exception as e:
+                    error = str(e)
+                if error:
+                    typed.errors[field_name] = error
+            field = self.fields_by_name.get(field_name)
+            if field is None or not field.is_numeric:
+                continue
+            try:
+                if is_valid and isinstance(value, str) and value.strip():
+                    # a plain integer or number string (see the fast check): no need for the tableschema cast.
+                    typed.cast_data[field_name] = int(value) if field.type == 'integer' else \
+                        float(value) if value.find('.') > 0 else int(decimal.Decimal(value.strip()))
+                else:
+                    typed.cast_data[field_name] = field.cast_json_number(value)
+            except Exception:
+                pass
+        return typed
+
+
 class ObservationSchema(GenericSchema):
     """
      A schema specific to an Observation Dataset.
@@ -665,8 +986,11 @@ class ObservationSchema(GenericSchema):
     def cast_srid(self, record, default_srid=MODEL_SRID):
         return self.geometry_parser.cast_srid(record, default_srid=default_srid)
 
-    def cast_geometry(self, record, default_srid=MODEL_SRID):
-        return self.geometry_parser.cast_geometry(record, default_srid=default_srid)
+    def cast_geometry(self, record, default_srid=MODEL_SRID, site_cache=None):
+        return self.geometry_parser.cast_geometry(record, default_srid=default_srid, site_cache=site_cache)
+
+    def cast_geometries(self, records, default_srid=MODEL_SRID, site_cache=None):
+        return self.geometry_parser.cast_geometries(records, default_srid=default_srid, site_cache=site_cache)
 
 
 class SpeciesObservationSchema(ObservationSchema):
@@ -699,6 +1023,71 @@ class SpeciesObservationSchema(ObservationSchema):
         return self.species_name_parser.cast_species_name_id(record)
 
 
+class SchemaCache(object):
+    """
+    A process-wide LRU cache of the parsed schemas.
+    Building a schema (tableschema validation, fields, parsers) is expensive and the same dataset schema is
+    requested many times per request.
+    The schemas are keyed by (owner id, schema class, hash of the schema descriptor) so a change in the descriptor is
+    never served a stale schema, even if the invalidation happened in another process.
+    The cached schemas are shared: they must be treated as read-only.
+    """
+
+    def __init__(self, max_size=256):
+        """
+        :param max_size: the maximum number of schemas kept. 0 or None disable the cache.
+        """
+        self.max_size = max_size
+        self._schemas = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def descriptor_hash(descriptor):
+        return hashlib.md5(json.dumps(descriptor, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, owner_id, schema_class, descriptor):
+        """
+        Return the cached schema or build it.
+        :param owner_id: typically the dataset pk. If None (unsaved dataset) the schema is built and not cached.
+        :param schema_class: GenericSchema or one of its subclass
+        :param descriptor: the schema descriptor (dict)
+        :return: an instance of schema_class. Will throw an exception if the schema is not valid.
+        """
+        if not self.max_size or owner_id is None:
+            return schema_class(descriptor)
+        key = (owner_id, schema_class, self.descriptor_hash(descriptor))
+        with self._lock:
+            schema = self._schemas.get(key)
+            if schema is not None:
+                self._schemas.move_to_end(key)
+                self.hits += 1
+                return schema
+            self.misses += 1
+        # build outside the lock. Copy the descriptor, the cached schema must not follow any change of the dict.
+        schema = schema_class(copy.deepcopy(descriptor))
+        with self._lock:
+            self._schemas[key] = schema
+            while len(self._schemas) > self.max_size:
+                self._schemas.popitem(last=False)
+        return schema
+
+    def invalidate(self, owner_id):
+        with self._lock:
+            for key in [k for k in self._schemas if k[0] == owner_id]:
+                del self._schemas[key]
+
+    def clear(self):
+        with self._lock:
+            self._schemas.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._schemas)
+
+
 def format_required_message(field):
     return "The field named '{field_name}' must have the 'required' constraint set to true.".format(
         field_name=field.name
@@ -768,12 +1157,17 @@ class GeometryParser(object):
     A utility class to extract the geometry from data given a schema.
     """
 
+    # max number of memoized (datum, zone) -> srid resolutions (see cast_srid)
+    SRID_CACHE_SIZE = 1000
+
     def __init__(self, schema, project=None):
         if not isinstance(schema, GenericSchema):
             schema = GenericSchema(schema)
         self.schema = schema
         self.project = project
         self.errors = []
+        # (datum value, zone value, default srid) -> srid or error message
+        self._srid_cache = {}
 
         # Site Code
         self.site_code_field, errors = self._find_site_code_field()
@@ -954,23 +1348,40 @@ class GeometryParser(object):
         """
         Two cases:
         Datum only or datum + zone
+        The resolution is memoized by datum and zone values: a file has usually very few distinct datum/zone.
         :param record: a column -> value dictionary
         :param default_srid:
         :return:
         """
-        # parse datum and zone
-        datum_val = None
-        zone_val = None
-        if self.datum_field:
-            datum_val = record.get(self.datum_field.name)
-        if self.zone_field:
-            zone_val = record.get(self.zone_field.name)
-            if zone_val:
-                try:
-                    int(zone_val)
-                except ValueError:
-                    msg = "Invalid Zone '{}'. Should be an integer.".format(zone_val)
-                    raise InvalidDatumError(msg)
+        datum_val = record.get(self.datum_field.name) if self.datum_field else None
+        zone_val = record.get(self.zone_field.name) if self.zone_field else None
+        key = (datum_val, zone_val, default_srid)
+        try:
+            result = self._srid_cache.get(key)
+        except TypeError:
+            # unhashable value
+            key, result = None, None
+        if result is None:
+            try:
+                result = self._resolve_srid(datum_val, zone_val, default_srid)
+            except InvalidDatumError as e:
+                result = str(e)
+            if key is not None:
+                if len(self._srid_cache) >= self.SRID_CACHE_SIZE:
+                    self._srid_cache.clear()
+                self._srid_cache[key] = result
+        if isinstance(result, str):
+            raise InvalidDatumError(result)
+        return result
+
+    @staticmethod
+    def _resolve_srid(datum_val, zone_val, default_srid):
+        if zone_val:
+            try:
+                int(zone_val)
+            except ValueError:
+                msg = "Invalid Zone '{}'. Should be an integer.".format(zone_val)
+                raise InvalidDatumError(msg)
         # get the srid from values
         if datum_val and zone_val:
             # projected. Only Australia is supported.
@@ -994,31 +1405,81 @@ class GeometryParser(object):
             result = default_srid
         return result
 
-    def cast_geometry(self, record, default_srid=MODEL_SRID):
+    def cast_geometry(self, record, default_srid=MODEL_SRID, site_cache=None):
         """
         Precedences rules:
         easting/northing > lat/long > site geometry
         :param record: a column -> value dictionary
         :param default_srid:
+        :param site_cache: an optional site cache (see main.api.uploaders.SiteCache) used to lookup the site by
+        code instead of querying the database.
         :return: Will throw an exception if anything went wrong
         """
-        x, y = (None, None)  # x = longitude or easting, y = latitude or northing.
-        geometry = None
+        x, y = self._get_coordinates(record)
+        if x is not None:
+            srid = self.cast_srid(record, default_srid=default_srid)
+            return Point(x=float(x), y=float(y), srid=srid)
+        return self._get_site_geometry(record, site_cache=site_cache)
 
+    def cast_geometries(self, records, default_srid=MODEL_SRID, site_cache=None):
+        """
+        Batch version of cast_geometry for a chunk of records (e.g. the rows of an upload).
+        The coordinates are grouped by srid and every group is reprojected to the model srid in one transformation.
+        :return: a list with, for every record, its geometry (in the model srid) or the exception cast_geometry would
+        have raised.
+        """
+        results = [None] * len(records)
+        coordinates_by_srid = {}
+        for index, record in enumerate(records):
+            try:
+                x, y = self._get_coordinates(record)
+                if x is not None:
+                    srid = self.cast_srid(record, default_srid=default_srid)
+                    coordinates_by_srid.setdefault(srid, []).append((index, float(x), float(y)))
+                else:
+                    results[index] = self._get_site_geometry(record, site_cache=site_cache)
+            except Exception as e:
+                results[index] = e
+        for srid, coordinates in coordinates_by_srid.items():
+            if srid == MODEL_SRID:
+                for index, x, y in coordinates:
+                    results[index] = Point(x=x, y=y, srid=srid)
+                continue
+            try:
+                points = MultiPoint([Point(x, y) for _, x, y in coordinates], srid=srid)
+                points.transform(CoordTransform(SpatialReference(srid), SpatialReference(MODEL_SRID)))
+                for (index, _, _), (x, y) in zip(coordinates, points.coords):
+                    results[index] = Point(x=x, y=y, srid=MODEL_SRID)
+            except Exception as e:
+                for index, _, _ in coordinates:
+                    results[index] = e
+        return results
+
+    def _get_coordinates(self, record):
+        """
+        :return: (x, y) = (longitude or easting, latitude or northing) or (None, None) if blank
+        """
+        x, y = (None, None)
         if self.is_easting_northing:
             x = record.get(self.easting_field.name)
             y = record.get(self.northing_field.name)
         if (is_blank_value(x) or is_blank_value(y)) and self.is_lat_long:
             x = record.get(self.longitude_field.name)
             y = record.get(self.latitude_field.name)
-        if not is_blank_value(x) and not is_blank_value(y):
-            srid = self.cast_srid(record, default_srid=default_srid)
-            geometry = Point(x=float(x), y=float(y), srid=srid)
-        if geometry is None and self.site_code_field is not None:
+        if is_blank_value(x) or is_blank_value(y):
+            return None, None
+        return x, y
+
+    def _get_site_geometry(self, record, site_cache=None):
+        geometry = None
+        if self.site_code_field is not None:
             # extract geometry from site
-            from main.models import Site  # import here to avoid cyclic import problem
             site_code = self.get_site_code(record)
-            site = Site.objects.filter(code=site_code).first()
+            if site_cache is not None:
+                site = site_cache.get(site_code)
+            else:
+                from main.models import Site  # import here to avoid cyclic import problem
+                site = Site.objects.filter(code=site_code).first()
             if site_code and site is None:
                 raise Exception('The site {} does not exist'.format(site_code))
             geometry = site.geometry if site is not None else None
@@ -1030,8 +1491,8 @@ class GeometryParser(object):
             # problem
             raise Exception('No Latitude/Longitude Easting/Northing or Site Code found!')
 
-    def from_record_to_geometry(self, record, default_srid=MODEL_SRID):
-        return self.cast_geometry(record, default_srid=default_srid)
+    def from_record_to_geometry(self, record, default_srid=MODEL_SRID, site_cache=None):
+        return self.cast_geometry(record, default_srid=default_srid, site_cache=site_cache)
 
     def from_geometry_to_record(self, geometry, record, default_srid=MODEL_SRID):
         if not geometry:
@@ -1040,10 +1501,47 @@ class GeometryParser(object):
         point = geometry.centroid
         # convert the geometry in the record srid (if any)
         srid = self.cast_srid(record, default_srid=default_srid)
-        datum, zone = (None, None)
         if srid:
             point.transform(srid)
-            datum, zone = get_datum_and_zone(srid)
+        return self._set_record_coordinates(record, point, srid)
+
+    def from_geometries_to_records(self, geometries, records, default_srid=MODEL_SRID):
+        """
+        Batch version of from_geometry_to_record. The centroids are grouped by (geometry srid, record srid) and every
+        group is reprojected in one transformation.
+        :return: a list with, for every (geometry, record), the updated record or the exception raised.
+        """
+        results = [None] * len(records)
+        points_by_srids = {}
+        for index, (geometry, record) in enumerate(zip(geometries, records)):
+            if not geometry:
+                results[index] = record
+                continue
+            try:
+                point = geometry.centroid
+                srid = self.cast_srid(record, default_srid=default_srid)
+                points_by_srids.setdefault((point.srid, srid), []).append((index, point))
+            except Exception as e:
+                results[index] = e
+        for (source_srid, srid), points in points_by_srids.items():
+            try:
+                if srid and srid != source_srid:
+                    multi_point = MultiPoint([point for _, point in points], srid=source_srid)
+                    multi_point.transform(CoordTransform(SpatialReference(source_srid), SpatialReference(srid)))
+                    points = [(index, Point(x=x, y=y, srid=srid))
+                              for (index, _), (x, y) in zip(points, multi_point.coords)]
+                for index, point in points:
+                    results[index] = self._set_record_coordinates(records[index], point, srid)
+            except Exception as e:
+                for index, _ in points:
+                    results[index] = e
+        return results
+
+    def _set_record_coordinates(self, record, point, srid):
+        """
+        Set the datum/zone and coordinates fields of the record from a point in the srid.
+        """
+        datum, zone = get_datum_and_zone(srid) if srid else (None, None)
         # update record field
         record = record or {}
 
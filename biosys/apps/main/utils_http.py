@@ -1,39 +1,43 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+
+
+def _attachment_disposition(file_name, extension):
+    content_disposition = 'attachment;'
+    if file_name is not None:
+        if not file_name.lower().endswith(extension):
+            file_name += extension
+        content_disposition += ' filename=' + file_name
+    return content_disposition
 
 
 class CSVFileResponse(HttpResponse):
     def __init__(self, file_name=None):
         content_type = 'text/csv'
-        content_disposition = 'attachment;'
+        super(CSVFileResponse, self).__init__(content_type=content_type)
+        self['Content-Disposition'] = _attachment_disposition(file_name, '.csv')
 
-        if file_name is not None:
-            if not file_name.lower().endswith('.csv'):
-                file_name += '.csv'
-            content_disposition += ' filename=' + file_name
 
-        super(CSVFileResponse, self).__init__(content_type=content_type)
-        self['Content-Disposition'] = content_disposition
+class CSVStreamingResponse(StreamingHttpResponse):
+    """
+    A csv attachment response where the content is an iterator of csv lines, sent as they are produced.
+    """
+
+    def __init__(self, streaming_content, file_name=None):
+        content_type = 'text/csv'
+        super(CSVStreamingResponse, self).__init__(streaming_content, content_type=content_type)
+        self['Content-Disposition'] = _attachment_disposition(file_name, '.csv')
 
 
 class ExcelFileResponse(HttpResponse):
     def __init__(self, file_name=None):
         content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        content_disposition = 'attachment;'
-
-        if file_name is not None:
-            if not file_name.lower().endswith('.xlsx'):
-                file_name += '.xlsx'
-            content_disposition += ' filename=' + file_name
-
         super(ExcelFileResponse, self).__init__(content_type=content_type)
-        self['Content-Disposition'] = content_disposition
+        self['Content-Disposition'] = _attachment_disposition(file_name, '.xlsx')
 
 
 class WorkbookResponse(ExcelFileResponse):
     def __init__(self, wb, file_name=None):
         super(WorkbookResponse, self).__init__(file_name=file_name)
         wb.save(self)
-
-
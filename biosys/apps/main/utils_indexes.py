@@ -0,0 +1,113 @@
+"""
+Per dataset indexes on the record json data (Postgres partial expression indexes).
+
+The records of all the datasets are in the same table and the data fields are only known from the dataset schema,
+so the search (data->>key ILIKE '%term%', see utils_misc.search_json_fields) and the ordering (data->key, see
+utils_misc.order_by_json_field) can't be supported by static indexes. For every field of a dataset schema we
+maintain:
+    - a pg_trgm gin index on (data->>field) for the ILIKE search
+    - a btree index on (data->field) for the ordering
+restricted to the dataset records (WHERE dataset_id = <id>). The search also looks into source_info file_name and
+row, they get a trigram index as well otherwise the OR of the search could not use the indexes.
+The indexes are named main_record_ds<dataset id>_<kind>_<hash of the field name>.
+
+Enabled with the RECORD_DATASET_INDEXES setting. Note: the containment filters (data @> ...) are supported by a
+global gin index on the data (see Record.Meta.indexes).
+"""
+import hashlib
+
+from django.db import connection
+
+TABLE = 'main_record'
+TRIGRAM = 'trgm'
+SORT = 'sort'
+SOURCE_INFO_SEARCH_KEYS = ['file_name', 'row']
+
+
+def get_index_prefix(dataset_id):
+    # trailing '_' so that dataset 1 doesn't match dataset 12
+    return '{}_ds{}_'.format(TABLE, dataset_id)
+
+
+def get_index_name(dataset_id, kind, column, key):
+    digest = hashlib.md5('{}.{}'.format(column, key).encode('utf-8')).hexdigest()[:12]
+    return '{}{}_{}'.format(get_index_prefix(dataset_id), kind, digest)
+
+
+def get_dataset_index_definitions(dataset_id, field_names):
+    """
+    The indexes a dataset should have.
+    :param field_names: the dataset schema field names
+    :return: a dict {index_name: (sql, params)} of the CREATE INDEX statements. The statements have a {concurrently}
+    placeholder.
+    """
+    definitions = {}
+    trigram_sql = 'CREATE INDEX {{concurrently}} IF NOT EXISTS "{name}" ON {table} ' \
+                  'USING gin (({column} ->> %s) gin_trgm_ops) WHERE dataset_id = %s'
+    sort_sql = 'CREATE INDEX {{concurrently}} IF NOT EXISTS "{name}" ON {table} (({column} -> %s)) ' \
+               'WHERE dataset_id = %s'
+    keys = [('data', name) for name in field_names] + [('source_info', key) for key in SOURCE_INFO_SEARCH_KEYS]
+    for column, key in keys:
+        name = get_index_name(dataset_id, TRIGRAM, column, key)
+        definitions[name] = (trigram_sql.format(name=name, table=TABLE, column=column), [key, dataset_id])
+        if column == 'data':
+            name = get_index_name(dataset_id, SORT, column, key)
+            definitions[name] = (sort_sql.format(name=name, table=TABLE, column=column), [key, dataset_id])
+    return definitions
+
+
+def get_dataset_index_names(dataset_id, valid=None):
+    """
+    The existing indexes of a dataset
+    :param valid: True/False for only the valid/invalid indexes (e.g. a failed CREATE INDEX CONCURRENTLY leaves an
+    invalid index, not used by the queries). None for all.
+    """
+    prefix = get_index_prefix(dataset_id)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, i.indisvalid FROM pg_index i '
+            'JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_class t ON t.oid = i.indrelid '
+            'WHERE t.relname = %s AND left(c.relname, %s) = %s',
+            [TABLE, len(prefix), prefix]
+        )
+        return set(name for name, is_valid in cursor.fetchall() if valid is None or is_valid == valid)
+
+
+def sync_dataset_indexes(dataset_id, field_names):
+    """
+    Create the missing indexes of the dataset and drop the ones of the fields that are not in the schema anymore.
+    Outside of a transaction the indexes are created/dropped concurrently (no lock on the records).
+    The invalid indexes left by a failed concurrent build are dropped and created again.
+    :param field_names: the dataset schema field names. An empty list will drop all the dataset indexes.
+    :return: (created, dropped) index names
+    """
+    definitions = get_dataset_index_definitions(dataset_id, field_names)
+    existing = get_dataset_index_names(dataset_id)
+    invalid = get_dataset_index_names(dataset_id, valid=False)
+    concurrently = '' if connection.in_atomic_block else 'CONCURRENTLY'
+    created = sorted(set(definitions) - (existing - invalid))
+    dropped = sorted(existing - set(definitions))
+    with connection.cursor() as cursor:
+        for name in dropped + sorted(invalid & set(definitions)):
+            cursor.execute('DROP INDEX {} IF EXISTS "{}"'.format(concurrently, name))
+        for name in created:
+            sql, params = definitions[name]
+            cursor.execute(sql.format(concurrently=concurrently), params)
+    return created, dropped
+
+
+def get_record_index_usage():
+    """
+    The usage statistics of the record table indexes (since the last statistics reset).
+    :return: a list of dict (name, scans, tuples_read, size) ordered by name
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexrelname, idx_scan, idx_tup_read, pg_size_pretty(pg_relation_size(indexrelid)) '
+            'FROM pg_stat_user_indexes WHERE relname = %s ORDER BY indexrelname',
+            [TABLE]
+        )
+        return [
+            {'name': name, 'scans': scans, 'tuples_read': tuples_read, 'size': size}
+            for name, scans, tuples_read, size in cursor.fetchall()
+        ]
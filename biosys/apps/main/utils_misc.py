@@ -1,5 +1,12 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
 from django.db.models.expressions import RawSQL
 
+# the postgres text search configuration of the record search vectors (see main.models.RecordSearch)
+SEARCH_CONFIG = 'simple'
+
 
 def get_value(keys, dict_, default=None):
     """
@@ -58,6 +65,24 @@ def search_json_fields(qs, field_info, search_param):
     return qs.extra(where=['OR '.join(where_clauses)], params=params)
 
 
+def full_text_search(qs, search_param):
+    """
+    Full text search of the records through their search vector (see main.models.RecordSearch).
+    Every word of the search is matched as a prefix: 'acac pyc' matches 'Acacia pycnantha'.
+    The records are ordered by rank (best match first).
+    :param qs: a Record queryset
+    :param search_param: value to search
+    :return: the queryset after search filter and ordering applied
+    """
+    words = re.findall(r'\w+', search_param)
+    if not words:
+        return qs
+    query = SearchQuery(' & '.join(word + ':*' for word in words), search_type='raw', config=SEARCH_CONFIG)
+    return qs.filter(search__vector=query) \
+        .annotate(search_rank=SearchRank(F('search__vector'), query)) \
+        .order_by('-search_rank', 'id')
+
+
 def order_by_json_field(qs, json_field_name, keys, ordering_param):
     """
     Order by does not support ordering within JSONField.
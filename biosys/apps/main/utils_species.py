@@ -46,9 +46,15 @@ All species information are in the properties field.
 """
 from __future__ import absolute_import, unicode_literals, print_function, division
 
+import json
 import logging
+import os
+import threading
+import time
+
 import requests
 from confy import env
+from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +74,55 @@ def get_key_for_value(dict_, value, default=None):
     return default
 
 
+class SpeciesIndex(object):
+    """
+    A bidirectional index of a species_name -> name_id mapping, built once per mapping.
+    All the lookups are O(1), unlike get_key_for_value or a search in the mapping values.
+    If several species names share the same name_id the reverse lookup returns the first one (same as
+    get_key_for_value).
+    """
+
+    def __init__(self, name_id_by_species_name=None):
+        self.name_id_by_species_name = name_id_by_species_name or {}
+        self.species_name_by_name_id = {}
+        for species_name, name_id in self.name_id_by_species_name.items():
+            self.species_name_by_name_id.setdefault(name_id, species_name)
+        # set-like view of all the name ids
+        self.name_ids = self.species_name_by_name_id.keys()
+
+    @staticmethod
+    def from_mapping(mapping):
+        """
+        :param mapping: a species_name -> name_id dict, a SpeciesIndex or None
+        :return: a SpeciesIndex or None
+        """
+        if mapping is None or isinstance(mapping, SpeciesIndex):
+            return mapping
+        return SpeciesIndex(mapping)
+
+    def get_name_id(self, species_name, default=None):
+        return self.name_id_by_species_name.get(species_name, default)
+
+    def get_species_name(self, name_id, default=None):
+        return self.species_name_by_name_id.get(name_id, default)
+
+    def has_name_id(self, name_id):
+        return name_id in self.species_name_by_name_id
+
+    def __len__(self):
+        return len(self.name_id_by_species_name)
+
+
+def get_species_index(species_facade):
+    """
+    :param species_facade: a SpeciesFacade instance (or any object with a name_id_by_species_name method)
+    :return: the SpeciesIndex of the facade species
+    """
+    if callable(getattr(species_facade, 'species_index', None)):
+        return species_facade.species_index()
+    return SpeciesIndex(species_facade.name_id_by_species_name())
+
+
 class HerbieError(Exception):
     pass
 
@@ -90,6 +145,19 @@ class SpeciesFacade(object):
             [(sp[self.PROPERTY_SPECIES_NAME.herbie_name], sp[self.PROPERTY_NAME_ID.herbie_name]) for sp in species]
         )
 
+    def species_index(self):
+        """
+        :return: a SpeciesIndex (bidirectional species_name <-> name_id lookup)
+        """
+        return SpeciesIndex(self.name_id_by_species_name())
+
+    def species_name_by_name_id(self):
+        """
+        Reverse of name_id_by_species_name.
+        :return: a dict where key is name_id and the value is the (first) species_name with this name_id
+        """
+        return self.species_index().species_name_by_name_id
+
     def get_all_species(self, properties=None):
         """
         :param properties: a sequence of Property, e.g [PROPERTY_SPECIES_NAME, PROPERTY_NAME_ID] or None for all
@@ -152,8 +220,127 @@ class HerbieFacade(SpeciesFacade):
         return self._query_species(self._add_attributes_filter_to_params(properties))
 
 
+class CachedHerbieFacade(HerbieFacade):
+    """
+    A HerbieFacade where the species_name -> name_id mapping is cached:
+    - in memory, shared by all the instances of the process.
+    - on disk, in a json file (settings.SPECIES_CACHE_PATH), so a new process doesn't need Herbie.
+    When the mapping is older than settings.SPECIES_CACHE_TTL seconds it is refreshed in a background thread and the
+    stale mapping is served in the meantime. Herbie is queried synchronously only when there is nothing cached at all.
+    The returned mappings are shared: don't modify them.
+    """
+    # minimum time (seconds) between two refresh attempts, if Herbie is down.
+    REFRESH_RETRY_DELAY = 300
+
+    _lock = threading.Lock()
+    # {'fetched_at': timestamp, 'index': SpeciesIndex}
+    _memo = None
+    _refresh_thread = None
+    _last_refresh_attempt = 0
+
+    @classmethod
+    def clear_memo(cls):
+        with cls._lock:
+            cls._memo = None
+            cls._last_refresh_attempt = 0
+
+    @staticmethod
+    def _build_memo(species, fetched_at):
+        return {
+            'fetched_at': fetched_at,
+            'index': SpeciesIndex(species)
+        }
+
+    @staticmethod
+    def _read_store():
+        store_path = settings.SPECIES_CACHE_PATH
+        if not store_path or not os.path.exists(store_path):
+            return None
+        try:
+            with open(store_path) as fp:
+                data = json.load(fp)
+            return CachedHerbieFacade._build_memo(data['species'], data['fetched_at'])
+        except Exception as e:
+            logger.warning("Cannot read the species cache file {}: {}".format(store_path, e))
+            return None
+
+    @staticmethod
+    def _write_store(memo):
+        store_path = settings.SPECIES_CACHE_PATH
+        if not store_path:
+            return
+        tmp_path = store_path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as fp:
+                json.dump({'fetched_at': memo['fetched_at'], 'species': memo['index'].name_id_by_species_name}, fp)
+            # atomic: a reader never sees a partial file.
+            os.replace(tmp_path, store_path)
+        except Exception as e:
+            logger.warning("Cannot write the species cache file {}: {}".format(store_path, e))
+
+    def _fetch(self):
+        species = super(CachedHerbieFacade, self).name_id_by_species_name()
+        return self._build_memo(species, time.time())
+
+    @staticmethod
+    def _is_stale(memo):
+        return time.time() - memo['fetched_at'] > settings.SPECIES_CACHE_TTL
+
+    def _get_memo(self):
+        cls = CachedHerbieFacade
+        memo = cls._memo
+        if memo is None:
+            with cls._lock:
+                memo = cls._memo
+                if memo is None:
+                    memo = self._read_store()
+                    if memo is None:
+                        memo = self._fetch()
+                        self._write_store(memo)
+                    cls._memo = memo
+        if self._is_stale(memo):
+            self.refresh(background=True)
+        return memo
+
+    def refresh(self, background=False):
+        """
+        Fetch the species from Herbie and update the cache. Only one refresh at a time.
+        """
+        cls = CachedHerbieFacade
+        with cls._lock:
+            if cls._refresh_thread is not None and cls._refresh_thread.is_alive():
+                return
+            if background and time.time() - cls._last_refresh_attempt < self.REFRESH_RETRY_DELAY:
+                return
+            cls._last_refresh_attempt = time.time()
+            if background:
+                cls._refresh_thread = threading.Thread(target=self._refresh, name='species-cache-refresh')
+                cls._refresh_thread.daemon = True
+                cls._refresh_thread.start()
+                return
+        self._refresh()
+
+    def _refresh(self):
+        try:
+            memo = self._fetch()
+            self._write_store(memo)
+            CachedHerbieFacade._memo = memo
+        except Exception as e:
+            logger.warning("Error while refreshing the species cache: {}".format(e))
+
+    def name_id_by_species_name(self):
+        """
+        :return: a dict where key is species_name and the value is name_id
+        """
+        return self._get_memo()['index'].name_id_by_species_name
+
+    def species_index(self):
+        """
+        :return: the cached SpeciesIndex
+        """
+        return self._get_memo()['index']
+
+
 class NoSpeciesFacade(SpeciesFacade):
     def get_all_species(self, properties=None):
         return []
-
-# TODO: implement a cached version of Herbie (memory/disk or db?). Cache renewal policy?
@@ -137,6 +137,11 @@ EXTRA_PASSWORD_VALIDATORS = env('EXTRA_PASSWORD_VALIDATORS', [])
 AUTH_PASSWORD_VALIDATORS += EXTRA_PASSWORD_VALIDATORS
 
 EXPORTER_CLASS = env('EXPORTER_CLASS', 'main.api.exporters.DefaultExporter')
+# Records export: number of records fetched per database round trip when streaming an export.
+EXPORT_CHUNK_SIZE = env('EXPORT_CHUNK_SIZE', 2000)
+
+# Number of parsed dataset schemas kept in memory (per process). Set to 0 to disable the cache.
+SCHEMA_CACHE_SIZE = env('SCHEMA_CACHE_SIZE', 256)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': env('REST_FRAMEWORK_DEFAULT_AUTHENTICATION_CLASSES', [
@@ -264,7 +269,43 @@ BOOTSTRAP3 = {
 # The class that should provide a mapping between the species scientific name and the species name_id.
 # To use the WA Herbarium web service set SPECIES_FACADE_CLASS='main.utils_species.HerbieFacade'
 # in the environment file.
+# Use 'main.utils_species.CachedHerbieFacade' to keep a local copy of the Herbie species list, refreshed in the
+# background every SPECIES_CACHE_TTL seconds.
 SPECIES_FACADE_CLASS = env('SPECIES_FACADE_CLASS', None)
+SPECIES_CACHE_PATH = env('SPECIES_CACHE_PATH', os.path.join(BASE_DIR, 'species_cache.json'))
+SPECIES_CACHE_TTL = env('SPECIES_CACHE_TTL', 24 * 3600)
+
+# Records upload: number of records inserted in one go (bulk insert, one transaction per batch).
+# Set to 0 to save the records one by one.
+RECORD_UPLOAD_BATCH_SIZE = env('RECORD_UPLOAD_BATCH_SIZE', 1000)
+# Records upload: number of worker processes validating the rows (validation, dates, geometry and species casting).
+# The records are still saved by the request process. 0 or 1 to validate in the request process.
+# The workers are forked, so they are only used by single-threaded processes (e.g. gunicorn sync workers). In a
+# multi-threaded process the rows are validated in the request process.
+RECORD_UPLOAD_WORKERS = env('RECORD_UPLOAD_WORKERS', 0)
+# Records upload jobs (datasets/{pk}/upload-records-job): number of threads running the jobs in the background.
+# 0 to run the job in the request.
+UPLOAD_JOB_WORKERS = env('UPLOAD_JOB_WORKERS', 2)
+
+# Records bulk write (datasets/{pk}/records/bulk): number of records inserted/updated in one statement.
+RECORD_BULK_BATCH_SIZE = env('RECORD_BULK_BATCH_SIZE', 1000)
+
+# Records change feed (datasets/{pk}/changes): default and max number of changes per response.
+RECORD_CHANGES_PAGE_SIZE = env('RECORD_CHANGES_PAGE_SIZE', 1000)
+
+# Sites upload: number of sites created/updated in one go (bulk insert/update, one transaction per batch).
+# Set to 0 to create/update the sites one by one.
+SITE_UPLOAD_BATCH_SIZE = env('SITE_UPLOAD_BATCH_SIZE', 1000)
+
+# Records list: default page size of the cursor pagination (?pagination=cursor) when no limit is given.
+RECORD_CURSOR_PAGE_SIZE = env('RECORD_CURSOR_PAGE_SIZE', 1000)
+
+# Records: maintain per dataset indexes (trigram search and ordering) on the record data fields, created/dropped when
+# a dataset is saved or deleted. See main.utils_indexes. Requires the pg_trgm extension.
+RECORD_DATASET_INDEXES = env('RECORD_DATASET_INDEXES', False)
+
+# Batch geometry conversions (utils/data-to-geometry and utils/geometry-to-data .../batch): max number of items.
+GEO_CONVERT_BATCH_MAX_SIZE = env('GEO_CONVERT_BATCH_MAX_SIZE', 1000)
 
 # Logging settings
 # Ensure that the logs directory exists: